@@ -0,0 +1,61 @@
+"""Crop neighbour index (scipy cKDTree) against brute-force distance computation.
+
+Queries are dataset rows with 10% noise (conditions like the ones users
+enter) and points drawn uniformly over the feature ranges (mostly far from
+any row, the KD-tree's worst case). Both methods must return the same
+neighbours. Run from the backend directory:
+
+    python -m benchmarks.bench_neighbours --k 5 --batch-sizes 1 64 1024
+"""
+import argparse
+import time
+
+import numpy as np
+
+from crop_neighbours import CropNeighbourIndex, brute_force_query
+
+def seconds_per_call(fn, min_seconds):
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256, 1024])
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='time per measurement')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = CropNeighbourIndex.from_dataset()
+    print(f"Index over {len(index):,} rows built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    if index.tree is None:
+        raise SystemExit("scipy is not installed; there is no tree to compare")
+
+    rng = np.random.default_rng(0)
+    count = max(args.batch_sizes)
+    queries = {
+        'near rows': index.X[rng.integers(len(index), size=count)] + rng.normal(0, 0.1, (count, 7)) * index.scale,
+        'uniform': rng.uniform(index.X.min(axis=0), index.X.max(axis=0), (count, 7))
+    }
+
+    print(f"{'queries':>10} {'batch':>6} {'tree us/query':>14} {'brute us/query':>15} {'speedup':>8} {'tree ms/batch':>14}")
+    for name, Q in queries.items():
+        scaled = (Q - index.mean) / index.scale
+        _, tree_indices = index.query(Q, args.k)
+        _, brute_indices = brute_force_query(index.points, scaled, args.k)
+        if not np.array_equal(np.sort(tree_indices, axis=1), np.sort(brute_indices, axis=1)):
+            raise AssertionError("Tree and brute force disagree on the nearest rows")
+        for batch_size in args.batch_sizes:
+            batch, scaled_batch = Q[:batch_size], scaled[:batch_size]
+            tree = seconds_per_call(lambda: index.query(batch, args.k), args.min_seconds)
+            brute = seconds_per_call(lambda: brute_force_query(index.points, scaled_batch, args.k), args.min_seconds)
+            print(f"{name:>10} {batch_size:>6} {tree / batch_size * 1e6:>14.1f} {brute / batch_size * 1e6:>15.1f} "
+                  f"{brute / tree:>7.1f}x {tree * 1000:>14.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Latency and lost updates of concurrent plant actions: read-modify-write vs atomic pipelines.
+
+Needs a MongoDB server (MONGO_URL, default mongodb://localhost:27017). Run from
+the backend directory:  python -m benchmarks.bench_plant_actions
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+import plant_updates
+
+async def read_modify_write(collection, plant_id, amount):
+    # Previous water handler: read, compute in Python, write, read back
+    plant = await collection.find_one({"id": plant_id}, {"_id": 0})
+    updates = {'water_level': min(100.0, plant['water_level'] + amount)}
+    if updates['water_level'] > 90:
+        updates['health'] = max(0, plant['health'] - 5)
+    await collection.update_one({"id": plant_id}, {"$set": updates})
+    return await collection.find_one({"id": plant_id}, {"_id": 0})
+
+async def atomic_pipeline(collection, plant_id, amount):
+    # Current water handler: one find_one_and_update
+    return await collection.find_one_and_update(
+        {"id": plant_id},
+        plant_updates.water_pipeline(amount),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def run_writers(collection, action, writers, actions_per_writer, amount):
+    """Hammer one plant from concurrent writers; returns latencies and lost updates"""
+    plant_id = str(uuid.uuid4())
+    await collection.insert_one({"id": plant_id, "water_level": 0.0, "health": 100.0})
+    latencies = []
+
+    async def writer():
+        for _ in range(actions_per_writer):
+            start = time.perf_counter()
+            await action(collection, plant_id, amount)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer() for _ in range(writers)))
+    elapsed = time.perf_counter() - start
+
+    final = await collection.find_one({"id": plant_id})
+    expected = writers * actions_per_writer * amount
+    latencies = np.array(latencies) * 1000.0
+    return {
+        'actions_per_s': len(latencies) / elapsed,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'lost_updates': int(round((expected - final['water_level']) / amount))
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=32)
+    parser.add_argument('--actions', type=int, default=50, help='actions per writer')
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    collection = client[os.environ.get('DB_NAME', 'gardensim_bench')][f'bench_plants_{uuid.uuid4().hex[:8]}']
+    # Small enough that the water level never reaches the 100 clamp
+    amount = 50.0 / (args.writers * args.actions)
+    try:
+        for name, action in [('read_modify_write', read_modify_write), ('atomic_pipeline', atomic_pipeline)]:
+            results = await run_writers(collection, action, args.writers, args.actions, amount)
+            summary = ', '.join(
+                f'{key}={value:,}' if isinstance(value, int) else f'{key}={value:,.2f}'
+                for key, value in results.items()
+            )
+            print(f'{name}: {summary}')
+    finally:
+        await collection.drop()
+        client.close()
+
+if __name__ == '__main__':
+    asyncio.run(main())
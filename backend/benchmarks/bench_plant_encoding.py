@@ -0,0 +1,104 @@
+"""Payload size and encode time of a page of plants in each response encoding.
+
+'response_model' is what GET /api/plants did before: validate every
+document against List[Plant], run jsonable_encoder and the standard-library
+JSON encoder. The others are the plant_encoding paths it negotiates now.
+Plants are generated, so no MongoDB is needed. Run from the backend
+directory:
+
+    python -m benchmarks.bench_plant_encoding --plants 100 1000 10000
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+import plant_encoding
+
+def make_plants(rng, count):
+    """Plant documents shaped like the stored ones, with varied levels and dates"""
+    from server import PLANT_EMOJIS
+    types = list(PLANT_EMOJIS)
+    now = datetime.now(timezone.utc)
+    garden_id = str(uuid.uuid4())
+    plants = []
+    for position in range(count):
+        plant_type = types[rng.integers(len(types))]
+        levels = rng.uniform(0, 100, 6)
+        plants.append({
+            'id': str(uuid.uuid4()),
+            'garden_id': garden_id,
+            'position': position,
+            'plant_type': plant_type,
+            'emoji': PLANT_EMOJIS[plant_type],
+            'water_level': float(levels[0]),
+            'fertilizer_n': float(levels[1]),
+            'fertilizer_p': float(levels[2]),
+            'fertilizer_k': float(levels[3]),
+            'health': float(levels[4]),
+            'growth_stage': float(levels[5]),
+            'soil_ph': float(rng.uniform(5.5, 7.5)),
+            'has_pests': bool(rng.random() < 0.15),
+            'has_disease': bool(rng.random() < 0.1),
+            'planted_date': (now - timedelta(days=float(rng.uniform(1, 60)))).isoformat(),
+            'last_watered': (now - timedelta(hours=float(rng.uniform(0, 48)))).isoformat() if rng.random() < 0.8 else None,
+            'last_fertilized': (now - timedelta(days=float(rng.uniform(0, 14)))).isoformat() if rng.random() < 0.5 else None
+        })
+    return plants
+
+def seconds_per_call(fn, min_seconds):
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        fn()
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plants', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='time per measurement')
+    args = parser.parse_args()
+
+    # server.py is imported for the Plant model and its route; nothing connects to MongoDB
+    os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+    os.environ.setdefault('DB_NAME', 'bench_plant_encoding')
+    import server
+    route = next(route for route in server.api_router.routes if route.path == '/api/plants' and 'GET' in route.methods)
+    loop = asyncio.new_event_loop()
+
+    def response_model(plants):
+        content = loop.run_until_complete(
+            serialize_response(field=route.response_field, response_content=plants, is_coroutine=True)
+        )
+        return JSONResponse(content).body
+
+    encoders = {'response_model': response_model}
+    for media_type in plant_encoding.media_types():
+        encoders[media_type.split('/')[1]] = lambda plants, media_type=media_type: plant_encoding.encode(plants, media_type)
+    if not plant_encoding.msgpack:
+        print("msgpack is not installed; MessagePack is not measured (pip install msgpack)")
+
+    rng = np.random.default_rng(0)
+    print(f"{'encoding':>26} {'plants':>7} {'bytes':>10} {'B/plant':>8} {'gzip B':>10} {'encode ms':>10} {'speedup':>8}")
+    for count in args.plants:
+        plants = make_plants(rng, count)
+        baseline = None
+        for name, encode in encoders.items():
+            body = encode(plants)
+            seconds = seconds_per_call(lambda: encode(plants), args.min_seconds)
+            baseline = baseline or seconds
+            print(f"{name:>26} {count:>7} {len(body):>10,} {len(body) / count:>8.1f} {len(gzip.compress(body)):>10,} "
+                  f"{seconds * 1000:>10.3f} {baseline / seconds:>7.1f}x")
+    loop.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Accuracy and throughput of the int8 crop model against the float model.
+
+Run from the backend directory:  python -m benchmarks.bench_quantized_crop
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import numpy_inference
+from quantized_crop_model import load_quantized_crop_model
+
+DATASET_PATH = Path(__file__).parent.parent / 'data' / 'Crop_recommendation.csv'
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+
+def rows_per_second(fn, X, batch_size, min_seconds=0.5):
+    """Call fn over X in batches until min_seconds have passed; returns rows/s"""
+    batches = [X[i:i + batch_size] for i in range(0, len(X), batch_size)]
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        for batch in batches:
+            fn(batch)
+            rows += len(batch)
+    return rows / (time.perf_counter() - start)
+
+def accuracy_report(float_model, quantized_model, X, labels, top_k):
+    classes = np.array(float_model.classes)
+    float_probs = float_model.predict_proba(X)
+    quantized_probs = quantized_model.predict_proba(X)
+    float_top, _ = float_model.top_k(X, top_k)
+    quantized_top, _ = quantized_model.top_k(X, top_k)
+    overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(float_top, quantized_top)])
+    return {
+        'float_accuracy': float((classes[float_probs.argmax(axis=1)] == labels).mean()),
+        'int8_accuracy': float((classes[quantized_probs.argmax(axis=1)] == labels).mean()),
+        'top1_agreement': float((float_probs.argmax(axis=1) == quantized_probs.argmax(axis=1)).mean()),
+        f'top{top_k}_overlap': float(overlap),
+        'max_probability_delta': float(np.abs(float_probs - quantized_probs).max())
+    }
+
+def throughput_report(float_model, quantized_model, X, top_k, batch_sizes):
+    def full_softmax(batch):
+        # Previous serving path: full softmax, full sort, dicts for the top k
+        probabilities = float_model.predict_proba(batch)
+        for row in probabilities:
+            numpy_inference.top_crops(row, float_model.classes, top_k)
+
+    def top_k_path(model):
+        def run(batch):
+            indices, probabilities = model.top_k(batch, top_k)
+            for row_indices, row_probabilities in zip(indices, probabilities):
+                numpy_inference.crops_from_top_k(row_indices, row_probabilities, model.classes)
+        return run
+
+    paths = {
+        'float_full_softmax': full_softmax,
+        'float_top_k': top_k_path(float_model),
+        'int8_top_k': top_k_path(quantized_model)
+    }
+    return {
+        batch_size: {name: rows_per_second(fn, X, batch_size) for name, fn in paths.items()}
+        for batch_size in batch_sizes
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top-k', type=int, default=8)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 64, 2200])
+    args = parser.parse_args()
+
+    df = pd.read_csv(DATASET_PATH)
+    X = df[FEATURES].values
+    labels = df['label'].values
+    float_model = numpy_inference.load_crop_model()
+    quantized_model = load_quantized_crop_model()
+
+    print('Accuracy on Crop_recommendation.csv')
+    for name, value in accuracy_report(float_model, quantized_model, X, labels, args.top_k).items():
+        print(f'  {name}: {value:.4f}')
+
+    print('Throughput (rows/s)')
+    for batch_size, results in throughput_report(
+        float_model, quantized_model, X, args.top_k, args.batch_sizes
+    ).items():
+        summary = ', '.join(f'{name}={rate:,.0f}' for name, rate in results.items())
+        print(f'  batch {batch_size}: {summary}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Throughput, latency and memory of the API under gunicorn with 1, 2, 4 and 8 workers.
+
+Starts `gunicorn -c gunicorn.conf.py server:app` once per worker count, waits
+for /api/ready and drives POST /api/crop-recommendations with random
+conditions (the recommendation cache is disabled so every request reaches
+the model) from several load-generator processes. Memory is the summed RSS
+and PSS (proportional set size: shared pages split between the processes
+sharing them) of the master and its workers, read from /proc (Linux only).
+
+Needs gunicorn and a MongoDB server (MONGO_URL, default
+mongodb://localhost:27017). Run from the backend directory:
+
+    python -m benchmarks.bench_workers --workers 1 2 4 8 --seconds 20
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+def random_request(rng):
+    return {
+        'soil_n': float(rng.uniform(0, 140)),
+        'soil_p': float(rng.uniform(5, 145)),
+        'soil_k': float(rng.uniform(5, 205)),
+        'temperature': float(rng.uniform(8, 44)),
+        'humidity': float(rng.uniform(14, 100)),
+        'soil_ph': float(rng.uniform(3.5, 9.9)),
+        'rainfall': float(rng.uniform(20, 300))
+    }
+
+async def drive(url, concurrency, seconds, seed):
+    """Send requests from concurrency connections for some seconds; returns latencies and errors"""
+    rng = np.random.default_rng(seed)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def connection():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=random_request(rng))
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return latencies, errors
+
+def load_process(args):
+    url, concurrency, seconds, seed = args
+    return asyncio.run(drive(url, concurrency, seconds, seed))
+
+def process_tree(pid):
+    """pid and the pids of all its descendants"""
+    pids = [pid]
+    for child in Path(f'/proc/{pid}/task/{pid}/children').read_text().split():
+        pids.extend(process_tree(int(child)))
+    return pids
+
+def memory_mb(pid):
+    """Summed RSS and PSS of a process tree, in MB"""
+    rss = pss = 0
+    for tree_pid in process_tree(pid):
+        for line in Path(f'/proc/{tree_pid}/smaps_rollup').read_text().splitlines():
+            field, _, value = line.partition(':')
+            if field == 'Rss':
+                rss += int(value.split()[0])
+            elif field == 'Pss':
+                pss += int(value.split()[0])
+    return rss / 1024, pss / 1024
+
+def wait_ready(base_url, process, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if httpx.get(f'{base_url}/api/ready', timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+def run(workers, args):
+    bind = f'127.0.0.1:{args.port}'
+    base_url = f'http://{bind}'
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(workers),
+        BIND=bind,
+        SIMULATION_ENABLED='false',
+        RECOMMENDATION_CACHE_SIZE='0',
+        MONGO_URL=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+        DB_NAME=os.environ.get('DB_NAME', 'gardensim_bench')
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--log-level', 'warning', 'server:app'],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        start = time.monotonic()
+        wait_ready(base_url, process)
+        ready_seconds = time.monotonic() - start
+        # Wait until every worker has started, then warm them up
+        time.sleep(1.0)
+        load_process((f'{base_url}/api/crop-recommendations', workers * 4, 1.0, 0))
+
+        url = f'{base_url}/api/crop-recommendations'
+        jobs = [(url, args.concurrency, args.seconds, seed + 1) for seed in range(args.clients)]
+        with multiprocessing.get_context('spawn').Pool(args.clients) as pool:
+            results = pool.map(load_process, jobs)
+        rss, pss = memory_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = np.array([latency for result, _ in results for latency in result]) * 1000.0
+    return {
+        'workers': workers,
+        'requests_per_s': len(latencies) / args.seconds,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'errors': sum(errors for _, errors in results),
+        'ready_s': ready_seconds,
+        'rss_mb': rss,
+        'pss_mb': pss
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seconds', type=float, default=20.0, help='measured load per worker count')
+    parser.add_argument('--clients', type=int, default=4, help='load-generator processes')
+    parser.add_argument('--concurrency', type=int, default=32, help='connections per load-generator process')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'ready s':>7} {'RSS MB':>8} {'PSS MB':>8}")
+    for workers in args.workers:
+        r = run(workers, args)
+        print(f"{r['workers']:>7} {r['requests_per_s']:>9,.0f} {r['latency_ms_p50']:>8.2f} {r['latency_ms_p99']:>8.2f} "
+              f"{r['errors']:>6} {r['ready_s']:>7.1f} {r['rss_mb']:>8.0f} {r['pss_mb']:>8.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,533 @@
+"""Benchmark suite for inference, model loading, cold start, API routes and garden ticks.
+
+Runs offline: MongoDB is mongomock (needs mongomock-motor) unless --mongo-url
+points at a local mongod, and weather comes from a stub WeatherAPI server
+started by the suite. Run from the backend directory:
+
+    python -m benchmarks.run_suite --output results.json
+    python -m benchmarks.run_suite --baseline results.json --threshold 0.1
+
+Sections (--sections, default all):
+  inference   growth and crop model forward passes at batch sizes 1..4096,
+              NumPy engine and (if installed) torch
+  model_load  time to load each model from disk
+  cold_start  process start until the first response and until /api/ready
+  api         p50/p99 latency and throughput of each /api route under
+              concurrent load, against a server in a child process
+  tick        one full garden tick at increasing plant counts, end to end
+              and model/rules only
+
+Every metric is written to a flat JSON map. Metrics ending in _per_s are
+better higher, _ms and _s better lower. With --baseline, each metric is
+compared with the saved run and the exit status is 1 if any got worse by more
+than --threshold. Compare runs against the same database: mongomock is much
+slower than mongod at bulk writes, so tick timings under it mostly measure
+mongomock.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.parent
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024, 4096)
+TICK_PLANT_COUNTS = (100, 1000, 10000, 50000)
+# Feature ranges of the crop dataset: [N, P, K, temperature, humidity, ph, rainfall]
+FEATURE_LOW = np.array([0, 5, 5, 8, 14, 3.5, 20], dtype=np.float64)
+FEATURE_HIGH = np.array([140, 145, 205, 44, 100, 9.9, 300], dtype=np.float64)
+
+def random_features(rng, count):
+    return rng.uniform(FEATURE_LOW, FEATURE_HIGH, size=(count, len(FEATURE_LOW)))
+
+def calls_per_second(fn, min_seconds):
+    """Call fn repeatedly for at least min_seconds; returns calls/s"""
+    fn()
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return calls / elapsed
+
+def median_seconds(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+# Environment
+
+class WeatherStub(BaseHTTPRequestHandler):
+    """Answers /current.json like WeatherAPI, with weather derived from the zipcode"""
+    def do_GET(self):
+        zipcode = self.path.partition('q=')[2].partition('&')[0] or '0'
+        seed = sum(map(ord, zipcode))
+        body = json.dumps({
+            'current': {
+                'temp_c': 10 + seed % 25,
+                'humidity': 30 + seed % 60,
+                'precip_mm': seed % 7,
+                'condition': {'text': 'Sunny'}
+            },
+            'location': {'name': f'Town {zipcode}', 'region': 'Region', 'country': 'Country'}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_weather_stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WeatherStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def server_environment(mongo_url, weather_url, db_name):
+    """Environment for importing server.py in benchmark conditions"""
+    return {
+        'MONGO_URL': mongo_url or 'mongodb://mongomock',
+        'DB_NAME': db_name,
+        'BENCH_MONGOMOCK': '' if mongo_url else '1',
+        'WEATHER_API_BASE': weather_url,
+        'WEATHER_API_KEY': 'bench',
+        'SIMULATION_ENABLED': 'false',
+        'MODEL_WATCH_SECONDS': '0',
+        'STATE_STORE': 'mongo',
+        'PRELOAD_MODELS': 'false'
+    }
+
+def import_server(environment):
+    """Import server.py in this process with the benchmark environment"""
+    os.environ.update(environment)
+    if os.environ.get('BENCH_MONGOMOCK'):
+        try:
+            import mongomock_motor
+        except ImportError:
+            raise SystemExit("Without --mongo-url the suite needs mongomock-motor (pip install mongomock-motor)")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    # Per-request INFO logs would cost more than some of the routes measured
+    logging.disable(logging.INFO)
+    return server
+
+def serve(port):
+    """Child process: run the API on a port with the environment the parent passed down"""
+    server = import_server({})
+    import uvicorn
+    uvicorn.run(server.app, host='127.0.0.1', port=port, log_level='warning')
+
+def start_server(environment, port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.run_suite', '--serve', str(port)],
+        cwd=BACKEND_DIR, env=dict(os.environ, **environment)
+    )
+    return process
+
+def wait_for(url, process, timeout=300):
+    """Seconds until url answers 200"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# Sections
+
+def bench_inference(args, results):
+    import numpy_inference
+    rng = np.random.default_rng(0)
+    growth = numpy_inference.load_growth_model()
+    crop = numpy_inference.load_crop_model()
+    engines = {'numpy': (growth.predict, lambda X: crop.top_k(X, 8))}
+    try:
+        import ml_models
+        torch_growth, growth_scaler = ml_models.load_growth_model()
+        torch_crop, crop_scaler, _ = ml_models.load_crop_model()
+        engines['torch'] = (
+            lambda X: ml_models.predict_growth_batch(torch_growth, growth_scaler, X),
+            lambda X: ml_models.crop_probabilities_batch(torch_crop, crop_scaler, X)
+        )
+    except ImportError:
+        print("torch not installed, skipping torch inference")
+
+    for engine, (predict_growth, recommend_crops) in engines.items():
+        for batch_size in BATCH_SIZES:
+            X = random_features(rng, batch_size)
+            for model, fn in (('growth', predict_growth), ('crop', recommend_crops)):
+                rate = calls_per_second(lambda: fn(X), args.min_seconds)
+                prefix = f'inference.{engine}.{model}.batch_{batch_size}'
+                results[f'{prefix}.rows_per_s'] = rate * batch_size
+                results[f'{prefix}.call_ms'] = 1000.0 / rate
+
+def bench_model_load(args, results):
+    import numpy_inference
+    repeats = args.load_repeats
+    results['model_load.numpy.growth_s'] = median_seconds(numpy_inference.load_growth_model, repeats)
+    results['model_load.numpy.crop_s'] = median_seconds(numpy_inference.load_crop_model, repeats)
+    try:
+        from quantized_crop_model import load_quantized_crop_model
+        results['model_load.numpy.crop_int8_s'] = median_seconds(load_quantized_crop_model, repeats)
+    except Exception as e:
+        print(f"Skipping int8 crop model load: {e}")
+    try:
+        import ml_models
+    except ImportError:
+        return
+    results['model_load.torch.growth_s'] = median_seconds(ml_models.load_growth_model, repeats)
+    results['model_load.torch.crop_s'] = median_seconds(ml_models.load_crop_model, repeats)
+
+def bench_cold_start(args, results, environment):
+    first_response = []
+    ready = []
+    for run in range(args.cold_start_runs):
+        port = args.port + 1 + run
+        env = dict(environment, DB_NAME=f"{environment['DB_NAME']}_cold{run}")
+        start = time.perf_counter()
+        process = start_server(env, port)
+        try:
+            wait_for(f'http://127.0.0.1:{port}/api/', process)
+            first_response.append(time.perf_counter() - start)
+            wait_for(f'http://127.0.0.1:{port}/api/ready', process)
+            ready.append(time.perf_counter() - start)
+        finally:
+            stop_server(process)
+    results['cold_start.first_response_s'] = float(np.median(first_response))
+    results['cold_start.ready_s'] = float(np.median(ready))
+
+class RouteLoad:
+    """Requests of one route, with state shared between requests (e.g. ids to delete)"""
+    def __init__(self, name, make_request):
+        self.name = name
+        self.make_request = make_request
+
+def api_routes(seed):
+    """Load for every /api route; make_request returns None once a route has nothing left to do"""
+    garden = seed['garden_id']
+    plant_ids = seed['plant_ids']
+
+    def crop_request(rng):
+        n, p, k, temperature, humidity, ph, rainfall = random_features(rng, 1)[0]
+        return {'soil_n': n, 'soil_p': p, 'soil_k': k, 'temperature': temperature,
+                'humidity': humidity, 'soil_ph': ph, 'rainfall': rainfall}
+
+    bulk_rows = '\n'.join(json.dumps(crop_request(np.random.default_rng(i))) for i in range(1000))
+
+    def create_plant(rng, state):
+        state['position'] = state.get('position', -1) + 1
+        return 'POST', '/api/plants', {'json': {
+            'garden_id': seed['create_garden_id'], 'position': state['position'], 'plant_type': 'tomato'
+        }}
+
+    def delete_plant(rng, state):
+        created = state.get('created', [])
+        if not created:
+            return None
+        return 'DELETE', f'/api/plants/{created.pop()}', {'params': {'garden_id': seed['create_garden_id']}}
+
+    def pick_plant(rng):
+        return plant_ids[int(rng.integers(len(plant_ids)))]
+
+    return [
+        RouteLoad('root', lambda rng, state: ('GET', '/api/', {})),
+        RouteLoad('ready', lambda rng, state: ('GET', '/api/ready', {})),
+        RouteLoad('create_plant', create_plant),
+        RouteLoad('list_plants', lambda rng, state: ('GET', '/api/plants', {'params': {'garden_id': garden}})),
+        RouteLoad('get_plant', lambda rng, state: (
+            'GET', f'/api/plants/{pick_plant(rng)}', {'params': {'garden_id': garden}})),
+        RouteLoad('plant_action_water', lambda rng, state: (
+            'POST', f'/api/plants/{pick_plant(rng)}/action',
+            {'params': {'garden_id': garden}, 'json': {'action': 'water', 'amount': 1}})),
+        RouteLoad('plant_action_check_pests', lambda rng, state: (
+            'POST', f'/api/plants/{pick_plant(rng)}/action',
+            {'params': {'garden_id': garden}, 'json': {'action': 'check_pests'}})),
+        RouteLoad('update_growth', lambda rng, state: (
+            'POST', f'/api/plants/{pick_plant(rng)}/update-growth', {'params': {'garden_id': garden}})),
+        RouteLoad('garden_tick', lambda rng, state: ('POST', '/api/garden/tick', {'params': {'garden_id': garden}})),
+        RouteLoad('list_gardens', lambda rng, state: ('GET', '/api/gardens', {})),
+        RouteLoad('get_garden', lambda rng, state: ('GET', f'/api/gardens/{garden}', {})),
+        RouteLoad('weather', lambda rng, state: (
+            'POST', '/api/weather', {'json': {'zipcode': str(10000 + int(rng.integers(100)))}})),
+        RouteLoad('crop_recommendations', lambda rng, state: (
+            'POST', '/api/crop-recommendations', {'json': crop_request(rng)})),
+        RouteLoad('crop_recommendations_bulk_1000', lambda rng, state: (
+            'POST', '/api/crop-recommendations/bulk',
+            {'content': bulk_rows, 'headers': {'content-type': 'application/x-ndjson'}})),
+        RouteLoad('recommendation_cache_stats', lambda rng, state: ('GET', '/api/crop-recommendations/cache', {})),
+        RouteLoad('inference_metrics', lambda rng, state: ('GET', '/api/inference/metrics', {})),
+        RouteLoad('live_stats', lambda rng, state: ('GET', '/api/live/stats', {})),
+        RouteLoad('delete_plant', delete_plant)
+    ]
+
+async def seed_api(client, plants):
+    """A garden with plants (and a zipcode) to run the plant routes against, and one to create plants in"""
+    garden = (await client.post('/api/gardens', json={'name': 'bench', 'rows': 100, 'cols': 100,
+                                                      'zipcode': '10001'})).json()
+    plant_ids = []
+    for position in range(plants):
+        response = await client.post('/api/plants', json={
+            'garden_id': garden['id'], 'position': position, 'plant_type': 'tomato'
+        })
+        response.raise_for_status()
+        plant_ids.append(response.json()['id'])
+    create_garden = (await client.post('/api/gardens', json={'name': 'bench-create', 'rows': 1000,
+                                                             'cols': 1000})).json()
+    return {'garden_id': garden['id'], 'plant_ids': plant_ids, 'create_garden_id': create_garden['id']}
+
+async def load_route(client, route, concurrency, seconds, state):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def connection(seed):
+        nonlocal errors
+        rng = np.random.default_rng(seed)
+        while time.perf_counter() < deadline:
+            request = route.make_request(rng, state)
+            if request is None:
+                break
+            method, path, kwargs = request
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+                if route.name == 'create_plant':
+                    state.setdefault('created', []).append(response.json()['id'])
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return np.array(latencies) * 1000.0, errors, elapsed
+
+async def run_api_load(base_url, args, results):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        seed = await seed_api(client, args.api_plants)
+        state = {}
+        for route in api_routes(seed):
+            if args.routes and route.name not in args.routes:
+                continue
+            latencies, errors, elapsed = await load_route(client, route, args.concurrency, args.seconds, state)
+            prefix = f'api.{route.name}'
+            results[f'{prefix}.requests_per_s'] = len(latencies) / elapsed
+            if len(latencies):
+                results[f'{prefix}.p50_ms'] = float(np.percentile(latencies, 50))
+                results[f'{prefix}.p99_ms'] = float(np.percentile(latencies, 99))
+            results[f'{prefix}.errors'] = errors
+            print(f"  {route.name}: {len(latencies) / elapsed:,.0f} req/s, errors {errors}")
+
+def bench_api(args, results, environment):
+    process = start_server(environment, args.port)
+    try:
+        wait_for(f'http://127.0.0.1:{args.port}/api/ready', process)
+        asyncio.run(run_api_load(f'http://127.0.0.1:{args.port}', args, results))
+    finally:
+        stop_server(process)
+
+async def run_ticks(server, args, results):
+    import simulation_rules
+    server.model_registry.load_now()
+    await server.ensure_indexes()
+    rng = np.random.default_rng(0)
+    environment = server.weather_environment(await server.get_weather_by_zipcode('10001'))
+    try:
+        for count in args.tick_plants:
+            garden_id = f'bench-tick-{count}'
+            side = int(np.ceil(np.sqrt(count)))
+            garden = server.Garden(id=garden_id, rows=side, cols=side, zipcode='10001')
+            await server.db.gardens.insert_one(garden.model_dump())
+            plants = simulation_rules.random_plants(rng, count)
+            planted = datetime.now(timezone.utc).isoformat()
+            documents = []
+            for position in range(count):
+                document = server.Plant(garden_id=garden_id, position=position, plant_type='tomato',
+                                        emoji='🍅', planted_date=planted).model_dump()
+                for field, values in plants.as_dict().items():
+                    value = values[position]
+                    document[field] = bool(value) if values.dtype == bool else float(value)
+                documents.append(document)
+            await server.db.plants.insert_many(documents)
+
+            # End to end: read the garden, score it, write every plant back
+            start = time.perf_counter()
+            updated = await server.garden_tick(garden_id)
+            elapsed = time.perf_counter() - start
+            assert len(updated) == count
+            results[f'tick.plants_{count}.end_to_end_s'] = elapsed
+            results[f'tick.plants_{count}.end_to_end_plants_per_s'] = count / elapsed
+
+            # Model and rules only, on the same plants
+            start = time.perf_counter()
+            await server.compute_growth(plants, environment)
+            elapsed = time.perf_counter() - start
+            results[f'tick.plants_{count}.compute_s'] = elapsed
+            results[f'tick.plants_{count}.compute_plants_per_s'] = count / elapsed
+            print(f"  {count} plants: tick {results[f'tick.plants_{count}.end_to_end_s']:.3f}s, "
+                  f"compute {elapsed:.4f}s")
+    finally:
+        await server.client.drop_database(os.environ['DB_NAME'])
+
+def bench_tick(args, results, environment):
+    server = import_server(environment)
+    asyncio.run(run_ticks(server, args, results))
+
+# Reporting
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import torch
+        torch_version = torch.__version__
+    except ImportError:
+        torch_version = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'torch': torch_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'mongo': 'mongod' if args.mongo_url else 'mongomock',
+        'sections': args.sections
+    }
+
+def higher_is_better(metric):
+    return metric.endswith('_per_s')
+
+def compare(results, baseline, threshold):
+    """Print each metric against the baseline; returns the names of metrics that regressed"""
+    regressions = []
+    print(f"{'metric':<64} {'baseline':>12} {'current':>12} {'change':>8}")
+    for metric, value in results.items():
+        old = baseline.get(metric)
+        if old is None or metric.endswith('.errors'):
+            continue
+        if old == 0:
+            continue
+        change = (value - old) / old
+        worse = -change if higher_is_better(metric) else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESSION'
+            regressions.append(metric)
+        elif worse < -threshold:
+            flag = '  improved'
+        print(f"{metric:<64} {old:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}")
+    for metric, value in results.items():
+        if metric.endswith('.errors') and value > baseline.get(metric, 0):
+            print(f"{metric}: {baseline.get(metric, 0)} -> {value}  REGRESSION")
+            regressions.append(metric)
+    return regressions
+
+SECTIONS = ('inference', 'model_load', 'cold_start', 'api', 'tick')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    parser.add_argument('--mongo-url', help='local mongod to use instead of mongomock')
+    parser.add_argument('--quick', action='store_true', help='shorter runs for a smoke test')
+    parser.add_argument('--seconds', type=float, default=5.0, help='load per API route')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent API connections')
+    parser.add_argument('--routes', nargs='+', help='only these API routes')
+    parser.add_argument('--api-plants', type=int, default=100, help='plants in the API benchmark garden')
+    parser.add_argument('--tick-plants', type=int, nargs='+', default=list(TICK_PLANT_COUNTS))
+    parser.add_argument('--min-seconds', type=float, default=0.5, help='time per inference measurement')
+    parser.add_argument('--load-repeats', type=int, default=5)
+    parser.add_argument('--cold-start-runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+    if args.quick:
+        args.seconds = min(args.seconds, 1.0)
+        args.min_seconds = min(args.min_seconds, 0.1)
+        args.load_repeats = min(args.load_repeats, 2)
+        args.cold_start_runs = 1
+        args.tick_plants = [count for count in args.tick_plants if count <= 1000]
+
+    weather, weather_url = start_weather_stub()
+    environment = server_environment(args.mongo_url, weather_url, f'gardensim_bench_{uuid.uuid4().hex[:8]}')
+    results = {}
+    try:
+        for section in args.sections:
+            print(f"== {section}")
+            start = time.perf_counter()
+            if section == 'inference':
+                bench_inference(args, results)
+            elif section == 'model_load':
+                bench_model_load(args, results)
+            elif section == 'cold_start':
+                bench_cold_start(args, results, environment)
+            elif section == 'api':
+                bench_api(args, results, environment)
+            elif section == 'tick':
+                bench_tick(args, results, environment)
+            print(f"   {time.perf_counter() - start:.1f}s")
+    finally:
+        weather.shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'meta': metadata(args), 'results': results}, indent=2))
+        print(f"Wrote {len(results)} metrics to {args.output}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+    elif not args.output:
+        print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Bulk crop recommendations for many (soil, weather) points.
+
+Rows are parsed and scored in fixed-size chunks, one vectorized forward pass
+per chunk, and results are produced as the chunks are scored, so memory stays
+constant however many rows come in. Used by POST /api/crop-recommendations/bulk
+and directly from Python:
+
+    from bulk_crops import recommend_bulk
+    for result in recommend_bulk([{'id': '94103', 'temperature': 18, 'humidity': 75, 'rainfall': 60}]):
+        print(result['id'], result['crops'][0])
+
+or from the backend directory:
+
+    python bulk_crops.py points.ndjson --output recommendations.ndjson
+
+A row has temperature, humidity and rainfall, and optionally soil_n, soil_p,
+soil_k and soil_ph (defaults as for a single recommendation) and an id that is
+echoed back. Input is a JSON array, NDJSON (one object per line) or an Arrow
+IPC stream with those columns (needs pyarrow). Each result is
+{"index": ..., ["id": ...,] "crops": [{"crop": ..., "suitability": ...}, ...]}
+or {"index": ..., "error": ...} for a row that could not be read.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import numpy_inference
+
+logger = logging.getLogger(__name__)
+
+# Model input order: [N, P, K, temperature, humidity, ph, rainfall]
+FEATURES = ('soil_n', 'soil_p', 'soil_k', 'temperature', 'humidity', 'soil_ph', 'rainfall')
+DEFAULTS = {'soil_n': 50.0, 'soil_p': 50.0, 'soil_k': 50.0, 'soil_ph': 6.5}
+DEFAULT_CHUNK_ROWS = 4096
+DEFAULT_TOP_K = 8
+# Longer NDJSON lines are reported as unreadable rather than buffered
+MAX_LINE_BYTES = 64 * 1024
+
+class TooLongLine(bytes):
+    """Stands in for an NDJSON line longer than MAX_LINE_BYTES; it is one row with an error"""
+
+LINE_TOO_LONG = TooLongLine(b'<line too long>')
+
+class Chunk:
+    """Feature rows of consecutive input rows; rows with an error have no usable features"""
+    __slots__ = ('start', 'ids', 'X', 'errors')
+
+    def __init__(self, start, ids, X, errors):
+        self.start = start
+        self.ids = ids
+        self.X = X
+        self.errors = errors
+
+    def __len__(self):
+        return len(self.X)
+
+def parse_records(records, start=0):
+    """Chunk from a list of row dicts"""
+    rows = []
+    ids = [None] * len(records)
+    errors = [None] * len(records)
+    missing = [0.0] * len(FEATURES)
+    for i, record in enumerate(records):
+        try:
+            ids[i] = record.get('id')
+            row = []
+            for field in FEATURES:
+                value = record.get(field)
+                # Required fields have no default and raise KeyError
+                row.append(float(DEFAULTS[field] if value is None else value))
+        except KeyError as e:
+            errors[i] = f"missing {e.args[0]}"
+            row = missing
+        except (AttributeError, TypeError, ValueError) as e:
+            errors[i] = f"invalid row: {e}"
+            row = missing
+        rows.append(row)
+    X = np.array(rows, dtype=np.float64).reshape(-1, len(FEATURES))
+    for i in np.flatnonzero(~np.isfinite(X).all(axis=1)):
+        errors[i] = "invalid row: non-finite value"
+    return Chunk(start, ids, X, errors)
+
+def parse_lines(lines, start=0):
+    """Chunk from NDJSON lines"""
+    records = []
+    for line in lines:
+        try:
+            records.append(None if isinstance(line, TooLongLine) else json.loads(line))
+        except ValueError:
+            records.append(None)
+    chunk = parse_records(records, start)
+    for i, (line, record) in enumerate(zip(lines, records)):
+        if isinstance(line, TooLongLine):
+            chunk.errors[i] = "line too long"
+        elif record is None:
+            chunk.errors[i] = "invalid JSON"
+    return chunk
+
+def chunk_records(records, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Chunks from any iterable of row dicts"""
+    batch = []
+    start = 0
+    for record in records:
+        batch.append(record)
+        if len(batch) == chunk_size:
+            yield parse_records(batch, start)
+            start += len(batch)
+            batch = []
+    if batch:
+        yield parse_records(batch, start)
+
+def chunk_lines(lines, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Chunks from NDJSON lines; blank lines are skipped"""
+    batch = []
+    start = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        batch.append(line)
+        if len(batch) == chunk_size:
+            yield parse_lines(batch, start)
+            start += len(batch)
+            batch = []
+    if batch:
+        yield parse_lines(batch, start)
+
+def chunk_array(X, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Chunks from an (n, 7) array of model-order features"""
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+    for start in range(0, len(X), chunk_size):
+        part = X[start:start + chunk_size]
+        yield Chunk(start, [None] * len(part), part, [None] * len(part))
+
+def chunk_arrow(source, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Chunks from an Arrow IPC stream (a file path, file object or buffer)"""
+    try:
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("Arrow input needs pyarrow (pip install pyarrow)")
+    return _arrow_chunks(pyarrow.ipc, source, chunk_size)
+
+def _arrow_chunks(ipc, source, chunk_size):
+    start = 0
+    with ipc.open_stream(source) as reader:
+        for batch in reader:
+            for offset in range(0, batch.num_rows, chunk_size):
+                part = batch.slice(offset, chunk_size)
+                yield _arrow_chunk(part, start)
+                start += part.num_rows
+
+def _arrow_chunk(batch, start):
+    names = batch.schema.names
+    count = batch.num_rows
+    X = np.empty((count, len(FEATURES)), dtype=np.float64)
+    errors = [None] * count
+    for column, field in enumerate(FEATURES):
+        if field in names:
+            # Nulls come out as NaN
+            values = batch.column(field).cast('float64').to_numpy(zero_copy_only=False)
+        elif field in DEFAULTS:
+            values = np.full(count, DEFAULTS[field])
+        else:
+            raise ValueError(f"Arrow input has no {field} column")
+        if field in DEFAULTS:
+            values = np.where(np.isnan(values), DEFAULTS[field], values)
+        X[:, column] = values
+    for i in np.flatnonzero(~np.isfinite(X).all(axis=1)):
+        errors[i] = "missing or non-finite value"
+    ids = batch.column('id').to_pylist() if 'id' in names else [None] * count
+    return Chunk(start, ids, X, errors)
+
+def model_scorer(model, top_k=DEFAULT_TOP_K):
+    """score(X) -> (probabilities, names) of the top_k crops, for a NumpyCropModel"""
+    classes = np.asarray(model.classes, dtype=object)
+
+    def score(X):
+        indices, probabilities = model.top_k(X, top_k)
+        return probabilities, classes[indices]
+    return score
+
+def score_chunk(chunk, score):
+    """Result dicts for every row of a chunk; score(X) -> (probabilities, names) of the top crops"""
+    valid = np.array([error is None for error in chunk.errors], dtype=bool)
+    probabilities, names = score(chunk.X[valid]) if valid.any() else (None, None)
+    results = []
+    scored = 0
+    for i, (row_id, error) in enumerate(zip(chunk.ids, chunk.errors)):
+        result = {'index': chunk.start + i}
+        if row_id is not None:
+            result['id'] = row_id
+        if error is not None:
+            result['error'] = error
+        else:
+            result['crops'] = [
+                {'crop': name, 'suitability': float(probability) * 100}
+                for name, probability in zip(names[scored], probabilities[scored])
+            ]
+            scored += 1
+        results.append(result)
+    return results
+
+def encode(results):
+    """NDJSON text for a list of results"""
+    return ''.join(json.dumps(result, separators=(',', ':')) + '\n' for result in results)
+
+def encode_chunk(chunk, score):
+    """NDJSON text of score_chunk's results, formatted straight from the score arrays"""
+    valid = np.array([error is None for error in chunk.errors], dtype=bool)
+    if valid.any():
+        probabilities, names = score(chunk.X[valid])
+        suitabilities = (probabilities.astype(np.float64) * 100).tolist()
+        names = names.tolist()
+    quoted = {}
+    lines = []
+    scored = 0
+    for i, (row_id, error) in enumerate(zip(chunk.ids, chunk.errors)):
+        head = f'{{"index":{chunk.start + i}'
+        if row_id is not None:
+            head += ',"id":' + json.dumps(row_id)
+        if error is not None:
+            lines.append(f'{head},"error":{json.dumps(error)}}}\n')
+            continue
+        crops = []
+        for name, suitability in zip(names[scored], suitabilities[scored]):
+            if name not in quoted:
+                quoted[name] = json.dumps(name)
+            crops.append(f'{{"crop":{quoted[name]},"suitability":{suitability!r}}}')
+        lines.append(f'{head},"crops":[{",".join(crops)}]}}\n')
+        scored += 1
+    return ''.join(lines)
+
+async def aiter_lines(stream, max_line_bytes=MAX_LINE_BYTES):
+    """Lines of an async byte stream (e.g. a request body), without buffering the whole body
+
+    A line longer than max_line_bytes comes out as a single LINE_TOO_LONG, and
+    the rest of it is skipped, so the rows after it keep their index.
+    """
+    buffer = b''
+    skipping = False
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if skipping:
+                # The end of a line already reported as too long
+                skipping = False
+            elif len(line) > max_line_bytes:
+                yield LINE_TOO_LONG
+            else:
+                yield line
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield LINE_TOO_LONG
+                skipping = True
+            buffer = b''
+    if buffer and not skipping:
+        yield LINE_TOO_LONG if len(buffer) > max_line_bytes else buffer
+
+def open_chunks(source, chunk_size=DEFAULT_CHUNK_ROWS):
+    """Chunks from a path (.ndjson/.jsonl, .json or .arrow), an array or an iterable of row dicts"""
+    if isinstance(source, (str, Path)):
+        path = Path(source)
+        if path.suffix in ('.arrow', '.arrows'):
+            return chunk_arrow(str(path), chunk_size)
+        if path.suffix == '.json':
+            return chunk_records(json.loads(path.read_text()), chunk_size)
+        return _chunk_file_lines(path, chunk_size)
+    if isinstance(source, np.ndarray):
+        return chunk_array(source, chunk_size)
+    return chunk_records(source, chunk_size)
+
+def _chunk_file_lines(path, chunk_size):
+    with open(path, 'rb') as f:
+        yield from chunk_lines(f, chunk_size)
+
+def recommend_bulk(source, model=None, chunk_size=DEFAULT_CHUNK_ROWS, top_k=DEFAULT_TOP_K):
+    """Yield a result dict per input row (see the module docstring), scoring chunk by chunk"""
+    score = model_scorer(model or numpy_inference.load_crop_model(), top_k)
+    for chunk in open_chunks(source, chunk_size):
+        yield from score_chunk(chunk, score)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', help='.ndjson/.jsonl, .json or .arrow file of points')
+    parser.add_argument('--output', help='NDJSON results (default: stdout)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    score = model_scorer(numpy_inference.load_crop_model(), args.top_k)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    rows = errors = 0
+    start = time.perf_counter()
+    try:
+        for chunk in open_chunks(args.input, args.chunk_size):
+            output.write(encode_chunk(chunk, score))
+            rows += len(chunk)
+            errors += sum(error is not None for error in chunk.errors)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Scored {rows:,} rows ({errors:,} unreadable) in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
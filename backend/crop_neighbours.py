@@ -0,0 +1,100 @@
+"""Nearest rows of the crop dataset to given soil and weather conditions.
+
+Features are standardised with the dataset's own mean and standard deviation
+(N and rainfall would otherwise dominate the distance) and indexed in a
+scipy cKDTree. Without scipy, queries fall back to brute-force distances in
+NumPy, which give the same answers more slowly.
+"""
+import logging
+import time
+
+import numpy as np
+
+from numpy_inference import partial_top_k
+
+logger = logging.getLogger(__name__)
+
+# Names of the 7 model-order features in API requests
+CONDITION_FIELDS = ('soil_n', 'soil_p', 'soil_k', 'temperature', 'humidity', 'soil_ph', 'rainfall')
+# Rows compared at once by the brute-force fallback, to bound its memory
+BRUTE_FORCE_CHUNK_ROWS = 1024
+
+class CropNeighbourIndex:
+    """k-nearest-neighbour lookups over dataset rows in standardised feature space"""
+    def __init__(self, X, labels, classes, leafsize=32):
+        # X: (n, 7) raw features in model order; labels: codes into classes
+        X = np.asarray(X, dtype=np.float64)
+        self.X = X
+        self.labels = np.asarray(labels)
+        self.classes = list(classes)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.points = (X - self.mean) / self.scale
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            logger.warning("scipy is not installed, nearest-neighbour lookups use brute force")
+            self.tree = None
+        else:
+            self.tree = cKDTree(self.points, leafsize=leafsize)
+
+    @classmethod
+    def from_dataset(cls, dataset_path=None):
+        from data_manager import load_arrays
+        start = time.perf_counter()
+        arrays = load_arrays(dataset_path)
+        index = cls(arrays.X, arrays.labels, arrays.classes)
+        logger.info(f"Built crop neighbour index over {len(arrays):,} rows in {time.perf_counter() - start:.3f}s")
+        return index
+
+    def __len__(self):
+        return len(self.X)
+
+    def query(self, conditions, k=5):
+        """Distances (in standard deviations) and row indices of the k nearest rows, for (m, 7) conditions"""
+        Q = (np.asarray(conditions, dtype=np.float64).reshape(-1, self.X.shape[1]) - self.mean) / self.scale
+        k = min(k, len(self.X))
+        if self.tree is not None:
+            distances, indices = self.tree.query(Q, k=k)
+            return distances.reshape(len(Q), k), indices.reshape(len(Q), k)
+        return brute_force_query(self.points, Q, k)
+
+    def votes(self, indices):
+        """(m, classes) share of each query's neighbours that grow each crop"""
+        counts = np.zeros((len(indices), len(self.classes)))
+        np.add.at(counts, (np.arange(len(indices))[:, None], self.labels[indices]), 1.0)
+        return counts / indices.shape[1]
+
+    def neighbours(self, conditions, k=5):
+        """For one row of conditions: the nearest dataset rows and the crops they vote for, most votes first"""
+        distances, indices = self.query(conditions, k)
+        shares = self.votes(indices)[0]
+        crops = np.flatnonzero(shares)
+        crops = crops[np.argsort(-shares[crops], kind='stable')]
+        return {
+            'neighbours': [
+                {
+                    'row': int(row),
+                    'crop': self.classes[self.labels[row]],
+                    'distance': float(distance),
+                    'conditions': dict(zip(CONDITION_FIELDS, self.X[row].tolist()))
+                }
+                for distance, row in zip(distances[0], indices[0])
+            ],
+            'votes': [{'crop': self.classes[crop], 'share': float(shares[crop])} for crop in crops]
+        }
+
+def brute_force_query(points, Q, k):
+    """Exact k nearest rows of points for each row of Q, by computing every distance"""
+    distances = np.empty((len(Q), k))
+    indices = np.empty((len(Q), k), dtype=np.intp)
+    squared_norms = (points ** 2).sum(axis=1)
+    for start in range(0, len(Q), BRUTE_FORCE_CHUNK_ROWS):
+        chunk = Q[start:start + BRUTE_FORCE_CHUNK_ROWS]
+        end = start + len(chunk)
+        # |q - p|^2 = |q|^2 - 2 q.p + |p|^2
+        negative_squared = 2 * chunk @ points.T - squared_norms - (chunk ** 2).sum(axis=1)[:, None]
+        indices[start:end] = partial_top_k(negative_squared, k)
+        distances[start:end] = np.sqrt(np.maximum(-np.take_along_axis(negative_squared, indices[start:end], axis=1), 0.0))
+    return distances, indices
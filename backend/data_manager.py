@@ -1,14 +1,27 @@
-import kagglehub
 from pathlib import Path
-import pandas as pd
-import os
+import hashlib
+import json
+import shutil
+import tempfile
+
+import numpy as np
 
 DATA_DIR = Path(__file__).parent / 'data'
 DATA_DIR.mkdir(exist_ok=True)
+CACHE_DIR = DATA_DIR / 'cache'
+DATASET_PATH = DATA_DIR / 'Crop_recommendation.csv'
+
+# Model input order; the CSV's crop column is 'label'
+FEATURE_COLUMNS = ('N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall')
+LABEL_COLUMN = 'label'
+DEFAULT_CHUNK_ROWS = 65536
+# Bump when the cache layout changes so old caches are rebuilt
+CACHE_FORMAT = 1
 
 def download_crop_dataset():
     """Download crop recommendation dataset from Kaggle"""
     try:
+        import kagglehub
         print('Downloading crop recommendation dataset...')
         path = kagglehub.dataset_download("atharvaingle/crop-recommendation-dataset")
         print(f"Dataset downloaded to: {path}")
@@ -21,7 +34,7 @@ def download_crop_dataset():
             
             # Copy to our data directory
             import shutil
-            dest_path = DATA_DIR / 'Crop_recommendation.csv'
+            dest_path = DATASET_PATH
             shutil.copy(dataset_path, dest_path)
             print(f"Dataset copied to: {dest_path}")
             return dest_path
@@ -34,14 +47,114 @@ def download_crop_dataset():
 
 def get_dataset_path():
     """Get path to the crop dataset, download if needed"""
-    dataset_path = DATA_DIR / 'Crop_recommendation.csv'
+    dataset_path = DATASET_PATH
     if not dataset_path.exists():
         dataset_path = download_crop_dataset()
     return dataset_path
 
 def load_dataset():
     """Load the crop recommendation dataset"""
+    import pandas as pd
     dataset_path = get_dataset_path()
     if dataset_path and dataset_path.exists():
         return pd.read_csv(dataset_path)
-    return None
\ No newline at end of file
+    return None
+
+class DatasetArrays:
+    """Typed columns of a crop dataset: float32 features in model order and label codes into classes"""
+    def __init__(self, X, labels, classes):
+        self.X = X
+        self.labels = labels
+        self.classes = classes
+
+    def __len__(self):
+        return len(self.X)
+
+    def label_names(self):
+        return np.asarray(self.classes, dtype=object)[self.labels]
+
+def iter_chunks(dataset_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """(float32 features, label strings) chunks of a CSV, reading chunk_rows rows at a time"""
+    import pandas as pd
+    columns = list(FEATURE_COLUMNS) + [LABEL_COLUMN]
+    dtypes = dict.fromkeys(FEATURE_COLUMNS, np.float32)
+    for df in pd.read_csv(dataset_path, usecols=columns, dtype=dtypes, chunksize=chunk_rows):
+        yield df[list(FEATURE_COLUMNS)].to_numpy(dtype=np.float32), df[LABEL_COLUMN].to_numpy(dtype=object)
+
+_hashes = {}
+
+def file_hash(path):
+    """sha256 of a file's contents, remembered while its size and mtime stay the same"""
+    path = Path(path)
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = _hashes[key] = sha.hexdigest()
+    return digest
+
+def _count_rows(path):
+    """Data rows of a CSV: non-blank lines after the header"""
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip()) - 1
+
+def build_cache(dataset_path, cache_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Convert a CSV into features.npy, labels.npy and classes.json in cache_path, chunk by chunk"""
+    count = _count_rows(dataset_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=cache_path.parent, prefix='.building-'))
+    try:
+        X = np.lib.format.open_memmap(staging / 'features.npy', mode='w+', dtype=np.float32,
+                                      shape=(count, len(FEATURE_COLUMNS)))
+        labels = np.lib.format.open_memmap(staging / 'labels.npy', mode='w+', dtype=np.int32, shape=(count,))
+        codes = {}
+        start = 0
+        for features, names in iter_chunks(dataset_path, chunk_rows):
+            end = start + len(features)
+            X[start:end] = features
+            labels[start:end] = [codes.setdefault(name, len(codes)) for name in names]
+            start = end
+        if start != count:
+            raise ValueError(f"Read {start} rows from {dataset_path}, expected {count}")
+        # Classes in sorted order, as sklearn's LabelEncoder numbers them
+        classes = sorted(codes)
+        remap = np.empty(len(codes), dtype=np.int32)
+        for name, code in codes.items():
+            remap[code] = classes.index(name)
+        labels[:] = remap[labels]
+        X.flush()
+        labels.flush()
+        del X, labels
+        (staging / 'classes.json').write_text(json.dumps(classes))
+        try:
+            staging.rename(cache_path)
+        except OSError:
+            # Another process built the same cache first
+            if not (cache_path / 'classes.json').exists():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def load_arrays(dataset_path=None, cache_dir=CACHE_DIR):
+    """The dataset as memory-mapped DatasetArrays, converted from the CSV once per version of the file"""
+    dataset_path = dataset_path or get_dataset_path()
+    if not dataset_path:
+        raise FileNotFoundError("Crop recommendation dataset is not available")
+    dataset_path = Path(dataset_path)
+    digest = file_hash(dataset_path)
+    cache_path = Path(cache_dir) / f'{dataset_path.stem}-v{CACHE_FORMAT}-{digest[:16]}'
+    if not (cache_path / 'classes.json').exists():
+        build_cache(dataset_path, cache_path)
+        # Caches of earlier versions of the file are no longer needed
+        for stale in cache_path.parent.glob(f'{dataset_path.stem}-v*-*'):
+            if stale != cache_path and stale.name.rsplit('-', 2)[0] == dataset_path.stem:
+                shutil.rmtree(stale, ignore_errors=True)
+    return DatasetArrays(
+        np.load(cache_path / 'features.npy', mmap_mode='r'),
+        np.load(cache_path / 'labels.npy', mmap_mode='r'),
+        json.loads((cache_path / 'classes.json').read_text())
+    )
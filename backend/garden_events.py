@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """One viewer's bounded queue of encoded messages; None means the stream has ended"""
+    def __init__(self, garden_id, max_queue):
+        self.garden_id = garden_id
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # Patches are only sent once the snapshot has been queued
+        self.ready = False
+        self.closed = False
+        self.dropped = False
+
+    def offer(self, message):
+        """Queue a message; returns False if the viewer has fallen too far behind"""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, dropped=False):
+        """End the stream; pending messages are discarded"""
+        if not self.closed:
+            self.closed = True
+            self.dropped = dropped
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+class GardenHub:
+    """Fans garden changes out to live viewers as a snapshot followed by field-level patches"""
+    def __init__(self, max_queue=64):
+        self.max_queue = max_queue
+        # garden_id -> {plant_id: plant document}, kept only while a garden has viewers
+        self._plants = {}
+        self._subscribers = {}
+        self._loading = {}
+        # garden_id -> changes published while the garden was being loaded
+        self._pending = {}
+
+        self.messages_published = 0
+        self.subscribers_dropped = 0
+
+    def has_subscribers(self, garden_id):
+        return bool(self._subscribers.get(garden_id))
+
+    async def subscribe(self, garden_id, load_plants):
+        """Register a viewer; its first message is a snapshot of the garden"""
+        # Registered before the garden loads, so changes published meanwhile
+        # are kept (see _load) and make it into the snapshot
+        subscription = Subscription(garden_id, self.max_queue)
+        self._subscribers.setdefault(garden_id, set()).add(subscription)
+        try:
+            if garden_id not in self._plants:
+                # The first viewer loads the garden once; later viewers share the copy
+                task = self._loading.get(garden_id)
+                if task is None:
+                    self._pending[garden_id] = []
+                    task = asyncio.ensure_future(self._load(garden_id, load_plants))
+                    self._loading[garden_id] = task
+                    task.add_done_callback(lambda _: self._loaded(garden_id))
+                # Shielded so one viewer disconnecting does not cancel the load for the others
+                await asyncio.shield(task)
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        if subscription.closed:
+            return subscription
+
+        subscription.offer(self._encode({
+            'type': 'snapshot',
+            'plants': sorted(self._plants[garden_id].values(), key=lambda plant: plant['position'])
+        }))
+        subscription.ready = True
+        return subscription
+
+    async def _load(self, garden_id, load_plants):
+        plants = {plant['id']: plant for plant in await load_plants(garden_id)}
+        # Replay what was published during the load, oldest first
+        for plant_documents, removed in self._pending.pop(garden_id, ()):
+            for plant in plant_documents:
+                plants.setdefault(plant['id'], {}).update(plant)
+            for plant_id in removed:
+                plants.pop(plant_id, None)
+        if self.has_subscribers(garden_id):
+            self._plants.setdefault(garden_id, plants)
+
+    def _loaded(self, garden_id):
+        # Also runs when the load failed or was cancelled before it started
+        self._loading.pop(garden_id, None)
+        self._pending.pop(garden_id, None)
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        subscribers = self._subscribers.get(subscription.garden_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.garden_id]
+                self._plants.pop(subscription.garden_id, None)
+
+    def publish_plants(self, garden_id, plants):
+        """Send the fields that changed in these plant documents to the garden's viewers"""
+        if not self.has_subscribers(garden_id):
+            return
+        if garden_id in self._pending:
+            self._pending[garden_id].append(([dict(plant) for plant in plants], ()))
+            return
+        known = self._plants.get(garden_id)
+        if known is None:
+            return
+        changes = {}
+        for plant in plants:
+            previous = known.get(plant['id'])
+            if previous is None:
+                changes[plant['id']] = dict(plant)
+                known[plant['id']] = dict(plant)
+                continue
+            diff = {field: value for field, value in plant.items() if previous.get(field) != value}
+            if diff:
+                changes[plant['id']] = diff
+                previous.update(diff)
+        if changes:
+            self._broadcast(garden_id, {'type': 'patch', 'plants': changes})
+
+    def publish_removed(self, garden_id, plant_ids):
+        """Tell the garden's viewers that plants were removed"""
+        if not self.has_subscribers(garden_id):
+            return
+        if garden_id in self._pending:
+            self._pending[garden_id].append(((), list(plant_ids)))
+            return
+        known = self._plants.get(garden_id)
+        if known is None:
+            return
+        removed = [plant_id for plant_id in plant_ids if known.pop(plant_id, None) is not None]
+        if removed:
+            self._broadcast(garden_id, {'type': 'patch', 'removed': removed})
+
+    def close(self):
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            'gardens': len(self._subscribers),
+            'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+            'messages_published': self.messages_published,
+            'subscribers_dropped': self.subscribers_dropped
+        }
+
+    def _encode(self, message):
+        return json.dumps(message, separators=(',', ':'))
+
+    def _broadcast(self, garden_id, message):
+        # Encoded once and shared by every viewer
+        encoded = self._encode(message)
+        self.messages_published += 1
+        for subscription in list(self._subscribers.get(garden_id, ())):
+            # A viewer still waiting for its snapshot gets these changes in it
+            if not subscription.ready:
+                continue
+            if not subscription.offer(encoded):
+                # Slow consumers are disconnected rather than buffered without
+                # bound; they reconnect and start again from a fresh snapshot
+                logger.info(f"Dropping slow viewer of garden {garden_id}")
+                self.subscribers_dropped += 1
+                subscription.close(dropped=True)
+                self.unsubscribe(subscription)
@@ -0,0 +1,437 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import orjson
+from pymongo import UpdateOne
+
+import simulation_rules
+
+logger = logging.getLogger(__name__)
+
+# Plant fields that are not simulated and live outside the arrays
+PLANT_INFO_FIELDS = ('position', 'plant_type', 'emoji', 'planted_date', 'last_watered', 'last_fertilized')
+# Fields written back to Mongo for a changed plant
+FLUSHED_FIELDS = simulation_rules.PlantArrays.FIELDS + ('last_watered', 'last_fertilized')
+
+class GardenState:
+    """In-memory state of one active garden: simulated fields in arrays, the rest in per-plant records"""
+    __slots__ = ('garden', 'ids', 'info', 'plants', 'rows', 'dirty', 'last_access')
+
+    def __init__(self, garden, plant_documents):
+        self.garden = garden
+        self.ids = [plant['id'] for plant in plant_documents]
+        self.info = [{field: plant.get(field) for field in PLANT_INFO_FIELDS} for plant in plant_documents]
+        self.plants = simulation_rules.PlantArrays.from_documents(plant_documents)
+        self.rows = {plant_id: row for row, plant_id in enumerate(self.ids)}
+        # Plant id to the fields changed since the last flush
+        self.dirty = {}
+        self.last_access = time.monotonic()
+
+    @property
+    def id(self):
+        return self.garden['id']
+
+    def row(self, plant_id):
+        return self.rows.get(plant_id)
+
+    def document(self, row):
+        """Plant document for a row, shaped like the Mongo document"""
+        document = {'id': self.ids[row], 'garden_id': self.id, **self.info[row]}
+        for field, values in self.plants.as_dict().items():
+            value = values[row]
+            document[field] = bool(value) if values.dtype == bool else float(value)
+        return document
+
+    def documents(self, rows=None):
+        return [self.document(row) for row in (range(len(self.ids)) if rows is None else rows)]
+
+    def changes(self, dirty):
+        """Changed fields of plants ({plant id: field names}), keyed by plant id"""
+        changes = {}
+        for plant_id, fields in dirty.items():
+            row = self.rows.get(plant_id)
+            if row is not None:
+                document = self.document(row)
+                changes[plant_id] = {field: document[field] for field in fields}
+        return changes
+
+    def columns(self, plant_ids, fields):
+        """Values of some fields for some plants, one list or array per field"""
+        rows = [self.rows[plant_id] for plant_id in plant_ids]
+        index = np.asarray(rows, dtype=np.intp)
+        arrays = self.plants.as_dict()
+        return {
+            field: arrays[field][index] if field in arrays else [self.info[row][field] for row in rows]
+            for field in fields
+        }
+
+    def apply(self, rows, rule, *args):
+        """Run a simulation_rules action on the plants at the given rows"""
+        plants = self.plants.subset(rows)
+        rule(plants, np.ones(len(rows), dtype=bool), *args)
+        self.plants.assign(rows, plants)
+
+    def add(self, plant):
+        self.ids.append(plant['id'])
+        self.info.append({field: plant.get(field) for field in PLANT_INFO_FIELDS})
+        self.plants.extend(simulation_rules.PlantArrays.from_documents([plant]))
+        self.rows[plant['id']] = len(self.ids) - 1
+
+    def remove(self, plant_id):
+        row = self.rows.pop(plant_id, None)
+        if row is None:
+            return False
+        del self.ids[row]
+        del self.info[row]
+        self.plants.delete(np.array([row]))
+        self.rows = {plant_id: row for row, plant_id in enumerate(self.ids)}
+        self.dirty.pop(plant_id, None)
+        return True
+
+class StateJournal:
+    """Append-only log of changes not yet flushed to Mongo, replayed after a crash"""
+    def __init__(self, path, fsync=False):
+        self.path = Path(path)
+        # Segment being flushed; kept until the flush succeeds
+        self.flushing_path = self.path.with_name(self.path.name + '.flushing')
+        self.fsync = fsync
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.entries = 0
+
+    def append(self, entry):
+        # orjson writes the NumPy value columns of plant entries directly
+        self._file.write(orjson.dumps(entry, option=orjson.OPT_SERIALIZE_NUMPY).decode() + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.entries += 1
+
+    def rotate(self):
+        """Move the current entries aside before a flush; new entries go to a fresh file"""
+        self._file.close()
+        if self.path.exists() and self.path.stat().st_size:
+            if self.flushing_path.exists():
+                # An earlier flush failed: merge its entries and the new ones
+                # into the latest values per plant, so retries do not grow it
+                self.compact()
+            else:
+                os.replace(self.path, self.flushing_path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self.entries = 0
+
+    def compact(self):
+        """Rewrite both segments as one flushing segment with one entry per changed garden"""
+        plant_changes, garden_changes = latest_changes(self.replay())
+        entries = [{'g': garden_id, 'garden': fields} for garden_id, fields in garden_changes.items()]
+        gardens = {}
+        for (garden_id, plant_id), fields in plant_changes.items():
+            gardens.setdefault(garden_id, {})[plant_id] = fields
+        entries.extend({'g': garden_id, 'plants': plants} for garden_id, plants in gardens.items())
+        staging = self.flushing_path.with_name(self.flushing_path.name + '.tmp')
+        with open(staging, 'w', encoding='utf-8') as segment:
+            for entry in entries:
+                segment.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            if self.fsync:
+                segment.flush()
+                os.fsync(segment.fileno())
+        os.replace(staging, self.flushing_path)
+        self.path.unlink(missing_ok=True)
+
+    def flushed(self):
+        """The rotated entries are in Mongo and no longer needed"""
+        self.flushing_path.unlink(missing_ok=True)
+
+    def replay(self):
+        """Every journaled entry, oldest first"""
+        for path in (self.flushing_path, self.path):
+            if not path.exists():
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write
+                        logger.warning(f"Skipping unreadable journal line in {path}")
+
+    def close(self):
+        self._file.close()
+
+def latest_changes(entries):
+    """Latest journaled fields per (garden id, plant id) and per garden id"""
+    plant_changes = {}
+    garden_changes = {}
+    for entry in entries:
+        if 'garden' in entry:
+            garden_changes.setdefault(entry['g'], {}).update(entry['garden'])
+        for plant_id, fields in entry.get('plants', {}).items():
+            plant_changes.setdefault((entry['g'], plant_id), {}).update(fields)
+        if 'ids' in entry:
+            # Columnar entry: one list of values per field, in the order of ids
+            columns = entry['fields']
+            for i, plant_id in enumerate(entry['ids']):
+                plant_changes.setdefault((entry['g'], plant_id), {}).update(
+                    (field, values[i]) for field, values in columns.items()
+                )
+    return plant_changes, garden_changes
+
+class GardenStateStore:
+    """Authoritative in-process state of active gardens with write-behind flushes to Mongo
+
+    Plant field changes are applied in memory, journaled locally and written to
+    Mongo in one bulk write per garden every flush interval (or sooner once
+    flush_threshold plants are dirty). Plant creation and removal still go
+    straight to Mongo, then through add_plant()/remove_plant(). Only one
+    process may own the gardens it serves.
+    """
+    def __init__(self, db, journal_path, flush_interval=5.0, flush_threshold=5000,
+                 idle_seconds=600.0, fsync=False, in_use=None):
+        self.db = db
+        # in_use(garden_id): whether something other than requests (live
+        # viewers) still needs the garden, which keeps it from being evicted
+        self.in_use = in_use
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.journal = None
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.idle_seconds = idle_seconds
+        self._gardens = {}
+        self._loading = {}
+        # garden_id -> changes made while the garden was being loaded, applied by _load
+        self._pending = {}
+        self._dirty_gardens = set()
+        self._dirty_count = 0
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+        self.loads = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.plants_flushed = 0
+
+    async def start(self):
+        """Replay any journal left by a crash, then start the flush loop"""
+        self._flush_lock = asyncio.Lock()
+        self.journal = StateJournal(self.journal_path, fsync=self.fsync)
+        await self.recover()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self.journal.close()
+
+    async def recover(self):
+        """Write journaled changes that never reached Mongo"""
+        plant_changes, garden_changes = latest_changes(self.journal.replay())
+        if plant_changes:
+            await self.db.plants.bulk_write([
+                UpdateOne({"garden_id": garden_id, "id": plant_id}, {"$set": fields})
+                for (garden_id, plant_id), fields in plant_changes.items()
+            ], ordered=False)
+        for garden_id, fields in garden_changes.items():
+            await self.db.gardens.update_one({"id": garden_id}, {"$set": fields})
+        if plant_changes or garden_changes:
+            logger.info(f"Recovered {len(plant_changes)} plant changes from the state journal")
+        self.journal.rotate()
+        self.journal.flushed()
+
+    def loaded(self, garden_id):
+        """The garden's state if it is in memory; unlike garden() this does not count as a use"""
+        return self._gardens.get(garden_id)
+
+    def active_gardens(self):
+        return [state.garden for state in self._gardens.values()]
+
+    async def garden(self, garden_id):
+        """The garden's state for a request, loading it from Mongo on first use; None if it does not exist
+
+        Resets the garden's idle timer, so only API and live-view access should
+        go through here; the simulation scheduler uses loaded().
+        """
+        state = self._gardens.get(garden_id)
+        if state is None:
+            task = self._loading.get(garden_id)
+            if task is None:
+                self._pending[garden_id] = []
+                task = asyncio.ensure_future(self._load(garden_id))
+                self._loading[garden_id] = task
+                task.add_done_callback(lambda _: self._loaded(garden_id))
+            # Shielded so one cancelled request does not cancel the load for the others
+            state = await asyncio.shield(task)
+        if state is not None:
+            state.last_access = time.monotonic()
+        return state
+
+    async def _load(self, garden_id):
+        garden = await self.db.gardens.find_one({"id": garden_id}, {"_id": 0})
+        if garden is None:
+            return None
+        plants = await self.db.plants.find({"garden_id": garden_id}, {"_id": 0}).to_list(None)
+        state = GardenState(garden, plants)
+        # Changes made during the reads, oldest first; those the reads already saw are no-ops
+        for change in self._pending.pop(garden_id, ()):
+            change(state)
+        state = self._gardens.setdefault(garden_id, state)
+        self.loads += 1
+        return state
+
+    def _loaded(self, garden_id):
+        self._loading.pop(garden_id, None)
+        self._pending.pop(garden_id, None)
+
+    def _apply(self, garden_id, change):
+        """Run change(state) on the garden in memory, or on it once it has loaded"""
+        state = self._gardens.get(garden_id)
+        if state is not None:
+            return change(state)
+        pending = self._pending.get(garden_id)
+        if pending is not None:
+            pending.append(change)
+        return None
+
+    def add_plant(self, garden_id, plant):
+        """Track a plant just inserted into Mongo"""
+        def add(state):
+            if state.row(plant['id']) is None:
+                state.add(plant)
+        self._apply(garden_id, add)
+
+    def remove_plant(self, garden_id, plant_id):
+        """Forget a plant before it is deleted from Mongo; whether it was in memory"""
+        return bool(self._apply(garden_id, lambda state: state.remove(plant_id)))
+
+    def update_garden(self, garden_id, updates):
+        """Apply garden settings just written to Mongo"""
+        self._apply(garden_id, lambda state: state.garden.update(updates))
+
+    def mark_dirty(self, state, plant_ids, fields=FLUSHED_FIELDS):
+        """Record that some fields of plants changed in memory; journals their new values and
+        triggers a flush past the threshold"""
+        plant_ids = list(plant_ids)
+        if not plant_ids:
+            return
+        self.journal.append({'g': state.id, 'ids': plant_ids, 'fields': state.columns(plant_ids, fields)})
+        before = len(state.dirty)
+        for plant_id in plant_ids:
+            state.dirty.setdefault(plant_id, set()).update(fields)
+        self._dirty_count += len(state.dirty) - before
+        self._dirty_gardens.add(state.id)
+        if self._dirty_count >= self.flush_threshold and not self._flush_lock.locked():
+            asyncio.ensure_future(self.flush())
+
+    def mark_garden_dirty(self, state, fields):
+        """Record a change to the garden document itself"""
+        state.garden.update(fields)
+        self.journal.append({'g': state.id, 'garden': fields})
+        self._dirty_gardens.add(state.id)
+
+    async def flush(self):
+        """Write every dirty plant and garden to Mongo, one bulk write per garden"""
+        async with self._flush_lock:
+            if not self._dirty_gardens:
+                return
+            # Snapshot and clear synchronously so changes made during the
+            # writes below are kept for the next flush
+            batches = []
+            for garden_id in self._dirty_gardens:
+                state = self._gardens.get(garden_id)
+                if state is None:
+                    continue
+                batches.append((state, state.changes(state.dirty), dict(state.garden)))
+                state.dirty = {}
+            self._dirty_gardens = set()
+            self._dirty_count = 0
+            self.journal.rotate()
+
+            try:
+                for state, changes, garden in batches:
+                    if changes:
+                        await self.db.plants.bulk_write([
+                            UpdateOne(
+                                {"garden_id": state.id, "id": plant_id},
+                                {"$set": fields, "$setOnInsert": self._insert_fields(state, plant_id, fields)},
+                                upsert=True
+                            )
+                            for plant_id, fields in changes.items()
+                        ], ordered=False)
+                        # Plants removed while the write was in flight must not be left upserted
+                        removed = [plant_id for plant_id in changes if plant_id not in state.rows]
+                        if removed:
+                            await self.db.plants.delete_many({"garden_id": state.id, "id": {"$in": removed}})
+                    await self.db.gardens.update_one(
+                        {"id": state.id}, {"$set": {"last_tick_at": garden.get('last_tick_at')}}
+                    )
+                    self.plants_flushed += len(changes)
+            except Exception:
+                # Keep everything dirty; the rotated journal stays until a flush succeeds
+                for state, changes, _ in batches:
+                    for plant_id, fields in changes.items():
+                        if plant_id in state.rows:
+                            if plant_id not in state.dirty:
+                                self._dirty_count += 1
+                            state.dirty.setdefault(plant_id, set()).update(fields)
+                    self._dirty_gardens.add(state.id)
+                raise
+            self.journal.flushed()
+            self.flushes += 1
+
+    @staticmethod
+    def _insert_fields(state, plant_id, fields):
+        # The rest of the document, for a plant Mongo does not have yet
+        row = state.rows.get(plant_id)
+        if row is None:
+            return {}
+        document = state.document(row)
+        return {field: value for field, value in document.items() if field not in fields and field not in ('id', 'garden_id')}
+
+    async def evict_idle(self):
+        """Flush and drop gardens nobody has touched for idle_seconds"""
+        cutoff = time.monotonic() - self.idle_seconds
+        idle = [
+            garden_id for garden_id, state in self._gardens.items()
+            if state.last_access < cutoff and not (self.in_use and self.in_use(garden_id))
+        ]
+        if not idle:
+            return
+        await self.flush()
+        for garden_id in idle:
+            state = self._gardens.get(garden_id)
+            if state is not None and state.last_access < cutoff and not state.dirty:
+                del self._gardens[garden_id]
+                self.evictions += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"State store flush failed: {e}")
+
+    def stats(self):
+        return {
+            'gardens': len(self._gardens),
+            'plants': sum(len(state.ids) for state in self._gardens.values()),
+            'dirty_plants': self._dirty_count,
+            'journal_entries': self.journal.entries if self.journal else 0,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'flushes': self.flushes,
+            'plants_flushed': self.plants_flushed
+        }
@@ -0,0 +1,334 @@
+"""Per-plant growth history with automatic downsampling.
+
+Snapshots of a garden's plants are buffered in memory and inserted in
+batches into a MongoDB time-series collection, which stores them compressed
+column by column. Raw points are rolled up into per-hour and then per-day documents
+(ordinary collections, so a rollup can be upserted and safely repeated), and
+each level expires on its own schedule:
+
+    raw     one point per plant per sample interval, kept raw_retention seconds
+    hourly  avg/min/max per plant and hour, kept hourly_retention seconds
+    daily   avg/min/max per plant and day, kept for the life of the plant
+
+so storage per plant is bounded whatever the tick rate. On servers without
+time-series collections (MongoDB < 5, mongomock) raw points go into an
+ordinary collection with a TTL index.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('growth_stage', 'water_level', 'health', 'fertilizer_n', 'fertilizer_p', 'fertilizer_k')
+HOUR_MS = 3600 * 1000
+DAY_MS = 24 * HOUR_MS
+# Rollups wait this long after a period ends for buffered snapshots of it to land
+ROLLUP_DELAY = timedelta(minutes=2)
+
+def _truncate_expression(unit_ms):
+    """Aggregation expression for $ts truncated to the hour or day (UTC)"""
+    # $dateTrunc needs MongoDB 5; date part arithmetic works everywhere
+    parts = [
+        {'$multiply': [{'$minute': '$ts'}, 60 * 1000]},
+        {'$multiply': [{'$second': '$ts'}, 1000]},
+        {'$millisecond': '$ts'}
+    ]
+    if unit_ms == DAY_MS:
+        parts.append({'$multiply': [{'$hour': '$ts'}, HOUR_MS]})
+    return {'$subtract': ['$ts', {'$add': parts}]}
+
+def truncate(moment, unit_ms):
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0) if unit_ms == DAY_MS else moment
+
+def _as_utc(moment):
+    # Motor returns naive datetimes in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+class GrowthHistory:
+    """Buffers plant snapshots, writes them in batches and maintains the hourly and daily rollups"""
+    def __init__(self, db, sample_seconds=60.0, flush_interval=10.0, flush_threshold=5000,
+                 max_buffered=200000, raw_retention=2 * 86400, hourly_retention=90 * 86400,
+                 rollup_interval=300.0, prefix='plant_history'):
+        self.db = db
+        self.sample_seconds = sample_seconds
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.max_buffered = max_buffered
+        self.raw_retention = raw_retention
+        self.hourly_retention = hourly_retention
+        self.rollup_interval = rollup_interval
+        self.collections = {
+            'raw': db[f'{prefix}_raw'],
+            'hour': db[f'{prefix}_hourly'],
+            'day': db[f'{prefix}_daily']
+        }
+        self.rollup_state = db[f'{prefix}_rollups']
+        # (ts, garden_id, plant ids, {field: values}) per recorded batch
+        self._buffer = []
+        self._buffered = 0
+        # Documents of a flush that failed, retried by the next one
+        self._pending = []
+        self._last_sampled = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._tasks = []
+
+        self.points_written = 0
+        self.points_dropped = 0
+        self.rollups = 0
+
+    async def setup(self):
+        """Create the collections (time-series for raw points where supported) and their indexes"""
+        raw = self.collections['raw']
+        key = [('meta.garden_id', 1), ('meta.plant_id', 1), ('ts', 1)]
+        if raw.name not in await self.db.list_collection_names():
+            try:
+                await self.db.create_collection(
+                    raw.name,
+                    timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'minutes'},
+                    expireAfterSeconds=int(self.raw_retention)
+                )
+            except CollectionInvalid:
+                pass
+            except (OperationFailure, NotImplementedError) as e:
+                logger.warning(f"Time-series collections unavailable ({e}), storing raw growth history with a TTL index")
+                await raw.create_index('ts', expireAfterSeconds=int(self.raw_retention))
+        await raw.create_index(key)
+        # One document per plant and period, so rolling a period up again replaces it
+        await self.collections['hour'].create_index(key, unique=True)
+        await self.collections['hour'].create_index('ts', expireAfterSeconds=int(self.hourly_retention))
+        await self.collections['day'].create_index(key, unique=True)
+
+    async def start(self):
+        self._flush_lock = asyncio.Lock()
+        await self.setup()
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._rollup_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.flush()
+
+    def due(self, key):
+        """Whether key (a garden, or a garden and plant) has not been sampled for sample_seconds"""
+        now = time.monotonic()
+        last = self._last_sampled.get(key)
+        if last is not None and now - last < self.sample_seconds:
+            return False
+        self._last_sampled[key] = now
+        self._last_sampled.move_to_end(key)
+        while len(self._last_sampled) > 100000:
+            self._last_sampled.popitem(last=False)
+        return True
+
+    def record(self, garden_id, plant_ids, values, key=None):
+        """Buffer one snapshot of some plants; values maps each of FIELDS to one value per plant
+
+        Skipped if key (default: the garden) was sampled less than
+        sample_seconds ago, so frequent ticks do not multiply the history.
+        """
+        if not plant_ids or not self.due(key or garden_id):
+            return False
+        if self._buffered + len(self._pending) + len(plant_ids) > self.max_buffered:
+            # Mongo is not keeping up; history is the first thing to give way
+            self.points_dropped += len(plant_ids)
+            return False
+        columns = {field: np.array(values[field], dtype=np.float64) for field in FIELDS}
+        self._buffer.append((datetime.now(timezone.utc), garden_id, list(plant_ids), columns))
+        self._buffered += len(plant_ids)
+        if self._buffered >= self.flush_threshold:
+            asyncio.ensure_future(self._flush_logged())
+        return True
+
+    def record_documents(self, garden_id, plants, key=None):
+        """record() for a list of plant documents"""
+        return self.record(
+            garden_id, [plant['id'] for plant in plants],
+            {field: [plant.get(field, 0.0) for plant in plants] for field in FIELDS}, key
+        )
+
+    async def flush(self):
+        """Insert every buffered snapshot; points a failed insert did not store are kept for the next flush"""
+        async with self._flush_lock:
+            if self._buffer:
+                batches, self._buffer, self._buffered = self._buffer, [], 0
+                self._pending.extend(await asyncio.to_thread(self._documents, batches))
+            if not self._pending:
+                return
+            documents, self._pending = self._pending, []
+            try:
+                await self.collections['raw'].insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                # The rest were stored; retrying them would duplicate them
+                errors = e.details.get('writeErrors', [])
+                failed = sorted({error['index'] for error in errors if error.get('code') != 11000})
+                self._pending = [documents[i] for i in failed] + self._pending
+                self.points_written += len(documents) - len(errors)
+                if self._pending:
+                    raise
+                return
+            except Exception:
+                self._pending = documents + self._pending
+                raise
+            self.points_written += len(documents)
+
+    @staticmethod
+    def _documents(batches):
+        documents = []
+        for ts, garden_id, plant_ids, columns in batches:
+            rows = zip(*(columns[field].tolist() for field in FIELDS))
+            documents.extend(
+                {'ts': ts, 'meta': {'garden_id': garden_id, 'plant_id': plant_id}, **dict(zip(FIELDS, row))}
+                for plant_id, row in zip(plant_ids, rows)
+            )
+        return documents
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Growth history flush failed: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+
+    async def _rollup_loop(self):
+        while True:
+            try:
+                await self.rollup()
+            except Exception as e:
+                logger.error(f"Growth history rollup failed: {e}")
+            await asyncio.sleep(self.rollup_interval)
+
+    async def rollup(self, now=None):
+        """Roll every completed hour of raw points into hourly ones, then every completed day into daily ones"""
+        now = now or datetime.now(timezone.utc)
+        await self._rollup('raw', 'hour', HOUR_MS, now)
+        await self._rollup('hour', 'day', DAY_MS, now)
+
+    async def _rollup(self, source, target, unit_ms, now):
+        end = truncate(now - ROLLUP_DELAY, unit_ms)
+        state = await self.rollup_state.find_one({'_id': target})
+        if state is None:
+            first = await self.collections[source].find_one({}, {'ts': 1}, sort=[('ts', 1)])
+            if first is None:
+                return
+            start = truncate(_as_utc(first['ts']), unit_ms)
+        else:
+            start = _as_utc(state['until'])
+        if start >= end:
+            return
+
+        group = {'_id': {'meta': '$meta', 'ts': _truncate_expression(unit_ms)}}
+        for field in FIELDS:
+            if source == 'raw':
+                group[field] = {'$sum': f'${field}'}
+                group[f'{field}_min'] = {'$min': f'${field}'}
+                group[f'{field}_max'] = {'$max': f'${field}'}
+            else:
+                # Averages of averages are weighted by the samples behind them
+                group[field] = {'$sum': {'$multiply': [f'${field}', '$samples']}}
+                group[f'{field}_min'] = {'$min': f'${field}_min'}
+                group[f'{field}_max'] = {'$max': f'${field}_max'}
+        group['samples'] = {'$sum': 1 if source == 'raw' else '$samples'}
+        pipeline = [{'$match': {'ts': {'$gte': start, '$lt': end}}}, {'$group': group}]
+
+        # Upserted per plant and period, so a rollup repeated after a failure
+        # (or by another worker) replaces what it wrote before
+        batch = []
+        async for row in self.collections[source].aggregate(pipeline, allowDiskUse=True):
+            key = row.pop('_id')
+            samples = row['samples']
+            for field in FIELDS:
+                row[field] = row[field] / samples
+            batch.append(UpdateOne(
+                {'meta.garden_id': key['meta']['garden_id'], 'meta.plant_id': key['meta']['plant_id'], 'ts': key['ts']},
+                {'$set': row},
+                upsert=True
+            ))
+            if len(batch) >= self.flush_threshold:
+                await self.collections[target].bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await self.collections[target].bulk_write(batch, ordered=False)
+
+        # The watermark only moves once the period is written
+        if state is None:
+            try:
+                await self.rollup_state.insert_one({'_id': target, 'until': end})
+            except DuplicateKeyError:
+                pass
+        else:
+            await self.rollup_state.update_one({'_id': target, 'until': state['until']}, {'$set': {'until': end}})
+        self.rollups += 1
+        logger.info(f"Rolled growth history up to {target}s until {end.isoformat()}")
+
+    def resolution_for(self, start, end, limit, now=None):
+        """Finest level that still holds start and needs at most limit points to cover start-end"""
+        now = now or datetime.now(timezone.utc)
+        span = (end - start).total_seconds()
+        if start >= now - timedelta(seconds=self.raw_retention) and span / max(self.sample_seconds, 1.0) <= limit:
+            return 'raw'
+        if start >= now - timedelta(seconds=self.hourly_retention) and span / 3600 <= limit:
+            return 'hour'
+        return 'day'
+
+    async def query(self, garden_id, plant_id, start, end, resolution, limit, after=None):
+        """Up to limit points of one plant in [start, end) and later than after, oldest first"""
+        ts = {'$gte': start, '$lt': end}
+        if after is not None:
+            ts['$gt'] = after
+        cursor = self.collections[resolution].find(
+            {'meta.garden_id': garden_id, 'meta.plant_id': plant_id, 'ts': ts},
+            {'_id': 0, 'meta': 0}
+        ).sort('ts', 1).limit(limit)
+        points = await cursor.to_list(limit)
+        for point in points:
+            point['ts'] = _as_utc(point['ts']).isoformat()
+        return points
+
+    async def forget(self, garden_id, plant_id):
+        """Delete a removed plant's history at every level, including points not yet written"""
+        self._last_sampled.pop((garden_id, plant_id), None)
+        # Under the flush lock, so a flush in flight cannot write its points afterwards
+        async with self._flush_lock:
+            buffer = []
+            for ts, batch_garden_id, plant_ids, columns in self._buffer:
+                if batch_garden_id == garden_id and plant_id in plant_ids:
+                    keep = [i for i, other in enumerate(plant_ids) if other != plant_id]
+                    self._buffered -= len(plant_ids) - len(keep)
+                    if not keep:
+                        continue
+                    plant_ids = [plant_ids[i] for i in keep]
+                    columns = {field: values[keep] for field, values in columns.items()}
+                buffer.append((ts, batch_garden_id, plant_ids, columns))
+            self._buffer = buffer
+            self._pending = [
+                document for document in self._pending
+                if document['meta'] != {'garden_id': garden_id, 'plant_id': plant_id}
+            ]
+            for collection in self.collections.values():
+                await collection.delete_many({'meta.garden_id': garden_id, 'meta.plant_id': plant_id})
+
+    def stats(self):
+        return {
+            'buffered_points': self._buffered + len(self._pending),
+            'points_written': self.points_written,
+            'points_dropped': self.points_dropped,
+            'rollups': self.rollups
+        }
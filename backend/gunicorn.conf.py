@@ -0,0 +1,36 @@
+"""Gunicorn settings for serving the API from several worker processes.
+
+Run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The app is imported once in the master with PRELOAD_MODELS=true, so the
+models are trained (if needed) and loaded before the workers are forked and
+every worker shares them copy-on-write. The NumPy backend's model artifacts
+are memory-mapped, so even models reloaded later in a worker share the page
+cache. WEB_CONCURRENCY sets the number of workers.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = os.environ.get('BIND', '0.0.0.0:8001')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() == 'true'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+if preload_app:
+    os.environ.setdefault('PRELOAD_MODELS', 'true')
+
+# The in-memory state store owns its gardens and must run in a single process
+if workers > 1 and os.environ.get('STATE_STORE', 'mongo').lower() == 'memory':
+    sys.exit("STATE_STORE=memory needs a single worker (WEB_CONCURRENCY=1)")
+
+def post_fork(server, worker):
+    # A worker forked from a master that imported torch gets one intra-op
+    # thread so the workers do not oversubscribe the CPUs between them
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(int(os.environ.get('TORCH_THREADS_PER_WORKER', '1')))
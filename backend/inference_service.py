@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import INFERENCE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Collects concurrent inference requests and scores them in one batched forward pass"""
+    def __init__(self, name, predict_batch, max_batch_size=64, max_wait_ms=5.0, latency_window=1024):
+        # predict_batch: (n, features) ndarray -> ndarray with n rows (or a tuple of
+        # them), run off the event loop
+        self.name = name
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._pending = None
+
+        # Metrics
+        self.requests_total = 0
+        self.batches_total = 0
+        self.rows_total = 0
+        self.largest_batch = 0
+        self._latencies = deque(maxlen=latency_window)
+
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._pending = None
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop, failing any requests still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} inference service stopped"))
+
+    async def submit(self, rows):
+        """Queue one or more feature rows and wait for their predictions"""
+        X = np.asarray(rows, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((X, future, time.perf_counter()))
+        return await future
+
+    def metrics(self):
+        """Queue depth, batch size and latency statistics"""
+        latencies = np.array(self._latencies) * 1000.0
+        return {
+            'name': self.name,
+            'queue_depth': self._queue.qsize(),
+            'requests_total': self.requests_total,
+            'batches_total': self.batches_total,
+            'rows_total': self.rows_total,
+            'avg_batch_size': self.rows_total / self.batches_total if self.batches_total else 0.0,
+            'max_batch_size_seen': self.largest_batch,
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'latency_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.0
+        }
+
+    async def _collect(self):
+        # Block for the first request, then gather more until the batch is
+        # full or the wait window closes
+        batch = [self._pending or await self._queue.get()]
+        self._pending = None
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if rows + len(item[0]) > self.max_batch_size:
+                # Keep oversized requests for the next batch
+                self._pending = item
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+            X = np.concatenate([item[0] for item in batch])
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                INFERENCE_SECONDS.observe(started - enqueued, model=self.name, stage='queue_wait')
+            try:
+                predictions = await loop.run_in_executor(None, self.predict_batch, X)
+            except Exception as e:
+                logger.error(f"{self.name} batch inference failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            INFERENCE_SECONDS.observe(finished - started, model=self.name, stage='batch')
+            start = 0
+            for rows, future, enqueued in batch:
+                end = start + len(rows)
+                if not future.done():
+                    if isinstance(predictions, tuple):
+                        future.set_result(tuple(p[start:end] for p in predictions))
+                    else:
+                        future.set_result(predictions[start:end])
+                self._latencies.append(finished - enqueued)
+                start = end
+
+            self.requests_total += len(batch)
+            self.batches_total += 1
+            self.rows_total += len(X)
+            self.largest_batch = max(self.largest_batch, len(X))
@@ -0,0 +1,231 @@
+"""Prometheus-format metrics for the API, MongoDB, model inference and weather fetches.
+
+Modules declare their metrics at import time on the shared REGISTRY and
+observe into them from any thread; GET /metrics renders the registry in the
+Prometheus text exposition format.
+"""
+import asyncio
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+# Seconds; fine enough at the bottom for single forward passes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+class Histogram:
+    """Cumulative-bucket histogram per combination of label values; safe to observe from any thread"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [count per bucket (last is +Inf)..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, **labels):
+        """Context manager observing the seconds spent in its block"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {values[-1]!r}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+class Callback:
+    """Gauge or counter read from existing state at scrape time; collect() -> {label values: value}"""
+    def __init__(self, name, help, kind, labelnames, collect):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        return [
+            f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+            for key, value in sorted(self.collect().items())
+        ]
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, collect, labelnames=()):
+        return self._register(Callback(name, help, 'gauge', labelnames, collect))
+
+    def counter(self, name, help, collect, labelnames=()):
+        return self._register(Callback(name, help, 'counter', labelnames, collect))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # One broken collector should not take the whole scrape down
+                lines.append(f'# {metric.name} unavailable: {_escape(e)}')
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'API requests until the response starts, by route template',
+    ('method', 'route', 'status')
+)
+HTTP_STAGE_SECONDS = REGISTRY.histogram(
+    'http_request_stage_seconds',
+    'Time per request in the endpoint function and in FastAPI (request validation, response serialization)',
+    ('route', 'stage')
+)
+MONGO_COMMAND_SECONDS = REGISTRY.histogram(
+    'mongodb_command_seconds', 'MongoDB commands as timed by the driver', ('command', 'collection', 'outcome')
+)
+INFERENCE_SECONDS = REGISTRY.histogram(
+    'inference_stage_seconds', 'Model inference stages (queue_wait, batch, scale, forward, top_k)', ('model', 'stage')
+)
+WEATHER_FETCH_SECONDS = REGISTRY.histogram(
+    'weather_fetch_seconds', 'Upstream WeatherAPI calls (cache hits are not fetched)', ('outcome',)
+)
+
+def stage_timer(model):
+    """timer(stage) -> context manager timing one inference stage of a model"""
+    def timer(stage):
+        return _Timer(INFERENCE_SECONDS, {'model': model, 'stage': stage})
+    return timer
+
+_endpoint_seconds = contextvars.ContextVar('endpoint_seconds', default=None)
+
+class TimedRoute(APIRoute):
+    """APIRoute recording request latency, and how much of it the endpoint function itself took"""
+    def get_route_handler(self):
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_call(**values):
+                start = time.perf_counter()
+                try:
+                    return await call(**values)
+                finally:
+                    timing = _endpoint_seconds.get()
+                    if timing is not None:
+                        timing[0] = time.perf_counter() - start
+            self.dependant.call = timed_call
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request):
+            timing = [None]
+            token = _endpoint_seconds.set(timing)
+            status = 500
+            start = time.perf_counter()
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _endpoint_seconds.reset(token)
+                HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route, status=status)
+                if timing[0] is not None:
+                    HTTP_STAGE_SECONDS.observe(timing[0], route=route, stage='endpoint')
+                    HTTP_STAGE_SECONDS.observe(elapsed - timing[0], route=route, stage='framework')
+        return timed_handler
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Feeds mongodb_command_seconds from the driver's command events"""
+    def __init__(self):
+        self._collections = {}  # request_id -> collection, between started and finished
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        self._observe(event, 'ok')
+
+    def failed(self, event):
+        self._observe(event, 'error')
+
+    def _observe(self, event, outcome):
+        MONGO_COMMAND_SECONDS.observe(
+            event.duration_micros / 1e6,
+            command=event.command_name,
+            collection=self._collections.pop(event.request_id, ''),
+            outcome=outcome
+        )
@@ -1,11 +1,15 @@
+import functools
+import time
 import torch
 import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
 import numpy as np
 from pathlib import Path
-import pandas as pd
 from sklearn.preprocessing import StandardScaler
 import joblib
 import os
+from numpy_inference import top_crops, untimed
+from data_manager import FEATURE_COLUMNS, load_arrays
 
 MODELS_DIR = Path(__file__).parent / 'models'
 MODELS_DIR.mkdir(exist_ok=True)
@@ -68,97 +72,214 @@ class CropRecommendationModel(nn.Module):
         x = self.fc4(x)
         return x
 
-def train_growth_model(dataset_path):
-    """Train the growth prediction model"""
-    df = pd.read_csv(dataset_path)
-    
-    # Use environmental factors as features
-    features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-    X = df[features].values
+FEATURES = list(FEATURE_COLUMNS)
+
+@functools.lru_cache(maxsize=4)
+def _parse_dataset(path, modified):
+    # Read from the dataset's columnar cache, built from the CSV on first use
+    arrays = load_arrays(path)
+    X = np.asarray(arrays.X, dtype=np.float64)
+    N, P, K, temperature, humidity = X[:, 0], X[:, 1], X[:, 2], X[:, 3], X[:, 4]
     
     # Create synthetic growth target (normalized combination of factors)
-    y = ((df['N'] / 140) * 0.2 + 
-         (df['P'] / 145) * 0.2 + 
-         (df['K'] / 205) * 0.2 + 
-         (df['humidity'] / 100) * 0.2 + 
-         ((df['temperature'] - 10) / 35) * 0.2).values.reshape(-1, 1)
+    growth_target = ((N / 140) * 0.2 + 
+                     (P / 145) * 0.2 + 
+                     (K / 205) * 0.2 + 
+                     (humidity / 100) * 0.2 + 
+                     ((temperature - 10) / 35) * 0.2).reshape(-1, 1)
+    return X, growth_target, arrays.label_names()
+
+def load_training_data(dataset_path):
+    """Features, growth targets and crop labels, parsed once per dataset file"""
+    path = Path(dataset_path)
+    return _parse_dataset(str(path), path.stat().st_mtime_ns)
+
+def split_indices(count, validation_split=0.0, seed=None):
+    """Shuffled train/validation row indices; everything is training data without a split"""
+    if not validation_split:
+        return np.arange(count), np.arange(0)
+    order = np.random.default_rng(seed).permutation(count)
+    validation = int(round(count * validation_split))
+    return np.sort(order[validation:]), np.sort(order[:validation])
+
+def fit(model, criterion, X, y, name, epochs, batch_size=None, X_val=None, y_val=None, patience=None,
+        lr=0.001, checkpoint_path=None, resume=False, seed=None, log_every=10):
+    """Train a model with Adam and return its per-epoch history
     
-    # Normalize features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    Trains full-batch unless batch_size is given. With validation data and a
+    patience, training stops once the validation loss has not improved for that
+    many epochs and the best weights are restored. A checkpoint is written after
+    every epoch and picked up again with resume=True.
+    """
+    if seed is not None:
+        torch.manual_seed(seed)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    history = []
+    best_loss = float('inf')
+    best_state = None
+    bad_epochs = 0
+    start_epoch = 0
     
-    # Convert to tensors
-    X_tensor = torch.FloatTensor(X_scaled)
-    y_tensor = torch.FloatTensor(y)
+    if resume and checkpoint_path and Path(checkpoint_path).exists():
+        checkpoint = torch.load(checkpoint_path, weights_only=True)
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        start_epoch = checkpoint['epoch']
+        history = checkpoint['history']
+        best_loss = checkpoint['best_loss']
+        best_state = checkpoint['best_state']
+        bad_epochs = checkpoint['bad_epochs']
+        print(f'{name} - Resuming from epoch {start_epoch}')
     
-    # Initialize model
-    model = GrowthPredictionModel(input_size=7)
-    criterion = nn.MSELoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    if batch_size:
+        generator = torch.Generator()
+        if seed is not None:
+            generator.manual_seed(seed + start_epoch)
+        # A final batch of one row would break BatchNorm
+        batches = DataLoader(TensorDataset(X, y), batch_size=batch_size, shuffle=True,
+                             generator=generator, drop_last=len(X) % batch_size == 1)
+    else:
+        batches = [(X, y)]
+    validate = X_val is not None and len(X_val) > 0
     
-    # Train
-    model.train()
-    epochs = 100
-    for epoch in range(epochs):
-        optimizer.zero_grad()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        loss.backward()
-        optimizer.step()
+    for epoch in range(start_epoch, epochs):
+        started = time.perf_counter()
+        model.train()
+        total_loss = 0.0
+        seen = 0
+        for X_batch, y_batch in batches:
+            optimizer.zero_grad()
+            loss = criterion(model(X_batch), y_batch)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(X_batch)
+            seen += len(X_batch)
+        train_loss = total_loss / seen
         
-        if (epoch + 1) % 20 == 0:
-            print(f'Growth Model - Epoch [{epoch+1}/{epochs}], Loss: {loss.item():.4f}')
+        val_loss = None
+        if validate:
+            model.eval()
+            with torch.no_grad():
+                val_loss = criterion(model(X_val), y_val).item()
+        seconds = time.perf_counter() - started
+        history.append({'epoch': epoch + 1, 'loss': train_loss, 'val_loss': val_loss, 'seconds': seconds})
+        
+        monitored = val_loss if validate else train_loss
+        if monitored < best_loss:
+            best_loss = monitored
+            best_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
+            bad_epochs = 0
+        else:
+            bad_epochs += 1
+        
+        if (epoch + 1) % log_every == 0:
+            val_text = f', Val Loss: {val_loss:.4f}' if validate else ''
+            print(f'{name} - Epoch [{epoch+1}/{epochs}], Loss: {train_loss:.4f}{val_text}, {seconds * 1000:.1f} ms')
+        
+        stop = bool(patience and validate and bad_epochs >= patience)
+        if checkpoint_path:
+            torch.save({
+                'epoch': epochs if stop else epoch + 1,
+                'model': model.state_dict(),
+                'optimizer': optimizer.state_dict(),
+                'history': history,
+                'best_loss': best_loss,
+                'best_state': best_state,
+                'bad_epochs': bad_epochs
+            }, checkpoint_path)
+        if stop:
+            print(f'{name} - Early stop at epoch {epoch + 1}, best validation loss {best_loss:.4f}')
+            break
+    
+    if patience and validate and best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return history
+
+def _checkpoint_path(checkpoint_dir, name):
+    if not checkpoint_dir:
+        return None
+    checkpoint_dir = Path(checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    return checkpoint_dir / f'{name}.ckpt'
+
+def train_growth_model(dataset_path, epochs=100, batch_size=None, validation_split=0.0, patience=None,
+                       checkpoint_dir=None, resume=False, seed=None, history=None, data=None):
+    """Train the growth prediction model; data is an already parsed load_training_data result"""
+    X, y, _ = data or load_training_data(dataset_path)
+    train_rows, val_rows = split_indices(len(X), validation_split, seed)
+    
+    # Normalize features, fitted on the training rows only
+    scaler = StandardScaler()
+    scaler.fit(X[train_rows])
+    X_tensor = torch.FloatTensor(scaler.transform(X))
+    y_tensor = torch.FloatTensor(y)
+    
+    model = GrowthPredictionModel(input_size=7)
+    checkpoint_path = _checkpoint_path(checkpoint_dir, 'growth_model')
+    epoch_history = fit(
+        model, nn.MSELoss(), X_tensor[train_rows], y_tensor[train_rows], 'Growth Model', epochs,
+        batch_size=batch_size, X_val=X_tensor[val_rows], y_val=y_tensor[val_rows], patience=patience,
+        checkpoint_path=checkpoint_path, resume=resume, seed=seed, log_every=20
+    )
+    if history is not None:
+        history.extend(epoch_history)
     
     # Save model and scaler
-    torch.save(model.state_dict(), MODELS_DIR / 'growth_model.pth')
-    joblib.dump(scaler, MODELS_DIR / 'growth_scaler.pkl')
+    save_atomically(joblib.dump, scaler, MODELS_DIR / 'growth_scaler.pkl')
+    save_atomically(torch.save, model.state_dict(), MODELS_DIR / 'growth_model.pth')
+    from model_artifact import convert_growth_model
+    convert_growth_model(MODELS_DIR)
+    if checkpoint_path:
+        checkpoint_path.unlink(missing_ok=True)
     print('Growth model saved!')
     return model, scaler
 
-def train_crop_recommendation_model(dataset_path):
-    """Train the crop recommendation model"""
-    df = pd.read_csv(dataset_path)
-    
-    features = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
-    X = df[features].values
+def save_atomically(save, obj, path):
+    """save(obj, file) to a temporary file moved into place, so readers never see a partial file"""
+    path = Path(path)
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+def train_crop_recommendation_model(dataset_path, epochs=150, batch_size=None, validation_split=0.0,
+                                    patience=None, checkpoint_dir=None, resume=False, seed=None, history=None,
+                                    data=None):
+    """Train the crop recommendation model; data is an already parsed load_training_data result"""
+    X, _, labels = data or load_training_data(dataset_path)
     
     # Encode labels
     from sklearn.preprocessing import LabelEncoder
     label_encoder = LabelEncoder()
-    y = label_encoder.fit_transform(df['label'].values)
+    y = label_encoder.fit_transform(labels)
+    train_rows, val_rows = split_indices(len(X), validation_split, seed)
     
-    # Normalize features
+    # Normalize features, fitted on the training rows only
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    # Convert to tensors
-    X_tensor = torch.FloatTensor(X_scaled)
+    scaler.fit(X[train_rows])
+    X_tensor = torch.FloatTensor(scaler.transform(X))
     y_tensor = torch.LongTensor(y)
     
-    # Initialize model
     num_classes = len(label_encoder.classes_)
     model = CropRecommendationModel(input_size=7, num_classes=num_classes)
-    criterion = nn.CrossEntropyLoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-    
-    # Train
-    model.train()
-    epochs = 150
-    for epoch in range(epochs):
-        optimizer.zero_grad()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        loss.backward()
-        optimizer.step()
-        
-        if (epoch + 1) % 30 == 0:
-            print(f'Crop Model - Epoch [{epoch+1}/{epochs}], Loss: {loss.item():.4f}')
+    checkpoint_path = _checkpoint_path(checkpoint_dir, 'crop_model')
+    epoch_history = fit(
+        model, nn.CrossEntropyLoss(), X_tensor[train_rows], y_tensor[train_rows], 'Crop Model', epochs,
+        batch_size=batch_size, X_val=X_tensor[val_rows], y_val=y_tensor[val_rows], patience=patience,
+        checkpoint_path=checkpoint_path, resume=resume, seed=seed, log_every=30
+    )
+    if history is not None:
+        history.extend(epoch_history)
     
     # Save model, scaler, and encoder
-    torch.save(model.state_dict(), MODELS_DIR / 'crop_model.pth')
-    joblib.dump(scaler, MODELS_DIR / 'crop_scaler.pkl')
-    joblib.dump(label_encoder, MODELS_DIR / 'label_encoder.pkl')
-    joblib.dump(label_encoder.classes_.tolist(), MODELS_DIR / 'crop_classes.pkl')
+    save_atomically(joblib.dump, scaler, MODELS_DIR / 'crop_scaler.pkl')
+    save_atomically(joblib.dump, label_encoder, MODELS_DIR / 'label_encoder.pkl')
+    save_atomically(joblib.dump, label_encoder.classes_.tolist(), MODELS_DIR / 'crop_classes.pkl')
+    save_atomically(torch.save, model.state_dict(), MODELS_DIR / 'crop_model.pth')
+    from model_artifact import convert_crop_model
+    convert_crop_model(MODELS_DIR)
+    if checkpoint_path:
+        checkpoint_path.unlink(missing_ok=True)
     print(f'Crop recommendation model saved! Classes: {label_encoder.classes_.tolist()}')
     return model, scaler, label_encoder
 
@@ -183,26 +304,36 @@ def load_crop_model():
 def predict_growth(model, scaler, environmental_data):
     """Predict plant growth"""
     # environmental_data: [N, P, K, temperature, humidity, ph, rainfall]
+    return float(predict_growth_batch(model, scaler, [environmental_data])[0])
+
+def predict_growth_batch(model, scaler, environmental_rows, timer=untimed):
+    """Predict plant growth for many rows in a single forward pass"""
+    # environmental_rows: (n, 7) array-like of [N, P, K, temperature, humidity, ph, rainfall]
+    X = np.asarray(environmental_rows, dtype=np.float64).reshape(-1, 7)
+    if len(X) == 0:
+        return np.zeros(0, dtype=np.float32)
     with torch.no_grad():
-        X_scaled = scaler.transform([environmental_data])
-        X_tensor = torch.FloatTensor(X_scaled)
-        prediction = model(X_tensor)
-        return float(prediction[0][0])
+        with timer('scale'):
+            X_scaled = scaler.transform(X)
+        with timer('forward'):
+            X_tensor = torch.FloatTensor(X_scaled)
+            prediction = model(X_tensor)
+            return prediction[:, 0].numpy()
+
+def crop_probabilities_batch(model, scaler, environmental_rows, timer=untimed):
+    """Predict crop class probabilities for many rows in a single forward pass"""
+    X = np.asarray(environmental_rows, dtype=np.float64).reshape(-1, 7)
+    if len(X) == 0:
+        return np.zeros((0, model.fc4.out_features), dtype=np.float32)
+    with torch.no_grad():
+        with timer('scale'):
+            X_scaled = scaler.transform(X)
+        with timer('forward'):
+            X_tensor = torch.FloatTensor(X_scaled)
+            outputs = model(X_tensor)
+            return torch.nn.functional.softmax(outputs, dim=1).numpy()
 
 def recommend_crops(model, scaler, label_encoder, environmental_data, top_k=5):
     """Recommend top crops based on environmental data"""
-    with torch.no_grad():
-        X_scaled = scaler.transform([environmental_data])
-        X_tensor = torch.FloatTensor(X_scaled)
-        outputs = model(X_tensor)
-        probabilities = torch.nn.functional.softmax(outputs, dim=1)
-        top_probs, top_indices = torch.topk(probabilities, top_k)
-        
-        recommendations = []
-        for prob, idx in zip(top_probs[0], top_indices[0]):
-            crop_name = label_encoder.classes_[idx]
-            recommendations.append({
-                'crop': crop_name,
-                'suitability': float(prob) * 100
-            })
-        return recommendations
\ No newline at end of file
+    probabilities = crop_probabilities_batch(model, scaler, [environmental_data])[0]
+    return top_crops(probabilities, label_encoder.classes_, top_k)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from numpy_inference import (
+    MODELS_DIR, NumpyGrowthModel, NumpyCropModel,
+    load_state_dict, growth_layers, crop_layers, prepare_layers
+)
+
+# Layout of a .gsm artifact (little-endian):
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | JSON header
+#   then each array at a 64-byte aligned offset listed in the header
+MAGIC = b'GSMODEL\0'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII')
+
+# Checkpoint files each artifact kind is converted from
+SOURCE_FILES = {
+    'growth': ('growth_model.pth', 'growth_scaler.pkl'),
+    'crop': ('crop_model.pth', 'crop_scaler.pkl', 'crop_classes.pkl')
+}
+
+class ArtifactError(Exception):
+    """Raised when a model artifact is missing, corrupt or of an unsupported version"""
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_artifact(path, arrays, metadata):
+    """Write named arrays and JSON metadata into a single aligned artifact file"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    # Offsets depend on the header length, so lay out relative offsets first
+    entries = []
+    offset = 0
+    for name, array in arrays.items():
+        offset = _align(offset)
+        entries.append({
+            'name': name,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset
+        })
+        offset += array.nbytes
+
+    header = dict(metadata, format_version=FORMAT_VERSION, arrays=entries)
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    # Write to a temporary file and rename so readers never see a partial artifact.
+    # The name is unique: workers that start together may convert the same model.
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for entry, array in zip(entries, arrays.values()):
+                f.seek(data_start + entry['offset'])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+def read_artifact(path):
+    """Memory-map an artifact; returns (metadata, {name: zero-copy read-only array})"""
+    path = Path(path)
+    if not path.exists():
+        raise ArtifactError(f"Model artifact not found: {path}")
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    if len(buffer) < _PREAMBLE.size:
+        raise ArtifactError(f"Truncated model artifact: {path}")
+
+    magic, version, header_length = _PREAMBLE.unpack(buffer[:_PREAMBLE.size].tobytes())
+    if magic != MAGIC:
+        raise ArtifactError(f"Not a GardenSim model artifact: {path}")
+    if version != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format version {version} in {path}")
+
+    header_end = _PREAMBLE.size + header_length
+    header = json.loads(buffer[_PREAMBLE.size:header_end].tobytes())
+    data_start = _align(header_end)
+
+    arrays = {}
+    for entry in header['arrays']:
+        dtype = np.dtype(entry['dtype'])
+        start = data_start + entry['offset']
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        end = start + count * dtype.itemsize
+        if end > len(buffer):
+            raise ArtifactError(f"Truncated model artifact: {path}")
+        arrays[entry['name']] = buffer[start:end].view(dtype).reshape(entry['shape'])
+    return header, arrays
+
+def _layer_arrays(layers):
+    arrays = {}
+    for i, (weight, bias) in enumerate(layers):
+        arrays[f'layer{i}.weight'] = weight
+        arrays[f'layer{i}.bias'] = bias
+    return arrays
+
+def _layers_from_arrays(header, arrays):
+    return [
+        (arrays[f'layer{i}.weight'], arrays[f'layer{i}.bias'])
+        for i in range(header['num_layers'])
+    ]
+
+def sources_version(models_dir, kind):
+    """Content hash of the checkpoint files a model kind is converted from"""
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES[kind]:
+        digest.update((Path(models_dir) / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+def convert_growth_model(models_dir=MODELS_DIR, output_path=None):
+    """Convert growth_model.pth + growth_scaler.pkl into growth_model.gsm"""
+    import joblib
+
+    models_dir = Path(models_dir)
+    state_path = models_dir / 'growth_model.pth'
+    scaler_path = models_dir / 'growth_scaler.pkl'
+    scaler = joblib.load(scaler_path)
+    layers = prepare_layers(growth_layers(load_state_dict(state_path), scaler.mean_, scaler.scale_))
+
+    arrays = _layer_arrays(layers)
+    arrays['scaler.mean'] = scaler.mean_.astype(np.float64)
+    arrays['scaler.scale'] = scaler.scale_.astype(np.float64)
+    metadata = {
+        'kind': 'growth',
+        'num_layers': len(layers),
+        'model_version': sources_version(models_dir, 'growth')
+    }
+    return write_artifact(output_path or models_dir / 'growth_model.gsm', arrays, metadata)
+
+def convert_crop_model(models_dir=MODELS_DIR, output_path=None):
+    """Convert crop_model.pth + crop_scaler.pkl + crop_classes.pkl into crop_model.gsm"""
+    import joblib
+
+    models_dir = Path(models_dir)
+    state_path = models_dir / 'crop_model.pth'
+    scaler_path = models_dir / 'crop_scaler.pkl'
+    classes_path = models_dir / 'crop_classes.pkl'
+    scaler = joblib.load(scaler_path)
+    classes = [str(c) for c in joblib.load(classes_path)]
+    layers = prepare_layers(crop_layers(load_state_dict(state_path), scaler.mean_, scaler.scale_))
+
+    arrays = _layer_arrays(layers)
+    arrays['scaler.mean'] = scaler.mean_.astype(np.float64)
+    arrays['scaler.scale'] = scaler.scale_.astype(np.float64)
+    metadata = {
+        'kind': 'crop',
+        'num_layers': len(layers),
+        'classes': classes,
+        'model_version': sources_version(models_dir, 'crop')
+    }
+    return write_artifact(output_path or models_dir / 'crop_model.gsm', arrays, metadata)
+
+def load_growth_artifact(path=MODELS_DIR / 'growth_model.gsm'):
+    """Load a NumpyGrowthModel backed by a memory-mapped artifact"""
+    header, arrays = read_artifact(path)
+    if header.get('kind') != 'growth':
+        raise ArtifactError(f"{path} is not a growth model artifact")
+    return NumpyGrowthModel(_layers_from_arrays(header, arrays), version=header['model_version'])
+
+def load_crop_artifact(path=MODELS_DIR / 'crop_model.gsm'):
+    """Load a NumpyCropModel backed by a memory-mapped artifact"""
+    header, arrays = read_artifact(path)
+    if header.get('kind') != 'crop':
+        raise ArtifactError(f"{path} is not a crop model artifact")
+    return NumpyCropModel(
+        _layers_from_arrays(header, arrays), header['classes'], version=header['model_version']
+    )
+
+def load_current_artifact(kind, models_dir=MODELS_DIR):
+    """Load the artifact for a model kind, or None if it is missing or older than its checkpoint"""
+    models_dir = Path(models_dir)
+    path = models_dir / f'{kind}_model.gsm'
+    if not path.exists():
+        return None
+    model = (load_growth_artifact if kind == 'growth' else load_crop_artifact)(path)
+
+    # Artifact-only deployments have nothing to compare against
+    if all((models_dir / name).exists() for name in SOURCE_FILES[kind]):
+        if model.version != sources_version(models_dir, kind):
+            return None
+    return model
+
+if __name__ == '__main__':
+    print(f'Wrote {convert_growth_model()}')
+    print(f'Wrote {convert_crop_model()}')
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+class ModelSet:
+    """One consistent version of every serving model; never modified once published"""
+    __slots__ = ('growth_model', 'growth_scaler', 'crop_model', 'crop_scaler', 'crop_classes', 'version')
+
+    def __init__(self, growth_model, crop_model, crop_classes, version=None, growth_scaler=None, crop_scaler=None):
+        self.growth_model = growth_model
+        self.growth_scaler = growth_scaler
+        self.crop_model = crop_model
+        self.crop_scaler = crop_scaler
+        self.crop_classes = crop_classes
+        self.version = version
+
+class ModelRegistry:
+    """Loads the serving models in the background and swaps in new versions atomically
+
+    Readers take `current` once per request or batch and use only that
+    snapshot, so a swap never mixes two versions in one answer and requests in
+    flight finish on the models they started with. A failed reload keeps the
+    models already being served.
+    """
+    def __init__(self, load, prepare=None, watch=None, poll_seconds=0.0):
+        # load() -> ModelSet and prepare(progress) run in a worker thread;
+        # watch() lists the files whose changes trigger a reload
+        self._load = load
+        self._prepare = prepare
+        self._watch = watch
+        self.poll_seconds = poll_seconds
+        self.current = None
+        self.status = 'starting'
+        self.detail = None
+        self.error = None
+        self.loaded_at = None
+        self.swaps = 0
+        self.failed_reloads = 0
+        self._listeners = []
+        self._lock = asyncio.Lock()
+        self._task = None
+        self._signature = None
+        self._pending_signature = None
+        self._started = time.monotonic()
+        self.startup_seconds = None
+
+    @property
+    def ready(self):
+        return self.current is not None
+
+    def on_swap(self, listener):
+        """Call listener(models) every time a model set is published"""
+        self._listeners.append(listener)
+
+    def progress(self, status, detail=None):
+        """Record what startup is doing; safe to call from the prepare thread"""
+        self.status = status
+        self.detail = detail
+        logger.info(f"Models {status}" + (f": {detail}" if detail else ''))
+
+    def start(self):
+        self._lock = asyncio.Lock()
+        self._started = time.monotonic()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def load_now(self):
+        """Prepare and load synchronously, before any event loop runs (e.g. in a pre-fork master)"""
+        if self._prepare is not None:
+            self._prepare(self.progress)
+        self.progress('loading')
+        self.publish(self._load(), self._files_signature())
+
+    def publish(self, models, signature=None):
+        """Make a loaded model set the one served from now on"""
+        previous = self.current
+        self.current = models
+        self._signature = self._pending_signature = signature
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.error = None
+        self.progress('ready', models.version)
+        if previous is None:
+            self.startup_seconds = time.monotonic() - self._started
+        else:
+            self.swaps += 1
+        for listener in self._listeners:
+            try:
+                listener(models)
+            except Exception as e:
+                logger.error(f"Model swap listener failed: {e}")
+
+    async def reload(self):
+        """Load the models from disk and swap them in; raises (and keeps serving the old ones) on failure"""
+        async with self._lock:
+            signature = await asyncio.to_thread(self._files_signature)
+            if self.current is None:
+                self.progress('loading')
+            try:
+                models = await asyncio.to_thread(self._load)
+            except Exception as e:
+                self.error = str(e)
+                self.failed_reloads += 1
+                if self.current is None:
+                    self.progress('failed', str(e))
+                raise
+            self.publish(models, signature)
+            return models
+
+    async def reload_if_changed(self):
+        """Reload once the watched files have changed and then stayed the same for a poll"""
+        signature = await asyncio.to_thread(self._files_signature)
+        if signature == self._signature:
+            return False
+        if signature != self._pending_signature:
+            # Possibly still being written (training writes several files)
+            self._pending_signature = signature
+            return False
+        logger.info("Model files changed, reloading")
+        await self.reload()
+        return True
+
+    def _files_signature(self):
+        if self._watch is None:
+            return None
+        signature = []
+        for path in self._watch():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    async def _run(self):
+        try:
+            if self._prepare is not None and self.current is None:
+                await asyncio.to_thread(self._prepare, self.progress)
+            if self.current is None:
+                await self.reload()
+        except Exception as e:
+            logger.error(f"Error loading models: {e}")
+            self.progress('failed', str(e))
+
+        # Keep watching even after a failure: new files on disk can still fix it
+        while self.poll_seconds > 0:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"Error reloading models: {e}")
+
+    def stats(self):
+        return {
+            'ready': self.ready,
+            'status': self.status,
+            'detail': self.detail,
+            'version': self.current.version if self.current else None,
+            'loaded_at': self.loaded_at,
+            'startup_seconds': self.startup_seconds,
+            'swaps': self.swaps,
+            'failed_reloads': self.failed_reloads,
+            'last_error': self.error
+        }
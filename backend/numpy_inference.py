@@ -0,0 +1,218 @@
+import contextlib
+import copy
+import pickle
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+MODELS_DIR = Path(__file__).parent / 'models'
+
+# Maximum absolute difference allowed between this engine and the torch path
+# (growth is a 0-1 score, crop outputs are class probabilities)
+PARITY_TOLERANCE = 1e-5
+
+BATCHNORM_EPS = 1e-5
+
+_STORAGE_DTYPES = {
+    'FloatStorage': np.float32,
+    'DoubleStorage': np.float64,
+    'HalfStorage': np.float16,
+    'LongStorage': np.int64,
+    'IntStorage': np.int32,
+    'BoolStorage': np.bool_
+}
+
+def _rebuild_tensor(storage, storage_offset, size, stride, *args):
+    itemsize = storage.dtype.itemsize
+    return np.lib.stride_tricks.as_strided(
+        storage[storage_offset:], shape=tuple(size), strides=[s * itemsize for s in stride]
+    ).copy()
+
+class _StateDictUnpickler(pickle.Unpickler):
+    """Unpickler for torch.save'd state_dicts that only rebuilds plain tensors"""
+    def __init__(self, file, archive, prefix):
+        super().__init__(file)
+        self.archive = archive
+        self.prefix = prefix
+
+    def find_class(self, module, name):
+        if module == 'collections' and name == 'OrderedDict':
+            return OrderedDict
+        if module == 'torch._utils' and name == '_rebuild_tensor_v2':
+            return _rebuild_tensor
+        if module == 'torch' and name in _STORAGE_DTYPES:
+            return _STORAGE_DTYPES[name]
+        raise pickle.UnpicklingError(f"Unsupported global in state_dict: {module}.{name}")
+
+    def persistent_load(self, pid):
+        # ('storage', storage_type, key, location, numel)
+        _, dtype, key, _, numel = pid
+        data = self.archive.read(f'{self.prefix}/data/{key}')
+        return np.frombuffer(data, dtype=dtype, count=numel)
+
+def load_state_dict(path):
+    """Read a torch.save'd state_dict into NumPy arrays without importing torch"""
+    with zipfile.ZipFile(path) as archive:
+        pickle_name = next(n for n in archive.namelist() if n.endswith('/data.pkl'))
+        prefix = pickle_name[:-len('/data.pkl')]
+        with archive.open(pickle_name) as f:
+            return _StateDictUnpickler(f, archive, prefix).load()
+
+def fold_scaler(weight, bias, mean, scale):
+    """Fold (x - mean) / scale into a linear layer that consumes the scaled input"""
+    folded_weight = weight / scale[None, :]
+    folded_bias = bias - folded_weight @ mean
+    return folded_weight, folded_bias
+
+def fold_batchnorm(state_dict, prefix, weight, bias, eps=BATCHNORM_EPS):
+    """Fold an eval-mode BatchNorm1d into the linear layer that follows it"""
+    gain = state_dict[f'{prefix}.weight'] / np.sqrt(state_dict[f'{prefix}.running_var'] + eps)
+    shift = state_dict[f'{prefix}.bias'] - state_dict[f'{prefix}.running_mean'] * gain
+    return weight * gain[None, :], bias + weight @ shift
+
+def prepare_layers(layers):
+    """Convert torch-layout (weight (out, in), bias) pairs to the float32 (in, out) layout used for X @ W"""
+    return [
+        (np.ascontiguousarray(weight.T, dtype=np.float32), np.ascontiguousarray(bias, dtype=np.float32))
+        for weight, bias in layers
+    ]
+
+def untimed(stage):
+    """Default stage timer: times nothing (see metrics.stage_timer)"""
+    return contextlib.nullcontext()
+
+class NumpyMLP:
+    """Dense layers with ReLU in between, evaluated with batched float32 matmuls"""
+    def __init__(self, layers, version=None):
+        # layers: list of prepared (weight (in, out), bias (out,)) pairs, used as-is
+        # so memory-mapped arrays are never copied
+        self.layers = layers
+        self.version = version
+
+    def bind_inputs(self, fixed_inputs):
+        """Copy of the model with some input columns fixed; it takes only the remaining columns"""
+        # fixed_inputs: {column index: value}. Their contribution to the first
+        # layer is folded into its bias once instead of multiplied per row.
+        weight, bias = self.layers[0]
+        fixed_columns = sorted(fixed_inputs)
+        free_columns = [i for i in range(weight.shape[0]) if i not in fixed_inputs]
+        fixed_values = np.array([fixed_inputs[i] for i in fixed_columns], dtype=np.float32)
+        bound = copy.copy(self)
+        bound.layers = [(
+            np.ascontiguousarray(weight[free_columns]),
+            (bias + fixed_values @ weight[fixed_columns]).astype(np.float32)
+        )] + list(self.layers[1:])
+        return bound
+
+    def logits(self, X):
+        h = np.asarray(X, dtype=np.float32).reshape(-1, self.layers[0][0].shape[0])
+        for weight, bias in self.layers[:-1]:
+            h = np.maximum(h @ weight + bias, 0.0)
+        weight, bias = self.layers[-1]
+        return h @ weight + bias
+
+class NumpyGrowthModel(NumpyMLP):
+    """GrowthPredictionModel with the feature scaler folded in"""
+    def predict(self, environmental_rows):
+        """Growth scores (0-1) for an (n, 7) array of raw environmental rows"""
+        logits = self.logits(environmental_rows)[:, 0]
+        return 1.0 / (1.0 + np.exp(-logits))
+
+class NumpyCropModel(NumpyMLP):
+    """CropRecommendationModel with the feature scaler and batch norms folded in"""
+    def __init__(self, layers, classes, version=None):
+        super().__init__(layers, version)
+        self.classes = list(classes)
+
+    def predict_proba(self, environmental_rows):
+        """Class probabilities for an (n, 7) array of raw environmental rows"""
+        logits = self.logits(environmental_rows)
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def top_k(self, environmental_rows, k=5, timer=untimed):
+        """Indices and probabilities of the k most likely classes, best first"""
+        # Only the k selected classes are normalised individually; the rest
+        # only contribute to the softmax denominator
+        with timer('forward'):
+            logits = self.logits(environmental_rows)
+        with timer('top_k'):
+            indices = partial_top_k(logits, k)
+            top_logits = np.take_along_axis(logits, indices, axis=1)
+            max_logits = logits.max(axis=1, keepdims=True)
+            log_normaliser = np.log(np.exp(logits - max_logits).sum(axis=1, keepdims=True)) + max_logits
+            return indices, np.exp(top_logits - log_normaliser)
+
+def partial_top_k(scores, k):
+    """Column indices of the k largest scores per row, best first, without a full sort"""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+def top_crops(probabilities, classes, top_k=5):
+    """Turn one row of class probabilities into a ranked list of recommendations"""
+    top_indices = partial_top_k(np.asarray(probabilities).reshape(1, -1), top_k)[0]
+    return crops_from_top_k(top_indices, probabilities[top_indices], classes)
+
+def crops_from_top_k(indices, probabilities, classes):
+    """Build recommendations from one row of top-k class indices and their probabilities"""
+    return [
+        {
+            'crop': classes[idx],
+            'suitability': float(prob) * 100
+        }
+        for idx, prob in zip(indices, probabilities)
+    ]
+
+def _f64(state_dict, key):
+    return state_dict[key].astype(np.float64)
+
+def growth_layers(state_dict, scaler_mean, scaler_scale):
+    """Folded (weight, bias) pairs of GrowthPredictionModel"""
+    fc1 = fold_scaler(_f64(state_dict, 'fc1.weight'), _f64(state_dict, 'fc1.bias'), scaler_mean, scaler_scale)
+    return [fc1] + [
+        (_f64(state_dict, f'{name}.weight'), _f64(state_dict, f'{name}.bias'))
+        for name in ('fc2', 'fc3', 'fc4')
+    ]
+
+def crop_layers(state_dict, scaler_mean, scaler_scale):
+    """Folded (weight, bias) pairs of CropRecommendationModel"""
+    # fc1 -> relu -> bn1 -> fc2 -> relu -> bn2 -> fc3 -> relu -> fc4
+    state_dict = {key: value.astype(np.float64) for key, value in state_dict.items()}
+    fc1 = fold_scaler(state_dict['fc1.weight'], state_dict['fc1.bias'], scaler_mean, scaler_scale)
+    fc2 = fold_batchnorm(state_dict, 'bn1', state_dict['fc2.weight'], state_dict['fc2.bias'])
+    fc3 = fold_batchnorm(state_dict, 'bn2', state_dict['fc3.weight'], state_dict['fc3.bias'])
+    fc4 = (state_dict['fc4.weight'], state_dict['fc4.bias'])
+    return [fc1, fc2, fc3, fc4]
+
+def load_growth_model(models_dir=MODELS_DIR):
+    """Load the growth model as a NumpyGrowthModel, preferring an up-to-date artifact"""
+    from model_artifact import load_current_artifact
+    model = load_current_artifact('growth', models_dir)
+    if model is not None:
+        return model
+
+    import joblib
+    state_dict = load_state_dict(models_dir / 'growth_model.pth')
+    scaler = joblib.load(models_dir / 'growth_scaler.pkl')
+    return NumpyGrowthModel(prepare_layers(growth_layers(state_dict, scaler.mean_, scaler.scale_)))
+
+def load_crop_model(models_dir=MODELS_DIR):
+    """Load the crop recommendation model as a NumpyCropModel, preferring an up-to-date artifact"""
+    from model_artifact import load_current_artifact
+    model = load_current_artifact('crop', models_dir)
+    if model is not None:
+        return model
+
+    import joblib
+    state_dict = load_state_dict(models_dir / 'crop_model.pth')
+    scaler = joblib.load(models_dir / 'crop_scaler.pkl')
+    classes = joblib.load(models_dir / 'crop_classes.pkl')
+    return NumpyCropModel(prepare_layers(crop_layers(state_dict, scaler.mean_, scaler.scale_)), classes)
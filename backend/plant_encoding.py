@@ -0,0 +1,153 @@
+"""Response encodings for lists of plant documents, chosen by the Accept header.
+
+    application/json                 orjson
+    application/msgpack              MessagePack (needs msgpack)
+    application/vnd.gardensim.plants fixed-layout binary snapshot
+
+The documents come straight from Mongo or the state store, which only ever
+hold validated Plant fields, so they are encoded as they are instead of
+going through Pydantic again.
+
+The binary snapshot is 'GSP1', a little-endian uint32 header length, a JSON
+header and then one packed record per plant:
+
+    {"version": 1, "count": n, "garden_id": ..., "ids": [...],
+     "types": [[plant_type, emoji], ...], "dtype": [[field, numpy type], ...]}
+
+Records hold the position, an index into types, a flags byte (1: pests,
+2: disease), the levels as float32 and the dates as float64 Unix seconds
+(NaN when unset), so numpy.frombuffer(data, dtype, count, offset) reads them
+in one call. decode_snapshot() turns a snapshot back into documents.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+SNAPSHOT_TYPE = 'application/vnd.gardensim.plants'
+
+SNAPSHOT_MAGIC = b'GSP1'
+SNAPSHOT_VERSION = 1
+LEVEL_FIELDS = ('water_level', 'fertilizer_n', 'fertilizer_p', 'fertilizer_k', 'health', 'growth_stage', 'soil_ph')
+DATE_FIELDS = ('planted_date', 'last_watered', 'last_fertilized')
+SNAPSHOT_DTYPE = np.dtype(
+    [('position', '<i4'), ('type', '<u2'), ('flags', 'u1')]
+    + [(field, '<f4') for field in LEVEL_FIELDS]
+    + [(field, '<f8') for field in DATE_FIELDS]
+)
+PESTS, DISEASE = 1, 2
+
+def media_types():
+    """Types plants can be encoded as, most preferred first"""
+    return (JSON_TYPE,) + (MSGPACK_TYPES if msgpack else ()) + (SNAPSHOT_TYPE,)
+
+def negotiate(accept):
+    """Media type to answer an Accept header with; None if none of its types can be produced"""
+    if not accept:
+        return JSON_TYPE
+    choices = []
+    for position, item in enumerate(accept.split(',')):
+        media_type, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            choices.append((-quality, position, media_type.lower()))
+    supported = media_types()
+    for _, _, media_type in sorted(choices):
+        if media_type in ('*/*', 'application/*'):
+            return JSON_TYPE
+        if media_type in supported:
+            return media_type
+    return None
+
+def encode(plants, media_type):
+    """Body for a list of plant documents in one of media_types()"""
+    if media_type == SNAPSHOT_TYPE:
+        return encode_snapshot(plants)
+    if media_type in MSGPACK_TYPES:
+        return msgpack.packb(plants, use_bin_type=True)
+    return orjson.dumps(plants)
+
+def _timestamps(values):
+    """Unix seconds of ISO-8601 strings (NaN for None), parsed by numpy in one call"""
+    texts = []
+    for value in values:
+        if value is None:
+            texts.append('NaT')
+        elif value.endswith('+00:00'):
+            # Stored dates are UTC; numpy only parses them without the offset
+            texts.append(value[:-6])
+        else:
+            moment = datetime.fromisoformat(value)
+            if moment.tzinfo is not None:
+                moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+            texts.append(moment.isoformat())
+    moments = np.array(texts, dtype='datetime64[us]')
+    seconds = moments.astype(np.int64) / 1e6
+    seconds[np.isnat(moments)] = np.nan
+    return seconds
+
+def encode_snapshot(plants):
+    """Fixed-layout binary snapshot of plant documents"""
+    records = np.zeros(len(plants), dtype=SNAPSHOT_DTYPE)
+    types = {}
+    records['position'] = [plant['position'] for plant in plants]
+    records['type'] = [types.setdefault((plant['plant_type'], plant['emoji']), len(types)) for plant in plants]
+    records['flags'] = [
+        (PESTS if plant.get('has_pests') else 0) | (DISEASE if plant.get('has_disease') else 0) for plant in plants
+    ]
+    for field in LEVEL_FIELDS:
+        records[field] = [plant[field] for plant in plants]
+    for field in DATE_FIELDS:
+        records[field] = _timestamps([plant.get(field) for plant in plants])
+    header = orjson.dumps({
+        'version': SNAPSHOT_VERSION,
+        'count': len(plants),
+        'garden_id': plants[0]['garden_id'] if plants else None,
+        'ids': [plant['id'] for plant in plants],
+        'types': list(types),
+        'dtype': SNAPSHOT_DTYPE.descr
+    })
+    return SNAPSHOT_MAGIC + struct.pack('<I', len(header)) + header + records.tobytes()
+
+def decode_snapshot(data):
+    """Plant documents from encode_snapshot() output; levels come back at float32 precision"""
+    if data[:4] != SNAPSHOT_MAGIC:
+        raise ValueError("Not a plant snapshot")
+    (length,) = struct.unpack_from('<I', data, 4)
+    header = json.loads(data[8:8 + length])
+    if header['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported plant snapshot version {header['version']}")
+    dtype = np.dtype([tuple(field) for field in header['dtype']])
+    records = np.frombuffer(data, dtype=dtype, count=header['count'], offset=8 + length)
+    columns = {field: records[field].tolist() for field in dtype.names}
+    plants = []
+    for i, plant_id in enumerate(header['ids']):
+        plant_type, emoji = header['types'][columns['type'][i]]
+        plant = {
+            'id': plant_id, 'garden_id': header['garden_id'], 'position': columns['position'][i],
+            'plant_type': plant_type, 'emoji': emoji,
+            'has_pests': bool(columns['flags'][i] & PESTS), 'has_disease': bool(columns['flags'][i] & DISEASE)
+        }
+        for field in LEVEL_FIELDS:
+            plant[field] = columns[field][i]
+        for field in DATE_FIELDS:
+            value = columns[field][i]
+            plant[field] = None if value != value else datetime.fromtimestamp(value, timezone.utc).isoformat()
+        plants.append(plant)
+    return plants
@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+
+import simulation_rules as rules
+
+# Plant updates as Mongo update pipelines. Every new value is computed from the
+# stored document inside the update, so concurrent writers never overwrite
+# each other and each change is a single find_one_and_update round trip.
+
+def _clamp(expression, low=0.0, high=100.0):
+    return {"$max": [low, {"$min": [high, expression]}]}
+
+def _add(field, amount):
+    return _clamp({"$add": [f"${field}", amount]})
+
+def water_pipeline(amount=rules.DEFAULT_WATER_AMOUNT):
+    """Raise the water level; overwatering costs health"""
+    return [
+        {"$set": {
+            "water_level": _add("water_level", amount),
+            "last_watered": datetime.now(timezone.utc).isoformat()
+        }},
+        {"$set": {
+            "health": {"$cond": [
+                {"$gt": ["$water_level", rules.OVERWATER_LEVEL]},
+                _add("health", -rules.OVERWATER_DAMAGE),
+                "$health"
+            ]}
+        }}
+    ]
+
+def fertilize_pipeline(amount=rules.DEFAULT_FERTILIZER_AMOUNT):
+    """Raise every fertilizer level by the same amount"""
+    return [
+        {"$set": {
+            "fertilizer_n": _add("fertilizer_n", amount),
+            "fertilizer_p": _add("fertilizer_p", amount),
+            "fertilizer_k": _add("fertilizer_k", amount),
+            "last_fertilized": datetime.now(timezone.utc).isoformat()
+        }}
+    ]
+
+def check_pests_pipeline(has_pests, has_disease):
+    """Record an inspection result (from simulation_rules.roll_pests)"""
+    damage = float(rules.inspection_damage(has_pests, has_disease))
+    return [
+        {"$set": {
+            "has_pests": bool(has_pests),
+            "has_disease": bool(has_disease),
+            "health": _add("health", -damage)
+        }}
+    ]
+
+def treat_pipeline():
+    """Clear pests and disease and restore health"""
+    return [
+        {"$set": {
+            "has_pests": False,
+            "has_disease": False,
+            "health": _add("health", rules.TREATMENT_HEALING)
+        }}
+    ]
+
+def growth_pipeline(growth_increment, ticks=1):
+    """Apply a growth increment and the water/fertilizer decay of the given number of ticks"""
+    return [
+        {"$set": {
+            "growth_stage": _add("growth_stage", growth_increment),
+            "water_level": _add("water_level", -rules.WATER_DECAY_PER_TICK * ticks),
+            "fertilizer_n": _add("fertilizer_n", -rules.FERTILIZER_DECAY_PER_TICK * ticks),
+            "fertilizer_p": _add("fertilizer_p", -rules.FERTILIZER_DECAY_PER_TICK * ticks),
+            "fertilizer_k": _add("fertilizer_k", -rules.FERTILIZER_DECAY_PER_TICK * ticks)
+        }}
+    ]
+
+def growth_increment(plant, updates):
+    """Growth added by a computed update, to be applied relative to the stored value"""
+    return updates['growth_stage'] - plant['growth_stage']
@@ -0,0 +1,76 @@
+"""Sampling profiler for a running server.
+
+A background thread reads every other thread's Python stack at a fixed
+interval and counts identical stacks. Nothing is installed into the
+interpreter (no sys.setprofile or tracing), so the profiled code runs
+unchanged and there is no cost at all while no profile is being taken.
+Output is in the collapsed-stack format read by flamegraph.pl, speedscope
+and most other flame graph tools:
+
+    MainThread;run (asyncio/runners.py:86);...;predict (numpy_inference.py:113) 42
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL_SECONDS = 0.005
+
+# Leaf frames of threads that are waiting rather than working: the event loop
+# polling its sockets, and executor threads waiting for work
+IDLE_FRAMES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker')
+}
+
+def _search_paths():
+    # Longest first, so site-packages wins over the lib directory containing it
+    return sorted({os.path.join(os.path.abspath(path), '') for path in sys.path if path}, key=len, reverse=True)
+
+def _short_filename(filename, paths):
+    for path in paths:
+        if filename.startswith(path):
+            return filename[len(path):]
+    return filename
+
+def _frame_label(code, paths, labels):
+    label = labels.get(code)
+    if label is None:
+        # ';' separates frames in the collapsed format
+        filename = _short_filename(code.co_filename, paths).replace(';', ':')
+        label = labels[code] = f'{code.co_name} ({filename}:{code.co_firstlineno})'
+    return label
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL_SECONDS, include_idle=False):
+    """Sample every thread's stack for some seconds; returns (Counter of collapsed stacks, samples taken)"""
+    me = threading.get_ident()
+    paths = _search_paths()
+    labels = {}
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (not include_idle and _is_idle(frame)):
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_label(frame.f_code, paths, labels))
+                frame = frame.f_back
+            frames.append(names.get(ident, f'thread-{ident}'))
+            stacks[';'.join(reversed(frames))] += 1
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+def collapsed(stacks):
+    """Collapsed-stack text, one 'frame;frame;... count' line per distinct stack"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+
+from numpy_inference import MODELS_DIR, NumpyCropModel
+from model_artifact import (
+    ArtifactError, read_artifact, write_artifact, load_current_artifact, convert_crop_model
+)
+
+QUANTIZED_ARTIFACT = 'crop_model_int8.gsm'
+
+def quantize_weight(weight):
+    """Symmetric per-output-channel int8 quantization of an (in, out) weight matrix"""
+    scale = np.abs(weight).max(axis=0) / 127.0
+    scale = np.where(scale == 0, 1.0, scale).astype(np.float32)
+    quantized = np.clip(np.round(weight / scale), -127, 127).astype(np.int8)
+    return quantized, scale
+
+class QuantizedCropModel(NumpyCropModel):
+    """CropRecommendationModel stored with int8 weights and per-channel float32 scales
+
+    The gain is the artifact's size on disk: each weight takes one byte instead
+    of four. NumPy has no int8 GEMM, so the weights are dequantized to float32
+    once at load and inference runs at the float model's speed.
+    """
+    def __init__(self, quantized_layers, classes, version=None):
+        # quantized_layers: list of (int8 weight (in, out), float32 scale (out,),
+        # float32 bias (out,)) with a float32 first layer
+        layers = [
+            ((weight.astype(np.float32) * scale).astype(np.float32), bias)
+            for weight, scale, bias in quantized_layers
+        ]
+        super().__init__(layers, classes, version)
+
+def convert_quantized_crop_model(models_dir=MODELS_DIR, output_path=None):
+    """Quantize the float crop model into crop_model_int8.gsm"""
+    models_dir = Path(models_dir)
+    float_model = load_current_artifact('crop', models_dir)
+    if float_model is None:
+        convert_crop_model(models_dir)
+        float_model = load_current_artifact('crop', models_dir)
+
+    arrays = {}
+    for i, (weight, bias) in enumerate(float_model.layers):
+        weight = np.asarray(weight, dtype=np.float32)
+        if i == 0:
+            # The first layer carries the folded scaler, so its input columns span
+            # very different magnitudes; it is tiny and stays in float32
+            quantized, scale = weight, np.ones(weight.shape[1], dtype=np.float32)
+        else:
+            quantized, scale = quantize_weight(weight)
+        arrays[f'layer{i}.weight'] = quantized
+        arrays[f'layer{i}.scale'] = scale
+        arrays[f'layer{i}.bias'] = np.asarray(bias, dtype=np.float32)
+    metadata = {
+        'kind': 'crop_int8',
+        'num_layers': len(float_model.layers),
+        'classes': float_model.classes,
+        'model_version': float_model.version
+    }
+    return write_artifact(output_path or models_dir / QUANTIZED_ARTIFACT, arrays, metadata)
+
+def load_quantized_crop_model(models_dir=MODELS_DIR):
+    """Load the int8 crop model, converting it first if missing or stale"""
+    models_dir = Path(models_dir)
+    path = models_dir / QUANTIZED_ARTIFACT
+    float_model = load_current_artifact('crop', models_dir)
+    if path.exists():
+        header, arrays = read_artifact(path)
+        if header.get('kind') != 'crop_int8':
+            raise ArtifactError(f"{path} is not a quantized crop model artifact")
+        if float_model is None or header['model_version'] == float_model.version:
+            layers = [
+                (arrays[f'layer{i}.weight'], arrays[f'layer{i}.scale'], arrays[f'layer{i}.bias'])
+                for i in range(header['num_layers'])
+            ]
+            return QuantizedCropModel(layers, header['classes'], version=header['model_version'])
+    convert_quantized_crop_model(models_dir)
+    return load_quantized_crop_model(models_dir)
+
+if __name__ == '__main__':
+    print(f'Wrote {convert_quantized_crop_model()}')
@@ -0,0 +1,86 @@
+import itertools
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# [N, P, K, temperature, humidity, ph, rainfall]
+FEATURE_NAMES = ('N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall')
+# Decimal places each feature is rounded to before lookup (negative rounds to tens, ...)
+DEFAULT_PRECISIONS = (0, 0, 0, 1, 0, 1, 0)
+
+class RecommendationCache:
+    """Bounded LRU/TTL cache of crop recommendations keyed on rounded environmental features"""
+    def __init__(self, max_entries=10000, ttl_seconds=3600.0, precisions=DEFAULT_PRECISIONS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.precisions = tuple(precisions)
+        self.model_version = None
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def round_features(self, environmental_data):
+        """Round a feature row to the cache precisions; misses are scored on this row"""
+        return tuple(
+            float(round(value, precision))
+            for value, precision in zip(environmental_data, self.precisions)
+        )
+
+    def get(self, key):
+        """Cached value for a rounded feature key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set_model_version(self, version):
+        """Drop every entry if the model that produced them has changed"""
+        if version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = version
+
+    def warmup_keys(self, feature_min, feature_max, points_per_feature=4):
+        """Rounded keys on a coarse grid spanning the given feature ranges"""
+        axes = [
+            sorted({
+                float(round(value, precision))
+                for value in np.linspace(low, high, points_per_feature)
+            })
+            for low, high, precision in zip(feature_min, feature_max, self.precisions)
+        ]
+        return list(itertools.product(*axes))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'model_version': self.model_version
+        }
@@ -1,43 +1,287 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.requests import ClientDisconnect
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import numpy as np
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
+from filelock import FileLock, Timeout
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+import secrets
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
 import asyncio
+import time
 
 # Import custom modules
-from data_manager import get_dataset_path, load_dataset
-from ml_models import (
-    train_growth_model, train_crop_recommendation_model,
-    load_growth_model, load_crop_model,
-    predict_growth, recommend_crops
-)
-from weather_service import get_weather_by_zipcode
+from data_manager import DATASET_PATH, get_dataset_path, load_arrays
+import bulk_crops
+import metrics
+import numpy_inference
+import plant_encoding
+import plant_updates
+import profiler
+import simulation_rules
+from numpy_inference import partial_top_k, crops_from_top_k
+from weather_service import get_weather_by_zipcode, close_weather_client, WeatherUnavailable, WeatherLocationNotFound
+from simulation_scheduler import SimulationScheduler
+from inference_service import MicroBatcher
+from recommendation_cache import RecommendationCache, DEFAULT_PRECISIONS
+from garden_events import GardenHub
+from garden_state import GardenStateStore
+from growth_history import GrowthHistory
+from model_registry import ModelRegistry, ModelSet
+from crop_neighbours import CropNeighbourIndex
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Latency histograms per route, Mongo command and inference stage, served
+# from /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[metrics.MongoCommandTimer()] if METRICS_ENABLED else [])
 db = client[os.environ['DB_NAME']]
 
 # Create the main app
 app = FastAPI()
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=metrics.TimedRoute if METRICS_ENABLED else APIRoute)
+
+# 'numpy' serves the folded NumPy models without importing torch; 'torch'
+# serves the original nn.Modules from ml_models
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'numpy').lower()
+# The frontend always shows the top 8 crops
+CROP_TOP_K = 8
+
+# Server-side simulation settings
+SIMULATION_ENABLED = os.environ.get('SIMULATION_ENABLED', 'true').lower() == 'true'
+SIMULATION_TICK_SECONDS = float(os.environ.get('SIMULATION_TICK_SECONDS', '5'))
+SIMULATION_MAX_CONCURRENCY = int(os.environ.get('SIMULATION_MAX_CONCURRENCY', '4'))
+# Limits the ticks applied for time the server was down. Ticks that came due
+# while it ran are always applied in full, so a garden the state store evicted
+# catches up exactly as far as one Mongo mode kept ticking.
+SIMULATION_MAX_CATCHUP_TICKS = int(os.environ.get('SIMULATION_MAX_CATCHUP_TICKS', '17280'))
+scheduler = None
+simulation_started_at = datetime.now(timezone.utc)
+
+# Where plant state lives: 'mongo' reads and writes Mongo on every request and
+# tick; 'memory' keeps active gardens in this process and flushes them to Mongo
+# in batches (single-process deployments only)
+STATE_STORE = os.environ.get('STATE_STORE', 'mongo').lower()
+STATE_FLUSH_SECONDS = float(os.environ.get('STATE_FLUSH_SECONDS', '5'))
+STATE_FLUSH_THRESHOLD = int(os.environ.get('STATE_FLUSH_THRESHOLD', '5000'))
+STATE_IDLE_SECONDS = float(os.environ.get('STATE_IDLE_SECONDS', '600'))
+STATE_JOURNAL_PATH = os.environ.get('STATE_JOURNAL_PATH', str(ROOT_DIR / 'data' / 'state_journal.jsonl'))
+STATE_JOURNAL_FSYNC = os.environ.get('STATE_JOURNAL_FSYNC', 'false').lower() == 'true'
+state_store = None
+
+# Per-plant growth history: a snapshot of each garden at most every
+# HISTORY_SAMPLE_SECONDS, kept raw for HISTORY_RAW_RETENTION_HOURS, as hourly
+# rollups for HISTORY_HOURLY_RETENTION_DAYS and as daily rollups after that
+HISTORY_ENABLED = os.environ.get('HISTORY_ENABLED', 'true').lower() == 'true'
+HISTORY_SAMPLE_SECONDS = float(os.environ.get('HISTORY_SAMPLE_SECONDS', '60'))
+HISTORY_FLUSH_SECONDS = float(os.environ.get('HISTORY_FLUSH_SECONDS', '10'))
+HISTORY_RAW_RETENTION_HOURS = float(os.environ.get('HISTORY_RAW_RETENTION_HOURS', '48'))
+HISTORY_HOURLY_RETENTION_DAYS = float(os.environ.get('HISTORY_HOURLY_RETENTION_DAYS', '90'))
+HISTORY_ROLLUP_SECONDS = float(os.environ.get('HISTORY_ROLLUP_SECONDS', '300'))
+HISTORY_MAX_POINTS = 2000
+growth_history = GrowthHistory(
+    db,
+    sample_seconds=HISTORY_SAMPLE_SECONDS,
+    flush_interval=HISTORY_FLUSH_SECONDS,
+    raw_retention=HISTORY_RAW_RETENTION_HOURS * 3600,
+    hourly_retention=HISTORY_HOURLY_RETENTION_DAYS * 86400,
+    rollup_interval=HISTORY_ROLLUP_SECONDS
+) if HISTORY_ENABLED else None
+
+# Seed for pest/disease inspections (unset draws fresh entropy)
+SIMULATION_SEED = os.environ.get('SIMULATION_SEED')
+pest_rng = np.random.default_rng(int(SIMULATION_SEED) if SIMULATION_SEED else None)
+
+# Garden settings
+DEFAULT_GARDEN_ID = 'default'
+DEFAULT_GARDEN_ROWS = 3
+DEFAULT_GARDEN_COLS = 3
+MAX_GARDEN_CELLS = int(os.environ.get('MAX_GARDEN_CELLS', '1000000'))
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Micro-batching settings for model inference
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', '64'))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', '5'))
+
+# Models load in the background after the server starts accepting requests
+# and are hot-swapped when their files change (polled every
+# MODEL_WATCH_SECONDS, 0 disables) or on an admin reload
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', '30'))
+# Required in the X-Admin-Token header of admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Longest profile the admin profiling endpoint will take
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+# Load the models when this module is imported, so a pre-forking server
+# (gunicorn.conf.py) loads them once and its workers share them
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', 'false').lower() == 'true'
+MODELS_DIR = ROOT_DIR / 'models'
+MODEL_FILES = {
+    'torch': ('growth_model.pth', 'growth_scaler.pkl', 'crop_model.pth', 'crop_scaler.pkl', 'label_encoder.pkl'),
+    'numpy': ('growth_model.pth', 'growth_scaler.pkl', 'growth_model.gsm',
+              'crop_model.pth', 'crop_scaler.pkl', 'crop_classes.pkl', 'crop_model.gsm')
+}
+
+# Everything training writes; the .gsm artifacts are converted from these
+TRAINED_FILES = ('growth_model.pth', 'growth_scaler.pkl', 'crop_model.pth', 'crop_scaler.pkl',
+                 'label_encoder.pkl', 'crop_classes.pkl')
+
+def models_trained():
+    return all((MODELS_DIR / name).exists() for name in TRAINED_FILES)
+
+def prepare_models(progress):
+    """Download the dataset and train the models if they do not exist yet"""
+    # Checked only while holding the lock: another process may be halfway
+    # through writing the models (the lock is uncontended once they exist)
+    lock = FileLock(str(MODELS_DIR / '.training.lock'))
+    try:
+        lock.acquire(timeout=0)
+    except Timeout:
+        progress('waiting', 'another process is training the models')
+        lock.acquire()
+    try:
+        if models_trained():
+            return
+        progress('downloading', 'crop recommendation dataset')
+        dataset_path = get_dataset_path()
+        if not dataset_path:
+            raise RuntimeError("Failed to get dataset")
+        # Both models train concurrently in worker processes
+        progress('training', 'growth and crop models')
+        from train import train_models
+        train_models(dataset_path)
+    finally:
+        lock.release()
+
+def load_models():
+    """Load every serving model from disk and check it answers before it is published"""
+    if INFERENCE_BACKEND == 'torch':
+        from ml_models import load_growth_model, load_crop_model
+        growth_model, growth_scaler = load_growth_model()
+        crop_model, crop_scaler, label_encoder = load_crop_model()
+        models = ModelSet(growth_model, crop_model, list(label_encoder.classes_),
+                          growth_scaler=growth_scaler, crop_scaler=crop_scaler)
+    else:
+        growth_model = numpy_inference.load_growth_model()
+        crop_model = numpy_inference.load_crop_model()
+        models = ModelSet(growth_model, crop_model, crop_model.classes)
+    models.version = crop_model_version(models.crop_model)
+    
+    sample = np.array([[50.0, 50.0, 50.0, 25.0, 60.0, 6.5, 100.0]])
+    score_growth(sample, models)
+    score_crops(sample, models)
+    logging.info(f"Models loaded successfully! (backend: {INFERENCE_BACKEND})")
+    return models
+
+def model_files():
+    return [MODELS_DIR / name for name in MODEL_FILES['torch' if INFERENCE_BACKEND == 'torch' else 'numpy']]
+
+model_registry = ModelRegistry(load_models, prepare=prepare_models, watch=model_files,
+                               poll_seconds=MODEL_WATCH_SECONDS)
+
+def require_models():
+    """The serving models, or a 503 while they are still loading"""
+    models = model_registry.current
+    if models is None:
+        if model_registry.status == 'failed':
+            raise HTTPException(status_code=500, detail="Models failed to load")
+        raise HTTPException(status_code=503, detail=f"Models are not ready yet ({model_registry.status})",
+                            headers={'Retry-After': '5'})
+    return models
+
+# Concurrent requests share batched forward passes, run off the event loop.
+# Each batch is scored with one snapshot of the models, so a hot swap never
+# mixes versions within a batch.
+growth_timer = metrics.stage_timer('growth')
+crop_timer = metrics.stage_timer('crop')
 
-# Global variables for models
-growth_model = None
-growth_scaler = None
-crop_model = None
-crop_scaler = None
-label_encoder = None
+def score_growth(environmental_rows, models=None):
+    """Growth scores (0-1) for a batch of environmental rows"""
+    models = models or model_registry.current
+    if INFERENCE_BACKEND == 'torch':
+        from ml_models import predict_growth_batch
+        return predict_growth_batch(models.growth_model, models.growth_scaler, environmental_rows, growth_timer)
+    with growth_timer('forward'):
+        return models.growth_model.predict(environmental_rows)
+
+def score_crops(environmental_rows, models=None, top_k=CROP_TOP_K):
+    """Indices, probabilities and names of the top_k best crops for a batch of environmental rows"""
+    models = models or model_registry.current
+    if INFERENCE_BACKEND == 'torch':
+        from ml_models import crop_probabilities_batch
+        probabilities = crop_probabilities_batch(models.crop_model, models.crop_scaler, environmental_rows,
+                                                 crop_timer)
+        with crop_timer('top_k'):
+            indices = partial_top_k(probabilities, top_k)
+            probabilities = np.take_along_axis(probabilities, indices, axis=1)
+    else:
+        indices, probabilities = models.crop_model.top_k(environmental_rows, top_k, crop_timer)
+    # Names come from the same model set as the scores
+    return indices, probabilities, np.asarray(models.crop_classes, dtype=object)[indices]
+
+def recommendations_from(probabilities, names):
+    """Recommendations from one scored row, with display emojis"""
+    return add_crop_emojis(crops_from_top_k(range(len(names)), probabilities, names))
+
+growth_batcher = MicroBatcher(
+    'growth', score_growth,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS
+)
+crop_batcher = MicroBatcher(
+    'crop', score_crops,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS
+)
+
+# Bulk crop recommendations: rows scored per forward pass, and the most rows
+# accepted as a JSON array (larger inputs should be streamed as NDJSON)
+BULK_CHUNK_ROWS = int(os.environ.get('BULK_CHUNK_ROWS', '4096'))
+BULK_MAX_JSON_ROWS = int(os.environ.get('BULK_MAX_JSON_ROWS', '100000'))
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines')
+ARROW_TYPES = ('application/vnd.apache.arrow.stream',)
+
+# Crop recommendation cache settings (a size of 0 disables the cache)
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', '10000'))
+RECOMMENDATION_CACHE_TTL = float(os.environ.get('RECOMMENDATION_CACHE_TTL', '3600'))
+RECOMMENDATION_CACHE_PRECISIONS = tuple(
+    int(p) for p in os.environ.get('RECOMMENDATION_CACHE_PRECISIONS', ','.join(map(str, DEFAULT_PRECISIONS))).split(',')
+)
+RECOMMENDATION_CACHE_WARMUP = os.environ.get('RECOMMENDATION_CACHE_WARMUP', 'false').lower() == 'true'
+RECOMMENDATION_CACHE_WARMUP_POINTS = int(os.environ.get('RECOMMENDATION_CACHE_WARMUP_POINTS', '3'))
+
+recommendation_cache = RecommendationCache(
+    max_entries=RECOMMENDATION_CACHE_SIZE,
+    ttl_seconds=RECOMMENDATION_CACHE_TTL,
+    precisions=RECOMMENDATION_CACHE_PRECISIONS
+)
+
+# Nearest dataset rows to a request's conditions; while the models are not
+# loaded, crop recommendations fall back to the votes of the
+# NEIGHBOUR_FALLBACK_K nearest rows
+NEIGHBOUR_INDEX_ENABLED = os.environ.get('NEIGHBOUR_INDEX_ENABLED', 'true').lower() == 'true'
+NEIGHBOUR_FALLBACK_K = int(os.environ.get('NEIGHBOUR_FALLBACK_K', '25'))
+NEIGHBOURS_MAX_K = 100
+neighbour_index = None
+_neighbour_index_build = None
+
+# Live garden streams: messages a viewer may fall behind before it is dropped
+GARDEN_STREAM_QUEUE_SIZE = int(os.environ.get('GARDEN_STREAM_QUEUE_SIZE', '64'))
+garden_hub = GardenHub(max_queue=GARDEN_STREAM_QUEUE_SIZE)
 
 # Plant type to emoji mapping
 PLANT_EMOJIS = {
@@ -69,7 +313,8 @@ PLANT_EMOJIS = {
 class Plant(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    position: int  # 0-8 for 3x3 grid
+    garden_id: str = DEFAULT_GARDEN_ID
+    position: int  # row-major cell index in the garden grid
     plant_type: str
     emoji: str
     water_level: float = 50.0  # 0-100
@@ -85,7 +330,12 @@ class Plant(BaseModel):
     last_watered: Optional[str] = None
     last_fertilized: Optional[str] = None
 
+# Plant documents are stored as validated Plant dumps, so reads that only
+# return them are encoded directly (plant_encoding) rather than re-validated
+PLANT_PROJECTION = {"_id": 0, **dict.fromkeys(Plant.model_fields, 1)}
+
 class PlantCreate(BaseModel):
+    garden_id: str = DEFAULT_GARDEN_ID
     position: int
     plant_type: str
 
@@ -93,6 +343,25 @@ class PlantAction(BaseModel):
     action: str  # 'water', 'fertilize', 'check_pests', 'treat'
     amount: Optional[float] = None
 
+class Garden(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: Optional[str] = None
+    rows: int = DEFAULT_GARDEN_ROWS
+    cols: int = DEFAULT_GARDEN_COLS
+    zipcode: Optional[str] = None
+    last_tick_at: Optional[str] = None
+
+class GardenCreate(BaseModel):
+    name: Optional[str] = None
+    rows: int = Field(DEFAULT_GARDEN_ROWS, ge=1)
+    cols: int = Field(DEFAULT_GARDEN_COLS, ge=1)
+    zipcode: Optional[str] = None
+
+class GardenUpdate(BaseModel):
+    name: Optional[str] = None
+    zipcode: Optional[str] = None
+
 class WeatherRequest(BaseModel):
     zipcode: str
 
@@ -108,229 +377,973 @@ class CropRecommendationRequest(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     """Initialize models on startup"""
-    global growth_model, growth_scaler, crop_model, crop_scaler, label_encoder
+    global scheduler, state_store, simulation_started_at
     
     logging.info("Starting up GardenSim backend...")
     
-    # Get dataset
-    dataset_path = get_dataset_path()
-    if not dataset_path:
-        logging.error("Failed to get dataset")
-        return
+    growth_batcher.start()
+    crop_batcher.start()
     
-    # Check if models exist, train if not
-    models_dir = ROOT_DIR / 'models'
-    growth_model_path = models_dir / 'growth_model.pth'
-    crop_model_path = models_dir / 'crop_model.pth'
+    # Serve right away; readiness is reported by /api/ready until the models are in
+    model_registry.start()
+    start_neighbour_index_build()
+    if model_registry.ready and RECOMMENDATION_CACHE_WARMUP and RECOMMENDATION_CACHE_SIZE > 0:
+        asyncio.create_task(warm_recommendation_cache_logged())
     
-    if not growth_model_path.exists() or not crop_model_path.exists():
-        logging.info("Training models...")
-        try:
-            train_growth_model(dataset_path)
-            train_crop_recommendation_model(dataset_path)
-        except Exception as e:
-            logging.error(f"Error training models: {e}")
+    await ensure_indexes()
+    
+    # Make sure the default garden exists so the scheduler can track its ticks
+    default_garden = Garden(id=DEFAULT_GARDEN_ID, last_tick_at=datetime.now(timezone.utc).isoformat())
+    await db.gardens.update_one(
+        {"id": DEFAULT_GARDEN_ID},
+        {"$setOnInsert": default_garden.model_dump()},
+        upsert=True
+    )
+    
+    if STATE_STORE == 'memory':
+        state_store = GardenStateStore(
+            db, STATE_JOURNAL_PATH,
+            flush_interval=STATE_FLUSH_SECONDS,
+            flush_threshold=STATE_FLUSH_THRESHOLD,
+            idle_seconds=STATE_IDLE_SECONDS,
+            fsync=STATE_JOURNAL_FSYNC,
+            in_use=garden_hub.has_subscribers
+        )
+        await state_store.start()
+    
+    if growth_history:
+        await growth_history.start()
     
-    # Load models
+    if SIMULATION_ENABLED:
+        simulation_started_at = datetime.now(timezone.utc)
+        scheduler = SimulationScheduler(
+            list_gardens, advance_garden_growth,
+            tick_seconds=SIMULATION_TICK_SECONDS,
+            max_concurrency=SIMULATION_MAX_CONCURRENCY
+        )
+        scheduler.start()
+
+async def ensure_indexes():
+    """Create the indexes every per-request query relies on"""
+    # Plants created before gardens existed belong to the default garden
+    await db.plants.update_many({"garden_id": {"$exists": False}}, {"$set": {"garden_id": DEFAULT_GARDEN_ID}})
+    await db.plants.create_index([("garden_id", 1), ("position", 1)], unique=True)
+    await db.plants.create_index([("garden_id", 1), ("id", 1)], unique=True)
+    await db.gardens.create_index("id", unique=True)
+
+async def build_neighbour_index():
+    """Index the crop dataset for neighbour lookups, once it is on disk"""
+    global neighbour_index
+    if neighbour_index is not None or not NEIGHBOUR_INDEX_ENABLED or not DATASET_PATH.exists():
+        return
     try:
-        growth_model, growth_scaler = load_growth_model()
-        crop_model, crop_scaler, label_encoder = load_crop_model()
-        logging.info("Models loaded successfully!")
+        neighbour_index = await asyncio.to_thread(CropNeighbourIndex.from_dataset, DATASET_PATH)
+    except Exception as e:
+        logging.error(f"Error building crop neighbour index: {e}")
+
+def start_neighbour_index_build():
+    """Build the neighbour index in the background, reusing a build that is still running"""
+    global _neighbour_index_build
+    # Startup and the first model swap both ask for it before either build ends
+    if _neighbour_index_build is None or _neighbour_index_build.done():
+        _neighbour_index_build = asyncio.ensure_future(build_neighbour_index())
+    return _neighbour_index_build
+
+def crop_model_version(crop_model):
+    """Identifies a crop model so cached recommendations can be invalidated"""
+    version = getattr(crop_model, 'version', None)
+    if version is None:
+        from model_artifact import sources_version
+        version = sources_version(MODELS_DIR, 'crop')
+    return f"{INFERENCE_BACKEND}:{version}"
+
+def add_crop_emojis(recommendations):
+    """Attach the display emoji to each recommended crop"""
+    for rec in recommendations:
+        rec['emoji'] = PLANT_EMOJIS.get(rec['crop'].lower(), '🌱')
+    return recommendations
+
+async def warm_recommendation_cache():
+    """Precompute recommendations on a coarse grid over the dataset's feature ranges"""
+    try:
+        X = (await asyncio.to_thread(load_arrays)).X
+    except FileNotFoundError:
+        return
+    keys = recommendation_cache.warmup_keys(
+        X.min(axis=0).astype(np.float64), X.max(axis=0).astype(np.float64), RECOMMENDATION_CACHE_WARMUP_POINTS
+    )
+    if len(keys) > RECOMMENDATION_CACHE_SIZE:
+        logging.warning(f"Warmup grid has {len(keys)} points but the cache holds {RECOMMENDATION_CACHE_SIZE}")
+    
+    loop = asyncio.get_running_loop()
+    _, probabilities, names = await loop.run_in_executor(None, score_crops, np.array(keys))
+    for key, row_probabilities, row_names in zip(keys, probabilities, names):
+        recommendation_cache.put(key, recommendations_from(row_probabilities, row_names))
+    logging.info(f"Recommendation cache warmed with {len(keys)} grid points")
+
+async def warm_recommendation_cache_logged():
+    try:
+        await warm_recommendation_cache()
     except Exception as e:
-        logging.error(f"Error loading models: {e}")
+        logging.error(f"Error warming recommendation cache: {e}")
+
+def on_models_swapped(models):
+    """Drop everything computed with the previous models"""
+    recommendation_cache.set_model_version(models.version)
+    _bound_growth_models.clear()
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # Preloaded before the server runs; startup warms the cache
+        return
+    if neighbour_index is None:
+        # The dataset may only have been downloaded to train these models
+        start_neighbour_index_build()
+    if RECOMMENDATION_CACHE_WARMUP and RECOMMENDATION_CACHE_SIZE > 0:
+        asyncio.ensure_future(warm_recommendation_cache_logged())
+
+model_registry.on_swap(on_models_swapped)
 
 @api_router.get("/")
 async def root():
     return {"message": "GardenSim API is running!"}
 
+@api_router.get("/ready")
+async def readiness(response: Response):
+    """Readiness probe: 200 once the models are loaded, 503 with the startup progress until then"""
+    if not model_registry.ready:
+        response.status_code = 503
+    return model_registry.stats()
+
+def require_admin(token):
+    if not ADMIN_TOKEN or not secrets.compare_digest(token or '', ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.post("/admin/models/reload")
+async def reload_models(x_admin_token: Optional[str] = Header(None)):
+    """Load the model files on disk and swap them in without dropping requests"""
+    require_admin(x_admin_token)
+    try:
+        await model_registry.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving the previous models: {e}")
+    return model_registry.stats()
+
 @api_router.post("/plants", response_model=Plant)
 async def create_plant(plant_input: PlantCreate):
     """Plant a new seed in the garden"""
-    # Check if position is already occupied
-    existing = await db.plants.find_one({"position": plant_input.position})
-    if existing:
-        raise HTTPException(status_code=400, detail="Position already occupied")
+    garden = await db.gardens.find_one({"id": plant_input.garden_id}, {"_id": 0, "rows": 1, "cols": 1})
+    if not garden:
+        raise HTTPException(status_code=404, detail="Garden not found")
+    cells = garden.get('rows', DEFAULT_GARDEN_ROWS) * garden.get('cols', DEFAULT_GARDEN_COLS)
+    if not 0 <= plant_input.position < cells:
+        raise HTTPException(status_code=400, detail="Position outside the garden")
     
     plant_type_lower = plant_input.plant_type.lower()
     emoji = PLANT_EMOJIS.get(plant_type_lower, '🌱')
     
     plant = Plant(
+        garden_id=plant_input.garden_id,
         position=plant_input.position,
         plant_type=plant_input.plant_type,
         emoji=emoji,
         planted_date=datetime.now(timezone.utc).isoformat()
     )
     
+    # The unique (garden_id, position) index rejects occupied positions
     doc = plant.model_dump()
-    await db.plants.insert_one(doc)
+    try:
+        await db.plants.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Position already occupied")
+    if state_store:
+        state_store.add_plant(plant.garden_id, plant.model_dump())
+    garden_hub.publish_plants(plant.garden_id, [plant.model_dump()])
     return plant
 
-@api_router.get("/plants", response_model=List[Plant])
-async def get_plants():
-    """Get all plants in the garden"""
-    plants = await db.plants.find({}, {"_id": 0}).to_list(100)
-    return plants
+def plants_response(request, plants, headers=None):
+    """Plant documents in the encoding the request's Accept header asks for"""
+    media_type = plant_encoding.negotiate(request.headers.get('accept'))
+    if media_type is None:
+        raise HTTPException(
+            status_code=406, detail=f"Plants are available as {', '.join(plant_encoding.media_types())}"
+        )
+    return Response(
+        plant_encoding.encode(plants, media_type), media_type=media_type, headers={'Vary': 'Accept', **(headers or {})}
+    )
+
+PLANTS_RESPONSES = {200: {"content": dict.fromkeys(plant_encoding.media_types()[1:], {})}}
+
+@api_router.get("/plants", response_model=List[Plant], responses=PLANTS_RESPONSES)
+async def get_plants(
+    request: Request,
+    garden_id: str = DEFAULT_GARDEN_ID,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[int] = None
+):
+    """Get a page of plants in a garden, ordered by position, as JSON, MessagePack or a binary snapshot"""
+    # Keyset pagination on the (garden_id, position) index: pass the
+    # X-Next-Cursor header of a full page as `after` to get the next one
+    if state_store:
+        state = await current_garden_state(garden_id)
+        plants = sorted(
+            (plant for plant in (state.documents() if state else []) if after is None or plant['position'] > after),
+            key=lambda plant: plant['position']
+        )[:limit]
+    else:
+        query = {"garden_id": garden_id}
+        if after is not None:
+            query["position"] = {"$gt": after}
+        plants = await db.plants.find(query, PLANT_PROJECTION).sort("position", 1).limit(limit).to_list(limit)
+    headers = {'X-Next-Cursor': str(plants[-1]['position'])} if len(plants) == limit else None
+    return plants_response(request, plants, headers)
 
 @api_router.get("/plants/{plant_id}", response_model=Plant)
-async def get_plant(plant_id: str):
+async def get_plant(plant_id: str, garden_id: str = DEFAULT_GARDEN_ID):
     """Get a specific plant"""
-    plant = await db.plants.find_one({"id": plant_id}, {"_id": 0})
+    if state_store:
+        state = await current_garden_state(garden_id)
+        row = state.row(plant_id) if state else None
+        plant = state.document(row) if row is not None else None
+    else:
+        plant = await db.plants.find_one({"garden_id": garden_id, "id": plant_id}, {"_id": 0})
     if not plant:
         raise HTTPException(status_code=404, detail="Plant not found")
     return plant
 
+def utc(moment):
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+@api_router.get("/plants/{plant_id}/history")
+async def get_plant_history(
+    plant_id: str,
+    response: Response,
+    garden_id: str = DEFAULT_GARDEN_ID,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after: Optional[datetime] = None,
+    resolution: str = Query('auto', pattern='^(auto|raw|hour|day)$'),
+    limit: int = Query(HISTORY_MAX_POINTS, ge=1, le=HISTORY_MAX_POINTS)
+):
+    """A plant's growth history between start and end (default the last day), oldest first"""
+    if not growth_history:
+        raise HTTPException(status_code=404, detail="Growth history is disabled")
+    end = utc(end) if end else datetime.now(timezone.utc)
+    start = utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if resolution == 'auto':
+        resolution = growth_history.resolution_for(start, end, limit)
+    points = await growth_history.query(
+        garden_id, plant_id, start, end, resolution, limit, utc(after) if after else None
+    )
+    if len(points) == limit:
+        response.headers['X-Next-Cursor'] = points[-1]['ts']
+    return {"plant_id": plant_id, "resolution": resolution, "points": points}
+
 @api_router.delete("/plants/{plant_id}")
-async def delete_plant(plant_id: str):
+async def delete_plant(plant_id: str, garden_id: str = DEFAULT_GARDEN_ID):
     """Remove a plant from the garden"""
-    result = await db.plants.delete_one({"id": plant_id})
-    if result.deleted_count == 0:
+    # Out of memory first, so a state store flush in flight cannot write it back
+    removed = bool(state_store and state_store.remove_plant(garden_id, plant_id))
+    result = await db.plants.delete_one({"garden_id": garden_id, "id": plant_id})
+    if result.deleted_count == 0 and not removed:
         raise HTTPException(status_code=404, detail="Plant not found")
+    if growth_history:
+        await growth_history.forget(garden_id, plant_id)
+    garden_hub.publish_removed(garden_id, [plant_id])
     return {"message": "Plant removed"}
 
 @api_router.post("/plants/{plant_id}/action")
-async def plant_action(plant_id: str, action_input: PlantAction):
+async def plant_action(plant_id: str, action_input: PlantAction, garden_id: str = DEFAULT_GARDEN_ID):
     """Perform an action on a plant"""
-    plant = await db.plants.find_one({"id": plant_id}, {"_id": 0})
-    if not plant:
-        raise HTTPException(status_code=404, detail="Plant not found")
-    
-    updates = {}
     action = action_input.action
+    now = datetime.now(timezone.utc).isoformat()
     
+    # Each action is both a Mongo update pipeline and an in-memory rule
     if action == 'water':
-        # Increase water level
-        new_water = min(100.0, plant['water_level'] + (action_input.amount or 20.0))
-        updates['water_level'] = new_water
-        updates['last_watered'] = datetime.now(timezone.utc).isoformat()
-        
-        # Overwatering can harm plants
-        if new_water > 90:
-            updates['health'] = max(0, plant['health'] - 5)
-            
+        amount = action_input.amount or simulation_rules.DEFAULT_WATER_AMOUNT
+        pipeline = plant_updates.water_pipeline(amount)
+        rule, args, stamp = simulation_rules.water, (amount,), 'last_watered'
     elif action == 'fertilize':
-        # Add fertilizer
-        amount = action_input.amount or 10.0
-        updates['fertilizer_n'] = min(100.0, plant['fertilizer_n'] + amount)
-        updates['fertilizer_p'] = min(100.0, plant['fertilizer_p'] + amount)
-        updates['fertilizer_k'] = min(100.0, plant['fertilizer_k'] + amount)
-        updates['last_fertilized'] = datetime.now(timezone.utc).isoformat()
-        
+        amount = action_input.amount or simulation_rules.DEFAULT_FERTILIZER_AMOUNT
+        pipeline = plant_updates.fertilize_pipeline(amount)
+        rule, args, stamp = simulation_rules.fertilize, (amount,), 'last_fertilized'
     elif action == 'check_pests':
         # Randomly determine if pests/disease detected
-        import random
-        has_pests = random.random() < 0.15
-        has_disease = random.random() < 0.10
-        updates['has_pests'] = has_pests
-        updates['has_disease'] = has_disease
-        
-        if has_pests:
-            updates['health'] = max(0, plant['health'] - 10)
-        if has_disease:
-            updates['health'] = max(0, plant['health'] - 15)
-            
+        has_pests, has_disease = simulation_rules.roll_pests(pest_rng, 1)
+        pipeline = plant_updates.check_pests_pipeline(has_pests[0], has_disease[0])
+        rule, args, stamp = simulation_rules.check_pests, (has_pests, has_disease), None
     elif action == 'treat':
-        # Treat pests and diseases
-        updates['has_pests'] = False
-        updates['has_disease'] = False
-        updates['health'] = min(100.0, plant['health'] + 20)
-    
-    if updates:
-        await db.plants.update_one({"id": plant_id}, {"$set": updates})
+        pipeline = plant_updates.treat_pipeline()
+        rule, args, stamp = simulation_rules.treat, (), None
+    else:
+        pipeline = None
     
-    # Get updated plant
-    updated_plant = await db.plants.find_one({"id": plant_id}, {"_id": 0})
-    return updated_plant
-
-@api_router.post("/plants/{plant_id}/update-growth")
-async def update_plant_growth(plant_id: str, weather_data: Optional[dict] = None):
-    """Update plant growth based on ML prediction"""
-    plant = await db.plants.find_one({"id": plant_id}, {"_id": 0})
+    if state_store:
+        state = await current_garden_state(garden_id)
+        row = state.row(plant_id) if state else None
+        if row is None:
+            raise HTTPException(status_code=404, detail="Plant not found")
+        if pipeline:
+            state.apply([row], rule, *args)
+            if stamp:
+                state.info[row][stamp] = now
+            state_store.mark_dirty(state, [plant_id])
+        plant = state.document(row)
+    else:
+        # One atomic round trip that returns the updated plant
+        query = {"garden_id": garden_id, "id": plant_id}
+        if pipeline:
+            plant = await db.plants.find_one_and_update(
+                query, pipeline, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+            )
+        else:
+            plant = await db.plants.find_one(query, {"_id": 0})
     if not plant:
         raise HTTPException(status_code=404, detail="Plant not found")
+    if pipeline:
+        garden_hub.publish_plants(garden_id, [plant])
+    return plant
+
+def weather_environment(weather_data=None):
+    """(temperature, humidity, rainfall) used by the growth model, with defaults for missing weather"""
+    if not weather_data:
+        return simulation_rules.DEFAULT_ENVIRONMENT
+    default_temperature, default_humidity, default_rainfall = simulation_rules.DEFAULT_ENVIRONMENT
+    temperature = weather_data.get('temperature', default_temperature)
+    humidity = weather_data.get('humidity', default_humidity)
+    rainfall = weather_data.get('precipitation', default_rainfall)
+    return (float(temperature), float(humidity), float(rainfall))
+
+async def resolve_garden_environment(garden):
+    """Growth environment for a garden from its zipcode's weather, shared through the weather cache"""
+    zipcode = garden.get('zipcode') if garden else None
+    if not zipcode:
+        return weather_environment()
+    try:
+        return weather_environment(await get_weather_by_zipcode(zipcode))
+    except WeatherUnavailable as e:
+        logger.warning(f"Using default growth environment for garden {garden['id']}: {e}")
+        return weather_environment()
+
+_bound_growth_models = OrderedDict()
+
+def bound_growth_model(environment):
+    """Growth model with a garden's temperature, humidity and rainfall folded into its first layer"""
+    growth_model = model_registry.current.growth_model
+    key = (id(growth_model), environment)
+    model = _bound_growth_models.get(key)
+    if model is None:
+        temperature, humidity, rainfall = environment
+        model = growth_model.bind_inputs({3: temperature, 4: humidity, 6: rainfall})
+        _bound_growth_models[key] = model
+        while len(_bound_growth_models) > 256:
+            _bound_growth_models.popitem(last=False)
+    return model
+
+async def score_garden_growth(plant_rows, environment):
+    """Growth scores for per-plant [N, P, K, ph] rows that share one environment"""
+    if INFERENCE_BACKEND == 'torch':
+        temperature, humidity, rainfall = environment
+        count = len(plant_rows)
+        environmental_data = np.column_stack([
+            plant_rows[:, 0],  # N
+            plant_rows[:, 1],  # P
+            plant_rows[:, 2],  # K
+            np.full(count, temperature),
+            np.full(count, humidity),
+            plant_rows[:, 3],  # ph
+            np.full(count, rainfall)
+        ])
+        return await growth_batcher.submit(environmental_data)
     
-    if not growth_model or not growth_scaler:
-        raise HTTPException(status_code=500, detail="Growth model not loaded")
-    
-    # Prepare environmental data
-    temperature = weather_data.get('temperature', 25.0) if weather_data else 25.0
-    humidity = weather_data.get('humidity', 60.0) if weather_data else 60.0
-    rainfall = weather_data.get('precipitation', 0.0) if weather_data else 0.0
-    
-    environmental_data = [
-        plant['fertilizer_n'],  # N
-        plant['fertilizer_p'],  # P
-        plant['fertilizer_k'],  # K
-        temperature,
-        humidity,
-        plant['soil_ph'],
-        rainfall
-    ]
+    # Every row of a garden tick shares the environment, so its part of the
+    # first layer is computed once and the rows only carry the plant columns
+    model = bound_growth_model(environment)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, predict_bound_growth, model, plant_rows)
+
+def predict_bound_growth(model, plant_rows):
+    with growth_timer('forward'):
+        return model.predict(plant_rows)
+
+async def compute_growth(plants, environment=None, ticks=1):
+    """Growth, water and fertilizer arrays after one or more ticks of a PlantArrays batch"""
+    environment = environment or weather_environment()
+    
+    count = plants.count
+    fertilizer_n = plants.fertilizer_n
+    fertilizer_p = plants.fertilizer_p
+    fertilizer_k = plants.fertilizer_k
+    soil_ph = plants.soil_ph
+    water_level = plants.water_level
+    growth_stage = plants.growth_stage
+    has_pests = plants.has_pests
+    has_disease = plants.has_disease
+    
+    # Water and fertilizer decay linearly and clamp at zero, so the inputs of
+    # tick j are known in closed form. Once every level has hit zero the
+    # inputs stop changing, and all remaining ticks grow by the same amount.
+    saturation_tick = int(np.ceil(max(
+        fertilizer_n.max() / simulation_rules.FERTILIZER_DECAY_PER_TICK,
+        fertilizer_p.max() / simulation_rules.FERTILIZER_DECAY_PER_TICK,
+        fertilizer_k.max() / simulation_rules.FERTILIZER_DECAY_PER_TICK,
+        water_level.max() / simulation_rules.WATER_DECAY_PER_TICK,
+        0.0
+    ))) if count else 0
+    explicit_ticks = min(ticks, saturation_tick + 1)
+    steps = np.arange(explicit_ticks, dtype=np.float64)
+    
+    step_n = simulation_rules.decay(fertilizer_n[:, None], simulation_rules.FERTILIZER_DECAY_PER_TICK, steps)
+    step_p = simulation_rules.decay(fertilizer_p[:, None], simulation_rules.FERTILIZER_DECAY_PER_TICK, steps)
+    step_k = simulation_rules.decay(fertilizer_k[:, None], simulation_rules.FERTILIZER_DECAY_PER_TICK, steps)
+    step_water = simulation_rules.decay(water_level[:, None], simulation_rules.WATER_DECAY_PER_TICK, steps)
+    
+    plant_rows = np.column_stack([
+        step_n.ravel(),  # N
+        step_p.ravel(),  # P
+        step_k.ravel(),  # K
+        np.repeat(soil_ph, explicit_ticks)
+    ])
     
-    # Predict growth increment
-    growth_increment = predict_growth(growth_model, growth_scaler, environmental_data) * 100
+    # Predict growth increments for every plant and tick at once
+    growth_increment = await score_garden_growth(plant_rows, environment) * 100
+    growth_increment = growth_increment.reshape(count, explicit_ticks)
     
     # Apply penalties
-    if plant['water_level'] < 20:
-        growth_increment *= 0.5  # Low water slows growth
-    if plant['water_level'] > 90:
-        growth_increment *= 0.7  # Overwatering slows growth
-    if plant['has_pests']:
-        growth_increment *= 0.6
-    if plant['has_disease']:
-        growth_increment *= 0.5
+    growth_increment = growth_increment * simulation_rules.growth_multiplier(
+        step_water, has_pests[:, None], has_disease[:, None]
+    )
+    
+    total_increment = growth_increment.sum(axis=1)
+    if explicit_ticks and ticks > explicit_ticks:
+        total_increment += growth_increment[:, -1] * (ticks - explicit_ticks)
     
     # Update growth and decrease water/fertilizer
-    new_growth = min(100.0, plant['growth_stage'] + growth_increment)
-    new_water = max(0, plant['water_level'] - 2.0)
-    new_n = max(0, plant['fertilizer_n'] - 1.0)
-    new_p = max(0, plant['fertilizer_p'] - 1.0)
-    new_k = max(0, plant['fertilizer_k'] - 1.0)
+    new_growth = np.minimum(100.0, growth_stage + total_increment)
+    new_water = simulation_rules.decay(water_level, simulation_rules.WATER_DECAY_PER_TICK, ticks)
+    new_n = simulation_rules.decay(fertilizer_n, simulation_rules.FERTILIZER_DECAY_PER_TICK, ticks)
+    new_p = simulation_rules.decay(fertilizer_p, simulation_rules.FERTILIZER_DECAY_PER_TICK, ticks)
+    new_k = simulation_rules.decay(fertilizer_k, simulation_rules.FERTILIZER_DECAY_PER_TICK, ticks)
     
-    updates = {
+    return {
         'growth_stage': new_growth,
         'water_level': new_water,
         'fertilizer_n': new_n,
         'fertilizer_p': new_p,
         'fertilizer_k': new_k
     }
+
+async def compute_growth_updates(plants, environment=None, ticks=1):
+    """Compute the result of one or more growth ticks for a list of plant documents in a single batch"""
+    grown = await compute_growth(simulation_rules.PlantArrays.from_documents(plants), environment, ticks)
+    return [
+        {field: float(values[i]) for field, values in grown.items()}
+        for i in range(len(plants))
+    ]
+
+def due_ticks(last_tick_at, now):
+    """Whole ticks elapsed since last_tick_at, and the tick time after applying them"""
+    last = datetime.fromisoformat(last_tick_at)
+    ticks = int((now - last).total_seconds() // SIMULATION_TICK_SECONDS)
+    return ticks, last + timedelta(seconds=ticks * SIMULATION_TICK_SECONDS)
+
+def catchup_ticks(garden_id, ticks, now):
+    """Due ticks to apply: all since startup, and at most SIMULATION_MAX_CATCHUP_TICKS from before it"""
+    since_start, _ = due_ticks(simulation_started_at.isoformat(), now)
+    limit = SIMULATION_MAX_CATCHUP_TICKS + since_start + 1
+    if ticks > limit:
+        logger.warning(f"Garden {garden_id} was {ticks} ticks behind, catching up {limit}")
+    return min(ticks, limit)
+
+async def advance_garden_growth(garden):
+    """Apply every tick that has come due for a garden since it was last advanced"""
+    if not model_registry.ready:
+        return 0
+    if state_store:
+        # Ticks alone must not keep a garden from going idle and being evicted
+        state = state_store.loaded(garden['id'])
+        return await advance_garden_state(state) if state else 0
+    
+    now = datetime.now(timezone.utc)
+    last_tick_at = garden.get('last_tick_at')
+    if not last_tick_at:
+        await db.gardens.update_one({"id": garden['id']}, {"$set": {"last_tick_at": now.isoformat()}})
+        return 0
+    
+    due, new_tick_at = due_ticks(last_tick_at, now)
+    if due < 1:
+        return 0
+    
+    # Claim the ticks first so concurrent schedulers never apply them twice
+    claimed = await db.gardens.find_one_and_update(
+        {"id": garden['id'], "last_tick_at": last_tick_at},
+        {"$set": {"last_tick_at": new_tick_at.isoformat()}}
+    )
+    if not claimed:
+        return 0
+    
+    ticks = catchup_ticks(garden['id'], due, now)
     
-    await db.plants.update_one({"id": plant_id}, {"$set": updates})
+    plants = await db.plants.find({"garden_id": garden['id']}, {"_id": 0}).to_list(None)
+    if not plants:
+        return ticks
     
-    updated_plant = await db.plants.find_one({"id": plant_id}, {"_id": 0})
+    environment = await resolve_garden_environment(garden)
+    all_updates = await compute_growth_updates(plants, environment, ticks=ticks)
+    await db.plants.bulk_write(
+        [
+            UpdateOne(
+                {"garden_id": garden['id'], "id": plant['id']},
+                plant_updates.growth_pipeline(plant_updates.growth_increment(plant, updates), ticks)
+            )
+            for plant, updates in zip(plants, all_updates)
+        ],
+        ordered=False
+    )
+    for plant, updates in zip(plants, all_updates):
+        plant.update(updates)
+    if growth_history:
+        growth_history.record_documents(garden['id'], plants)
+    if garden_hub.has_subscribers(garden['id']):
+        garden_hub.publish_plants(garden['id'], plants)
+    return ticks
+
+async def advance_garden_state(state):
+    """advance_garden_growth for a garden held in the state store"""
+    now = datetime.now(timezone.utc)
+    last_tick_at = state.garden.get('last_tick_at')
+    if not last_tick_at:
+        state_store.mark_garden_dirty(state, {"last_tick_at": now.isoformat()})
+        return 0
+    
+    due, new_tick_at = due_ticks(last_tick_at, now)
+    if due < 1:
+        return 0
+    
+    # Claimed without awaiting in between, so concurrent callers never apply them twice
+    state_store.mark_garden_dirty(state, {"last_tick_at": new_tick_at.isoformat()})
+    ticks = catchup_ticks(state.id, due, now)
+    await grow_garden_state(state, ticks=ticks)
+    return ticks
+
+async def grow_garden_state(state, plant_ids=None, ticks=1):
+    """Grow some (default all) plants of an in-memory garden; returns the rows that grew"""
+    # Whole-garden ticks are sampled for history per garden, single plants per plant
+    history_key = state.id if plant_ids is None else (state.id, plant_ids[0]) if len(plant_ids) == 1 else None
+    plant_ids = list(state.ids) if plant_ids is None else plant_ids
+    rows = [state.row(plant_id) for plant_id in plant_ids]
+    if not plant_ids or None in rows:
+        return []
+    
+    environment = await resolve_garden_environment(state.garden)
+    before = state.plants.subset(rows)
+    grown = await compute_growth(before, environment, ticks)
+    
+    # Applied relative to the current state so actions taken meanwhile are
+    # kept, and re-resolved in case plants were removed while scoring
+    rows = [state.row(plant_id) for plant_id in plant_ids]
+    kept = [i for i, row in enumerate(rows) if row is not None]
+    rows = [rows[i] for i in kept]
+    increment = grown['growth_stage'][kept] - before.growth_stage[kept]
+    simulation_rules.apply_growth(state.plants, rows, increment, ticks)
+    state_store.mark_dirty(state, [plant_ids[i] for i in kept], simulation_rules.GROWTH_FIELDS)
+    if growth_history and history_key and rows:
+        record_garden_state(state, rows, history_key)
+    if garden_hub.has_subscribers(state.id):
+        garden_hub.publish_plants(state.id, state.documents(rows))
+    return rows
+
+def record_garden_state(state, rows, key):
+    """History snapshot of some rows of an in-memory garden, straight from its arrays"""
+    index = np.asarray(rows, dtype=np.intp)
+    values = {field: column[index] for field, column in state.plants.as_dict().items()}
+    growth_history.record(state.id, [state.ids[row] for row in rows], values, key)
+
+async def current_garden_state(garden_id):
+    """In-memory state of a garden with every due tick applied; None if the garden does not exist"""
+    state = await state_store.garden(garden_id)
+    if state is not None and model_registry.ready:
+        await advance_garden_state(state)
+    return state
+
+async def list_gardens():
+    """List the gardens the simulation scheduler should advance"""
+    if state_store:
+        # Idle gardens are caught up in one step when they are next loaded
+        return state_store.active_gardens()
+    return await db.gardens.find({}, {"_id": 0, "id": 1, "zipcode": 1, "last_tick_at": 1}).to_list(None)
+
+@api_router.post("/plants/{plant_id}/update-growth")
+async def update_plant_growth(plant_id: str, garden_id: str = DEFAULT_GARDEN_ID):
+    """Update plant growth based on ML prediction"""
+    if state_store:
+        require_models()
+        state = await current_garden_state(garden_id)
+        rows = await grow_garden_state(state, [plant_id]) if state else []
+        if not rows:
+            raise HTTPException(status_code=404, detail="Plant not found")
+        return state.document(rows[0])
+    
+    plant = await db.plants.find_one({"garden_id": garden_id, "id": plant_id}, {"_id": 0})
+    if not plant:
+        raise HTTPException(status_code=404, detail="Plant not found")
+    
+    require_models()
+    
+    garden = await db.gardens.find_one({"id": garden_id}, {"_id": 0})
+    environment = await resolve_garden_environment(garden)
+    updates = (await compute_growth_updates([plant], environment))[0]
+    
+    # Applied relative to the stored plant so actions taken meanwhile are kept
+    updated_plant = await db.plants.find_one_and_update(
+        {"garden_id": garden_id, "id": plant_id},
+        plant_updates.growth_pipeline(plant_updates.growth_increment(plant, updates)),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_plant:
+        raise HTTPException(status_code=404, detail="Plant not found")
+    if growth_history:
+        growth_history.record_documents(garden_id, [updated_plant], (garden_id, plant_id))
+    garden_hub.publish_plants(garden_id, [updated_plant])
     return updated_plant
 
+@api_router.post("/garden/tick", response_model=List[Plant], responses=PLANTS_RESPONSES)
+async def garden_tick(request: Request, garden_id: str = DEFAULT_GARDEN_ID):
+    """Advance every plant in the garden by one growth tick"""
+    require_models()
+    
+    if state_store:
+        state = await current_garden_state(garden_id)
+        return plants_response(request, state.documents(await grow_garden_state(state)) if state else [])
+    
+    plants = await db.plants.find({"garden_id": garden_id}, PLANT_PROJECTION).to_list(None)
+    if not plants:
+        return plants_response(request, [])
+    
+    garden = await db.gardens.find_one({"id": garden_id}, {"_id": 0})
+    environment = await resolve_garden_environment(garden)
+    all_updates = await compute_growth_updates(plants, environment)
+    
+    await db.plants.bulk_write(
+        [
+            UpdateOne(
+                {"garden_id": garden_id, "id": plant['id']},
+                plant_updates.growth_pipeline(plant_updates.growth_increment(plant, updates))
+            )
+            for plant, updates in zip(plants, all_updates)
+        ],
+        ordered=False
+    )
+    
+    # The updated documents are known locally, so skip the re-read
+    for plant, updates in zip(plants, all_updates):
+        plant.update(updates)
+    if growth_history:
+        growth_history.record_documents(garden_id, plants)
+    garden_hub.publish_plants(garden_id, plants)
+    return plants_response(request, plants)
+
+@api_router.post("/gardens", response_model=Garden)
+async def create_garden(garden_input: GardenCreate):
+    """Create a new garden"""
+    if garden_input.rows * garden_input.cols > MAX_GARDEN_CELLS:
+        raise HTTPException(status_code=400, detail=f"Gardens are limited to {MAX_GARDEN_CELLS} cells")
+    garden = Garden(**garden_input.model_dump(), last_tick_at=datetime.now(timezone.utc).isoformat())
+    await db.gardens.insert_one(garden.model_dump())
+    return garden
+
+@api_router.get("/gardens", response_model=List[Garden])
+async def list_gardens_page(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None
+):
+    """Get a page of gardens, ordered by id"""
+    query = {"id": {"$gt": after}} if after is not None else {}
+    gardens = await db.gardens.find(query, {"_id": 0}).sort("id", 1).limit(limit).to_list(limit)
+    if len(gardens) == limit:
+        response.headers['X-Next-Cursor'] = gardens[-1]['id']
+    return gardens
+
+@api_router.get("/gardens/{garden_id}", response_model=Garden)
+async def get_garden(garden_id: str):
+    """Get a garden's settings"""
+    garden = await db.gardens.find_one({"id": garden_id}, {"_id": 0})
+    if not garden:
+        raise HTTPException(status_code=404, detail="Garden not found")
+    return garden
+
+@api_router.patch("/gardens/{garden_id}", response_model=Garden)
+async def update_garden(garden_id: str, garden_input: GardenUpdate):
+    """Update a garden's settings; its zipcode decides the weather its plants grow in"""
+    updates = garden_input.model_dump(exclude_unset=True)
+    if updates:
+        garden = await db.gardens.find_one_and_update(
+            {"id": garden_id},
+            {"$set": updates},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if garden and state_store:
+            state_store.update_garden(garden_id, updates)
+    else:
+        garden = await db.gardens.find_one({"id": garden_id}, {"_id": 0})
+    if not garden:
+        raise HTTPException(status_code=404, detail="Garden not found")
+    return garden
+
 @api_router.post("/weather")
 async def get_weather(weather_req: WeatherRequest):
     """Get weather data for a location"""
-    weather_data = await get_weather_by_zipcode(weather_req.zipcode)
+    try:
+        weather_data = await get_weather_by_zipcode(weather_req.zipcode)
+    except WeatherLocationNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except WeatherUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     return weather_data
 
+def request_features(req):
+    """Model-order features of a CropRecommendationRequest"""
+    return [req.soil_n, req.soil_p, req.soil_k, req.temperature, req.humidity, req.soil_ph, req.rainfall]
+
+def neighbour_recommendations(environmental_data):
+    """Crops grown by the nearest dataset rows, with the share of them as suitability"""
+    votes = neighbour_index.neighbours(environmental_data, NEIGHBOUR_FALLBACK_K)['votes'][:CROP_TOP_K]
+    return add_crop_emojis([{'crop': vote['crop'], 'suitability': vote['share'] * 100} for vote in votes])
+
 @api_router.post("/crop-recommendations")
-async def get_crop_recommendations(req: CropRecommendationRequest):
+async def get_crop_recommendations(req: CropRecommendationRequest, response: Response):
     """Get crop recommendations based on environmental conditions"""
-    if not crop_model or not crop_scaler or not label_encoder:
-        raise HTTPException(status_code=500, detail="Crop recommendation model not loaded")
-    
-    environmental_data = [
-        req.soil_n,
-        req.soil_p,
-        req.soil_k,
-        req.temperature,
-        req.humidity,
-        req.soil_ph,
-        req.rainfall
-    ]
+    environmental_data = request_features(req)
+    if not model_registry.ready and neighbour_index is not None:
+        response.headers['X-Recommendation-Source'] = 'neighbours'
+        return neighbour_recommendations(environmental_data)
+    require_models()
     
-    recommendations = recommend_crops(
-        crop_model, crop_scaler, label_encoder, environmental_data, top_k=8
-    )
+    # Repeated conditions are served from the cache; misses are scored on the
+    # rounded features so every request for a key gets the same answer
+    cache_key = None
+    if RECOMMENDATION_CACHE_SIZE > 0:
+        cache_key = recommendation_cache.round_features(environmental_data)
+        cached = recommendation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        environmental_data = list(cache_key)
     
-    # Add emojis
-    for rec in recommendations:
-        rec['emoji'] = PLANT_EMOJIS.get(rec['crop'].lower(), '🌱')
+    _, probabilities, names = await crop_batcher.submit(environmental_data)
+    recommendations = recommendations_from(probabilities[0], names[0])
     
+    if cache_key is not None:
+        recommendation_cache.put(cache_key, recommendations)
     return recommendations
 
+@api_router.post("/crop-recommendations/neighbours")
+async def crop_neighbours(req: CropRecommendationRequest, k: int = Query(5, ge=1, le=NEIGHBOURS_MAX_K)):
+    """The k dataset rows nearest to the given conditions, and the share of them growing each crop"""
+    if neighbour_index is None:
+        raise HTTPException(status_code=503, detail="Neighbour index is not ready", headers={'Retry-After': '5'})
+    result = neighbour_index.neighbours(request_features(req), k)
+    add_crop_emojis(result['votes'])
+    return result
+
+@api_router.post("/crop-recommendations/bulk")
+async def bulk_crop_recommendations(request: Request, top_k: int = Query(CROP_TOP_K, ge=1)):
+    """Score many conditions at once; streams one NDJSON result per input row
+    
+    The body is a JSON array of CropRecommendationRequest objects (optionally
+    with an id), NDJSON with one object per line, or an Arrow IPC stream.
+    NDJSON is read and answered chunk by chunk, so memory use does not grow
+    with the number of rows.
+    """
+    models = require_models()
+    top_k = min(top_k, len(models.crop_classes))
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    
+    if content_type in NDJSON_TYPES:
+        chunks = ndjson_chunks(request.stream())
+    elif content_type in ARROW_TYPES:
+        # Arrow bodies are compact and read whole before scoring
+        try:
+            chunks = iter_in_executor(bulk_crops.chunk_arrow(await request.body(), BULK_CHUNK_ROWS))
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+    elif content_type in ('application/json', ''):
+        try:
+            records = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of conditions")
+        if len(records) > BULK_MAX_JSON_ROWS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"At most {BULK_MAX_JSON_ROWS} rows as a JSON array; stream larger inputs as NDJSON"
+            )
+        chunks = iter_in_executor(bulk_crops.chunk_records(records, BULK_CHUNK_ROWS))
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type}")
+    
+    # Every row is scored with the same model snapshot, even across a hot swap
+    def score(X):
+        _, probabilities, names = score_crops(X, models, top_k)
+        return probabilities, names
+    
+    async def results():
+        loop = asyncio.get_running_loop()
+        rows = 0
+        start = time.perf_counter()
+        try:
+            async for chunk in chunks:
+                yield await loop.run_in_executor(None, bulk_crops.encode_chunk, chunk, score)
+                rows += len(chunk)
+        except ClientDisconnect:
+            logger.info(f"Bulk crop recommendations: client went away after {rows} rows")
+            return
+        elapsed = time.perf_counter() - start
+        logger.info(f"Bulk crop recommendations: {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    
+    return DuplexStreamingResponse(results(), media_type='application/x-ndjson')
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Streams the response while the handler is still reading the request body
+    
+    StreamingResponse watches for a disconnect by reading request messages
+    itself, which would take the body away from the handler; here a disconnect
+    surfaces as ClientDisconnect from request.stream() instead.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def iter_in_executor(chunks):
+    """Drive a chunk iterator off the event loop; parsing a chunk is CPU work"""
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+async def ndjson_chunks(stream):
+    """Chunks of BULK_CHUNK_ROWS rows from a streamed NDJSON body"""
+    loop = asyncio.get_running_loop()
+    lines = []
+    start = 0
+    async for line in bulk_crops.aiter_lines(stream):
+        if not line.strip():
+            continue
+        lines.append(line)
+        if len(lines) == BULK_CHUNK_ROWS:
+            yield await loop.run_in_executor(None, bulk_crops.parse_lines, lines, start)
+            start += len(lines)
+            lines = []
+    if lines:
+        yield await loop.run_in_executor(None, bulk_crops.parse_lines, lines, start)
+
+@api_router.get("/crop-recommendations/cache")
+async def get_recommendation_cache_stats():
+    """Hit/miss counters and size of the crop recommendation cache"""
+    return recommendation_cache.stats()
+
+@api_router.get("/inference/metrics")
+async def get_inference_metrics():
+    """Queue depth, batch size and latency metrics of the inference services"""
+    return [growth_batcher.metrics(), crop_batcher.metrics()]
+
+async def load_garden_plants(garden_id):
+    """Every plant of a garden, for the snapshot sent to its first live viewer"""
+    if state_store:
+        state = await current_garden_state(garden_id)
+        return state.documents() if state else []
+    return await db.plants.find({"garden_id": garden_id}, {"_id": 0}).to_list(None)
+
+@api_router.websocket("/gardens/{garden_id}/live")
+async def garden_live(websocket: WebSocket, garden_id: str):
+    """Stream a snapshot of the garden's plants, then a patch of changed fields after every tick or action"""
+    await websocket.accept()
+    subscription = await garden_hub.subscribe(garden_id, load_garden_plants)
+    
+    async def watch_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            subscription.close()
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        while True:
+            message = await subscription.get()
+            if message is None:
+                break
+            await websocket.send_text(message)
+        if subscription.dropped:
+            # Try again later: the client reconnects and resumes from a new snapshot
+            await websocket.close(code=1013)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        garden_hub.unsubscribe(subscription)
+
+@api_router.get("/live/stats")
+async def get_live_stats():
+    """Live viewer and message counts, and the state store's when it is enabled"""
+    stats = {'viewers': garden_hub.stats()}
+    if state_store:
+        stats['state_store'] = state_store.stats()
+    if growth_history:
+        stats['growth_history'] = growth_history.stats()
+    return stats
+
+_profiling = False
+
+@api_router.get("/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(profiler.DEFAULT_INTERVAL_SECONDS * 1000, ge=1),
+    idle: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Sample every thread's stack while live traffic is served; returns collapsed stacks for a flame graph"""
+    global _profiling
+    require_admin(x_admin_token)
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Profiles are limited to {PROFILE_MAX_SECONDS:g} seconds")
+    if _profiling:
+        raise HTTPException(status_code=409, detail="A profile is already being taken")
+    _profiling = True
+    try:
+        # The sampler runs in its own thread while the event loop keeps serving
+        stacks, samples = await asyncio.to_thread(profiler.sample_stacks, seconds, interval_ms / 1000, idle)
+    finally:
+        _profiling = False
+    return PlainTextResponse(profiler.collapsed(stacks), headers={'X-Profile-Samples': str(samples)})
+
+metrics.REGISTRY.gauge('models_ready', 'Whether the serving models are loaded', lambda: {(): model_registry.ready})
+metrics.REGISTRY.gauge(
+    'inference_queue_depth', 'Requests waiting for a batched forward pass',
+    lambda: {(batcher.name,): batcher.metrics()['queue_depth'] for batcher in (growth_batcher, crop_batcher)},
+    ('model',)
+)
+metrics.REGISTRY.counter(
+    'recommendation_cache_lookups_total', 'Crop recommendation cache lookups',
+    lambda: {('hit',): recommendation_cache.hits, ('miss',): recommendation_cache.misses},
+    ('result',)
+)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 # Include the router
 app.include_router(api_router)
 
@@ -340,6 +1353,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Recommendation-Source"],
 )
 
 logging.basicConfig(
@@ -350,4 +1364,18 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if scheduler:
+        await scheduler.stop()
+    await model_registry.stop()
+    if state_store:
+        await state_store.stop()
+    if growth_history:
+        await growth_history.stop()
+    await growth_batcher.stop()
+    await crop_batcher.stop()
+    await close_weather_client()
+    garden_hub.close()
+    client.close()
+
+if PRELOAD_MODELS:
+    model_registry.load_now()
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Growth rules shared by the API, the scheduler and the offline simulator.
+# Everything operates on arrays so one call covers a whole garden, and the
+# rules are pure: randomness comes in as pre-rolled arrays from roll_pests.
+
+WATER_DECAY_PER_TICK = 2.0
+FERTILIZER_DECAY_PER_TICK = 1.0
+LOW_WATER_LEVEL = 20.0
+OVERWATER_LEVEL = 90.0
+
+DEFAULT_WATER_AMOUNT = 20.0
+DEFAULT_FERTILIZER_AMOUNT = 10.0
+OVERWATER_DAMAGE = 5.0
+PEST_DAMAGE = 10.0
+DISEASE_DAMAGE = 15.0  # Replaces the pest damage when both are found
+TREATMENT_HEALING = 20.0
+PEST_CHANCE = 0.15
+DISEASE_CHANCE = 0.10
+
+# (temperature, humidity, rainfall) when no weather is known
+DEFAULT_ENVIRONMENT = (25.0, 60.0, 0.0)
+
+PLANT_DEFAULTS = {
+    'water_level': 50.0,
+    'fertilizer_n': 50.0,
+    'fertilizer_p': 50.0,
+    'fertilizer_k': 50.0,
+    'health': 100.0,
+    'growth_stage': 0.0,
+    'soil_ph': 6.5,
+    'has_pests': False,
+    'has_disease': False
+}
+
+def growth_multiplier(water_level, has_pests, has_disease):
+    """Penalty factor applied to the model's growth increment"""
+    multiplier = np.where(water_level < LOW_WATER_LEVEL, 0.5, 1.0)  # Low water slows growth
+    multiplier = multiplier * np.where(water_level > OVERWATER_LEVEL, 0.7, 1.0)  # Overwatering slows growth
+    multiplier = multiplier * np.where(has_pests, 0.6, 1.0)
+    multiplier = multiplier * np.where(has_disease, 0.5, 1.0)
+    return multiplier
+
+def decay(level, rate, ticks=1):
+    """Level after decaying linearly for some ticks, clamped at zero"""
+    return np.maximum(0.0, level - rate * ticks)
+
+class PlantArrays:
+    """Struct-of-arrays copy of the Plant fields the simulation changes"""
+    FIELDS = tuple(PLANT_DEFAULTS)
+
+    def __init__(self, count, **values):
+        self.count = count
+        for field, default in PLANT_DEFAULTS.items():
+            dtype = bool if isinstance(default, bool) else np.float64
+            value = values.get(field, default)
+            setattr(self, field, np.array(np.broadcast_to(value, count), dtype=dtype))
+
+    @classmethod
+    def from_documents(cls, plants):
+        return cls(len(plants), **{
+            field: [plant.get(field, default) for plant in plants]
+            for field, default in PLANT_DEFAULTS.items()
+        })
+
+    def growth_inputs(self):
+        """[N, P, K, ph] rows for the growth model"""
+        return np.column_stack([self.fertilizer_n, self.fertilizer_p, self.fertilizer_k, self.soil_ph])
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def subset(self, rows):
+        """Copy of the plants at the given row indices"""
+        return PlantArrays(len(rows), **{field: value[rows] for field, value in self.as_dict().items()})
+
+    def assign(self, rows, other):
+        """Overwrite the plants at the given row indices with another PlantArrays' plants"""
+        for field, value in other.as_dict().items():
+            getattr(self, field)[rows] = value
+
+    def extend(self, other):
+        """Append another PlantArrays' plants in place"""
+        for field, value in other.as_dict().items():
+            setattr(self, field, np.concatenate([getattr(self, field), value]))
+        self.count += other.count
+
+    def delete(self, rows):
+        """Remove the plants at the given row indices in place"""
+        for field, value in self.as_dict().items():
+            setattr(self, field, np.delete(value, rows))
+        self.count = len(self.growth_stage)
+
+def grow(plants, growth_scores):
+    """Advance plants by one tick given the growth model's scores for their current state"""
+    increment = growth_scores * 100 * growth_multiplier(plants.water_level, plants.has_pests, plants.has_disease)
+    plants.growth_stage = np.minimum(100.0, plants.growth_stage + increment)
+    plants.water_level = decay(plants.water_level, WATER_DECAY_PER_TICK)
+    plants.fertilizer_n = decay(plants.fertilizer_n, FERTILIZER_DECAY_PER_TICK)
+    plants.fertilizer_p = decay(plants.fertilizer_p, FERTILIZER_DECAY_PER_TICK)
+    plants.fertilizer_k = decay(plants.fertilizer_k, FERTILIZER_DECAY_PER_TICK)
+
+# Fields apply_growth changes
+GROWTH_FIELDS = ('growth_stage', 'water_level', 'fertilizer_n', 'fertilizer_p', 'fertilizer_k')
+
+def apply_growth(plants, rows, growth_increment, ticks=1):
+    """Add precomputed growth to the plants at rows and decay their water and fertilizer for some ticks"""
+    plants.growth_stage[rows] = np.clip(plants.growth_stage[rows] + growth_increment, 0.0, 100.0)
+    plants.water_level[rows] = decay(plants.water_level[rows], WATER_DECAY_PER_TICK, ticks)
+    for field in ('fertilizer_n', 'fertilizer_p', 'fertilizer_k'):
+        getattr(plants, field)[rows] = decay(getattr(plants, field)[rows], FERTILIZER_DECAY_PER_TICK, ticks)
+
+def water(plants, mask, amount=DEFAULT_WATER_AMOUNT):
+    """Water the masked plants; overwatering costs health"""
+    plants.water_level = np.where(mask, np.minimum(100.0, plants.water_level + amount), plants.water_level)
+    overwatered = mask & (plants.water_level > OVERWATER_LEVEL)
+    plants.health = np.where(overwatered, np.maximum(0.0, plants.health - OVERWATER_DAMAGE), plants.health)
+
+def fertilize(plants, mask, amount=DEFAULT_FERTILIZER_AMOUNT):
+    """Raise every fertilizer level of the masked plants"""
+    for field in ('fertilizer_n', 'fertilizer_p', 'fertilizer_k'):
+        level = getattr(plants, field)
+        setattr(plants, field, np.where(mask, np.minimum(100.0, level + amount), level))
+
+def roll_pests(rng, count):
+    """Random (has_pests, has_disease) inspection results for count plants"""
+    return rng.random(count) < PEST_CHANCE, rng.random(count) < DISEASE_CHANCE
+
+def inspection_damage(has_pests, has_disease):
+    """Health lost to an inspection's findings"""
+    return np.where(has_disease, DISEASE_DAMAGE, np.where(has_pests, PEST_DAMAGE, 0.0))
+
+def check_pests(plants, mask, has_pests, has_disease):
+    """Record inspection results (from roll_pests) for the masked plants"""
+    plants.has_pests = np.where(mask, has_pests, plants.has_pests)
+    plants.has_disease = np.where(mask, has_disease, plants.has_disease)
+    damage = inspection_damage(has_pests, has_disease)
+    plants.health = np.where(mask, np.maximum(0.0, plants.health - damage), plants.health)
+
+def treat(plants, mask):
+    """Clear pests and disease of the masked plants and restore health"""
+    plants.has_pests = np.where(mask, False, plants.has_pests)
+    plants.has_disease = np.where(mask, False, plants.has_disease)
+    plants.health = np.where(mask, np.minimum(100.0, plants.health + TREATMENT_HEALING), plants.health)
+
+ACTIONS = {
+    'water': water,
+    'fertilize': fertilize,
+    'check_pests': check_pests,
+    'treat': treat
+}
+
+def random_plants(rng, count):
+    """PlantArrays with every field drawn at random"""
+    return PlantArrays(
+        count,
+        **{field: rng.uniform(0, 100, count) for field in PLANT_DEFAULTS if field not in ('has_pests', 'has_disease')},
+        has_pests=rng.random(count) < 0.5,
+        has_disease=rng.random(count) < 0.5
+    )
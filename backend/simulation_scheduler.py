@@ -0,0 +1,67 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SimulationScheduler:
+    """Background task that advances every garden on a fixed tick interval"""
+    def __init__(self, list_gardens, advance_garden, tick_seconds=5.0, max_concurrency=4):
+        # list_gardens: async () -> list of garden documents
+        # advance_garden: async (garden) -> number of ticks applied
+        self.list_gardens = list_gardens
+        self.advance_garden = advance_garden
+        self.tick_seconds = tick_seconds
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task = None
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        """Start the scheduler loop on the running event loop"""
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"Simulation scheduler started (tick={self.tick_seconds}s, "
+                f"concurrency={self.max_concurrency})"
+            )
+
+    async def stop(self):
+        """Stop the scheduler loop and wait for the current cycle to finish"""
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def run_cycle(self):
+        """Advance all gardens once, limited to max_concurrency at a time"""
+        gardens = await self.list_gardens()
+        await asyncio.gather(*(self._advance(garden) for garden in gardens))
+
+    async def _advance(self, garden):
+        async with self._semaphore:
+            try:
+                await self.advance_garden(garden)
+            except Exception as e:
+                logger.error(f"Error advancing garden {garden.get('id')}: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time()
+        while not self._stopping.is_set():
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                logger.error(f"Simulation cycle failed: {e}")
+
+            # Schedule against fixed deadlines; overrunning cycles are caught
+            # up by the garden's own tick accounting rather than queued here
+            next_run += self.tick_seconds
+            now = loop.time()
+            if next_run < now:
+                next_run = now
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=next_run - now)
+            except asyncio.TimeoutError:
+                pass
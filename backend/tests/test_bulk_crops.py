@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import bulk_crops
+
+def row(i):
+    return json.dumps({'id': i, 'temperature': 20 + i, 'humidity': 70, 'rainfall': 100}).encode()
+
+async def stream_of(parts):
+    for part in parts:
+        yield part
+
+def read_lines(parts, max_line_bytes):
+    async def run():
+        return [line async for line in bulk_crops.aiter_lines(stream_of(parts), max_line_bytes)]
+    return asyncio.run(run())
+
+def piece(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.mark.parametrize('part_size', [1, 7, 64, 10_000])
+def test_too_long_line_is_one_error_row_and_later_rows_keep_their_index(part_size):
+    body = b'\n'.join([row(0), b'{"id": 1, "pad": "' + b'x' * 500 + b'"}', row(2), row(3)]) + b'\n'
+    lines = read_lines(piece(body, part_size), max_line_bytes=100)
+    chunk = bulk_crops.parse_lines(lines)
+    assert chunk.ids == [0, None, 2, 3]
+    assert chunk.errors == [None, 'line too long', None, None]
+
+def test_too_long_last_line_without_newline():
+    body = row(0) + b'\n' + b'y' * 300
+    for part_size in (1, 50, 1000):
+        lines = read_lines(piece(body, part_size), max_line_bytes=100)
+        assert bulk_crops.parse_lines(lines).errors == [None, 'line too long']
+
+def test_chunks_line_up_with_their_inputs():
+    records = [{'id': i, 'temperature': 20, 'humidity': 70, 'rainfall': 100} for i in range(10)]
+    records[3] = {'id': 3, 'humidity': 70}
+    records[7] = {'id': 7, 'temperature': 'hot', 'humidity': 70, 'rainfall': 1}
+    chunks = list(bulk_crops.chunk_records(records, chunk_size=4))
+    assert [chunk.start for chunk in chunks] == [0, 4, 8]
+
+    def score(X):
+        # The top crop is the row's temperature, so results can be matched to rows
+        return np.ones((len(X), 1)), X[:, [3]].astype(int).astype(str).astype(object)
+
+    results = [result for chunk in chunks for result in bulk_crops.score_chunk(chunk, score)]
+    assert [result['index'] for result in results] == list(range(10))
+    assert [result['id'] for result in results] == list(range(10))
+    assert results[3]['error'] == 'missing temperature'
+    assert results[7]['error'].startswith('invalid row')
+    assert all(results[i]['crops'][0]['crop'] == '20' for i in range(10) if i not in (3, 7))
+    # encode_chunk formats the same results without building dicts
+    encoded = ''.join(bulk_crops.encode_chunk(chunk, score) for chunk in chunks)
+    assert [json.loads(line) for line in encoded.splitlines()] == results
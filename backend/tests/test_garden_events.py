@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from garden_events import GardenHub
+
+def plant(plant_id, position, growth_stage=0.0):
+    return {'id': plant_id, 'position': position, 'growth_stage': growth_stage}
+
+def test_changes_published_while_loading_reach_the_first_viewer():
+    async def run():
+        hub = GardenHub()
+        loaded = asyncio.Event()
+
+        async def load_plants(garden_id):
+            # Read before the publishes below, returned after them
+            plants = [plant('a', 0), plant('b', 1)]
+            await loaded.wait()
+            return plants
+
+        subscribing = asyncio.ensure_future(hub.subscribe('g', load_plants))
+        await asyncio.sleep(0)
+        assert hub.has_subscribers('g')
+        hub.publish_plants('g', [plant('a', 0, growth_stage=5.0)])
+        hub.publish_removed('g', ['b'])
+        loaded.set()
+        subscription = await subscribing
+
+        hub.publish_plants('g', [plant('a', 0, growth_stage=6.0)])
+        messages = [json.loads(subscription.queue.get_nowait()) for _ in range(subscription.queue.qsize())]
+        return messages
+    snapshot, patch = asyncio.run(run())
+    assert snapshot == {'type': 'snapshot', 'plants': [plant('a', 0, growth_stage=5.0)]}
+    assert patch == {'type': 'patch', 'plants': {'a': {'growth_stage': 6.0}}}
+
+def test_viewer_leaving_during_load_leaves_nothing_cached():
+    async def run():
+        hub = GardenHub()
+
+        async def load_plants(garden_id):
+            await asyncio.sleep(0.01)
+            return [plant('a', 0)]
+
+        subscribing = asyncio.ensure_future(hub.subscribe('g', load_plants))
+        await asyncio.sleep(0)
+        hub.close()
+        subscription = await subscribing
+        return hub, subscription
+    hub, subscription = asyncio.run(run())
+    assert subscription.closed
+    assert not hub.has_subscribers('g')
+    assert hub._plants == {}
+
+def test_viewer_disconnecting_during_load_does_not_cancel_it_for_others():
+    async def run():
+        hub = GardenHub()
+        loaded = asyncio.Event()
+
+        async def load_plants(garden_id):
+            await loaded.wait()
+            return [plant('a', 0)]
+
+        first = asyncio.ensure_future(hub.subscribe('g', load_plants))
+        second = asyncio.ensure_future(hub.subscribe('g', load_plants))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        loaded.set()
+        subscription = await second
+        return hub, first, subscription
+    hub, first, subscription = asyncio.run(run())
+    assert first.cancelled()
+    assert json.loads(subscription.queue.get_nowait()) == {'type': 'snapshot', 'plants': [plant('a', 0)]}
+    assert hub.stats()['subscribers'] == 1
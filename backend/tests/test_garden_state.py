@@ -0,0 +1,157 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import simulation_rules
+from garden_state import GardenStateStore
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+def plant(garden_id, position):
+    return {
+        'id': f'p{position}', 'garden_id': garden_id, 'position': position, 'plant_type': 'rice',
+        'emoji': '🌾', 'planted_date': '2026-01-01T00:00:00+00:00', **simulation_rules.PLANT_DEFAULTS
+    }
+
+async def make_store(tmp_path, plants=3, **options):
+    db = mongomock_motor.AsyncMongoMockClient()['test']
+    await db.gardens.insert_one({'id': 'g', 'last_tick_at': None})
+    if plants:
+        await db.plants.insert_many([plant('g', position) for position in range(plants)])
+    store = GardenStateStore(db, tmp_path / 'journal.jsonl', flush_interval=3600, **options)
+    await store.start()
+    return db, store
+
+def tick(store, state):
+    """What the simulation scheduler does to a loaded garden"""
+    state = store.loaded(state.id)
+    rows = list(range(len(state.ids)))
+    simulation_rules.apply_growth(state.plants, rows, 1.0)
+    store.mark_dirty(state, state.ids, simulation_rules.GROWTH_FIELDS)
+    store.mark_garden_dirty(state, {'last_tick_at': time.time()})
+
+def test_ticking_garden_is_evicted_once_idle(tmp_path):
+    async def run():
+        db, store = await make_store(tmp_path, idle_seconds=0.2)
+        state = await store.garden('g')
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            tick(store, state)
+            await asyncio.sleep(0.05)
+        await store.evict_idle()
+        stored = await db.plants.find_one({'id': 'p0'})
+        await store.stop()
+        return store, stored
+    store, stored = asyncio.run(run())
+    assert store.evictions == 1
+    assert store.loaded('g') is None
+    assert stored['growth_stage'] > 0
+
+def test_garden_with_viewers_is_not_evicted(tmp_path):
+    async def run():
+        _, store = await make_store(tmp_path, idle_seconds=0.0, in_use=lambda garden_id: True)
+        await store.garden('g')
+        await asyncio.sleep(0.01)
+        await store.evict_idle()
+        await store.stop()
+        return store
+    assert asyncio.run(run()).evictions == 0
+
+def test_journal_holds_only_changed_fields(tmp_path):
+    async def run():
+        _, store = await make_store(tmp_path)
+        state = await store.garden('g')
+        tick(store, state)
+        entries = [json.loads(line) for line in (tmp_path / 'journal.jsonl').read_text().splitlines()]
+        await store.stop()
+        return entries
+    plants_entry = asyncio.run(run())[0]
+    assert plants_entry['ids'] == ['p0', 'p1', 'p2']
+    assert set(plants_entry['fields']) == set(simulation_rules.GROWTH_FIELDS)
+
+def test_flush_upserts_plants_missing_from_mongo(tmp_path):
+    async def run():
+        db, store = await make_store(tmp_path, plants=0)
+        state = await store.garden('g')
+        # Created in memory, not yet in the collection
+        state.add(plant('g', 7))
+        store.mark_dirty(state, ['p7'], ('water_level',))
+        await store.flush()
+        stored = await db.plants.find_one({'id': 'p7'}, {'_id': 0})
+        await store.stop()
+        return stored
+    stored = asyncio.run(run())
+    assert stored is not None
+    assert {field: stored[field] for field in plant('g', 7)} == plant('g', 7)
+
+def test_failed_flushes_compact_the_journal(tmp_path, monkeypatch):
+    async def run():
+        db, store = await make_store(tmp_path)
+        state = await store.garden('g')
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError('mongo is down')
+        monkeypatch.setattr(type(db.plants), 'bulk_write', fail)
+        for _ in range(3):
+            tick(store, state)
+            with pytest.raises(RuntimeError):
+                await store.flush()
+        entries = [json.loads(line) for line in store.journal.flushing_path.read_text().splitlines()]
+        store.journal.close()
+        return entries
+    entries = asyncio.run(run())
+    # One garden entry and one plants entry however many flushes failed
+    assert len(entries) == 2
+    assert len(next(entry for entry in entries if 'plants' in entry)['plants']) == 3
+
+def test_changes_made_while_a_garden_loads_reach_its_state(tmp_path, monkeypatch):
+    async def run():
+        db, store = await make_store(tmp_path)
+        collection = type(db.plants)
+        find = collection.find
+        reads_done = asyncio.Event()
+
+        class SlowCursor:
+            def __init__(self, cursor):
+                self.cursor = cursor
+
+            async def to_list(self, length):
+                plants = await self.cursor.to_list(length)
+                # The request below lands between the read and the end of the load
+                await reads_done.wait()
+                return plants
+
+        monkeypatch.setattr(collection, 'find', lambda self, *args, **kwargs: SlowCursor(find(self, *args, **kwargs)))
+        loading = asyncio.ensure_future(store.garden('g'))
+        await asyncio.sleep(0.01)
+        # create_plant, delete_plant and update_garden write Mongo first, then the store
+        await db.plants.insert_one(plant('g', 5))
+        store.add_plant('g', plant('g', 5))
+        await db.plants.delete_one({'id': 'p0'})
+        removed = store.remove_plant('g', 'p0')
+        store.update_garden('g', {'zipcode': '94103'})
+        reads_done.set()
+        state = await loading
+        monkeypatch.undo()
+        # A plant already read is not added twice
+        store.add_plant('g', plant('g', 1))
+        await store.stop()
+        return state, removed
+    state, removed = asyncio.run(run())
+    assert sorted(state.ids) == ['p1', 'p2', 'p5']
+    assert state.garden['zipcode'] == '94103'
+    assert not removed
+
+def test_cancelled_request_does_not_cancel_a_shared_load(tmp_path):
+    async def run():
+        _, store = await make_store(tmp_path)
+        first = asyncio.ensure_future(store.garden('g'))
+        second = asyncio.ensure_future(store.garden('g'))
+        await asyncio.sleep(0)
+        first.cancel()
+        state = await second
+        await store.stop()
+        return state
+    assert asyncio.run(run()).ids == ['p0', 'p1', 'p2']
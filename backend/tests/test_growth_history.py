@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from growth_history import FIELDS, GrowthHistory
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+def values(count, value=1.0):
+    return {field: [value] * count for field in FIELDS}
+
+async def make_history(**options):
+    db = mongomock_motor.AsyncMongoMockClient()['test']
+    history = GrowthHistory(db, sample_seconds=0, raw_retention=10 ** 9, hourly_retention=10 ** 9, **options)
+    await history.setup()
+    return history
+
+def test_forget_drops_buffered_points():
+    async def run():
+        history = await make_history()
+        history.record('g', ['a', 'b'], values(2))
+        await history.forget('g', 'a')
+        await history.flush()
+        raw = history.collections['raw']
+        return await raw.count_documents({'meta.plant_id': 'a'}), await raw.count_documents({'meta.plant_id': 'b'})
+    assert asyncio.run(run()) == (0, 1)
+
+def test_failed_flush_keeps_points(monkeypatch):
+    async def run():
+        history = await make_history()
+        history.record('g', ['a'], values(1))
+        raw_type = type(history.collections['raw'])
+        insert_many = raw_type.insert_many
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError('mongo is down')
+        monkeypatch.setattr(raw_type, 'insert_many', fail)
+        with pytest.raises(RuntimeError):
+            await history.flush()
+        monkeypatch.setattr(raw_type, 'insert_many', insert_many)
+        await history.flush()
+        return await history.collections['raw'].count_documents({}), history.stats()['buffered_points']
+    assert asyncio.run(run()) == (1, 0)
+
+def test_failed_rollup_is_retried_without_duplicates(monkeypatch):
+    async def run():
+        history = await make_history()
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        await history.collections['raw'].insert_many([
+            {'ts': start + timedelta(minutes=10 * i), 'meta': {'garden_id': 'g', 'plant_id': 'a'},
+             **{field: float(i) for field in FIELDS}}
+            for i in range(12)
+        ])
+        hourly_type = type(history.collections['hour'])
+        bulk_write = hourly_type.bulk_write
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError('mongo is down')
+        monkeypatch.setattr(hourly_type, 'bulk_write', fail)
+        with pytest.raises(RuntimeError):
+            await history.rollup(now=start + timedelta(hours=3))
+        assert await history.rollup_state.find_one({'_id': 'hour'}) is None
+
+        monkeypatch.setattr(hourly_type, 'bulk_write', bulk_write)
+        await history.rollup(now=start + timedelta(hours=3))
+        # Repeating a period (another worker, or a retry) replaces its documents
+        await history.rollup_state.delete_many({})
+        await history.rollup(now=start + timedelta(hours=3))
+        return await history.collections['hour'].find({}, {'_id': 0, 'growth_stage': 1, 'samples': 1}).sort('ts', 1).to_list(None)
+    assert asyncio.run(run()) == [{'growth_stage': 2.5, 'samples': 6}, {'growth_stage': 8.5, 'samples': 6}]
@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model_artifact import read_artifact, write_artifact
+
+def test_concurrent_writers_of_one_artifact_never_mix_their_files(tmp_path):
+    path = tmp_path / 'model.gsm'
+
+    def write(i):
+        # Large enough that the writes overlap
+        return write_artifact(path, {'weight': np.full((512, 512), i, dtype=np.float32)}, {'writer': i})
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, range(16)))
+
+    header, arrays = read_artifact(path)
+    assert np.all(arrays['weight'] == header['writer'])
+    assert [p.name for p in tmp_path.iterdir()] == ['model.gsm']
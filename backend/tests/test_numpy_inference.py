@@ -0,0 +1,50 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import numpy_inference
+from numpy_inference import MODELS_DIR, PARITY_TOLERANCE
+
+DATASET_PATH = Path(__file__).parent.parent / 'data' / 'Crop_recommendation.csv'
+FEATURES = ['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']
+TORCH_FILES = ('growth_model.pth', 'growth_scaler.pkl', 'crop_model.pth', 'crop_scaler.pkl', 'crop_classes.pkl')
+
+@pytest.fixture(scope='module')
+def torch_models():
+    pytest.importorskip('torch')
+    missing = [name for name in TORCH_FILES if not (MODELS_DIR / name).exists()]
+    if missing:
+        pytest.skip(f"Trained models missing from {MODELS_DIR}: {', '.join(missing)}")
+    import ml_models
+    growth_model, growth_scaler = ml_models.load_growth_model()
+    crop_model, crop_scaler, _ = ml_models.load_crop_model()
+    return {
+        'growth': lambda X: ml_models.predict_growth_batch(growth_model, growth_scaler, X),
+        'crop': lambda X: ml_models.crop_probabilities_batch(crop_model, crop_scaler, X)
+    }
+
+@pytest.fixture(scope='module')
+def inputs():
+    pd = pytest.importorskip('pandas')
+    X = pd.read_csv(DATASET_PATH)[FEATURES].values
+    # Also probe well outside the training distribution
+    rng = np.random.default_rng(0)
+    return np.vstack([X, rng.uniform(X.min(axis=0) - 50, X.max(axis=0) + 50, size=(1000, 7))])
+
+def assert_parity(models_dir, torch_models, inputs):
+    growth = numpy_inference.load_growth_model(models_dir).predict(inputs)
+    crop = numpy_inference.load_crop_model(models_dir).predict_proba(inputs)
+    assert np.abs(growth - torch_models['growth'](inputs)).max() <= PARITY_TOLERANCE
+    assert np.abs(crop - torch_models['crop'](inputs)).max() <= PARITY_TOLERANCE
+
+def test_numpy_models_match_torch(torch_models, inputs):
+    # Loads the .gsm artifacts when they are up to date
+    assert_parity(MODELS_DIR, torch_models, inputs)
+
+def test_models_read_from_state_dicts_match_torch(torch_models, inputs, tmp_path):
+    # Without artifacts the layers are folded from the torch state_dicts
+    for name in TORCH_FILES:
+        shutil.copy(MODELS_DIR / name, tmp_path / name)
+    assert_parity(tmp_path, torch_models, inputs)
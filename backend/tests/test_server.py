@@ -0,0 +1,115 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+BODY = {'temperature': 21, 'humidity': 82, 'rainfall': 200, 'soil_n': 90, 'soil_p': 42, 'soil_k': 43, 'soil_ph': 6.5}
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """server.py on mongomock, with the simulation, growth history and model watcher off"""
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {
+            'MONGO_URL': 'mongodb://localhost:27017', 'DB_NAME': 'test', 'SIMULATION_ENABLED': 'false',
+            'HISTORY_ENABLED': 'false', 'MODEL_WATCH_SECONDS': '0',
+            'STATE_JOURNAL_PATH': str(tmp_path_factory.mktemp('state') / 'journal.jsonl')
+        }.items():
+            patch.setenv(name, value)
+        import motor.motor_asyncio
+        patch.setattr(motor.motor_asyncio, 'AsyncIOMotorClient', mongomock_motor.AsyncMongoMockClient)
+        import server
+    if not server.models_trained():
+        pytest.skip("Trained models missing; run python train.py")
+    return server
+
+@pytest.fixture
+def client(server, monkeypatch):
+    from fastapi.testclient import TestClient
+    # A fresh database for every test
+    monkeypatch.setattr(server, 'db', mongomock_motor.AsyncMongoMockClient()['test'])
+    with TestClient(server.app) as client:
+        yield client
+    server.state_store = None
+
+def wait_ready(client):
+    deadline = time.monotonic() + 60
+    while client.get('/api/ready').status_code != 200:
+        assert time.monotonic() < deadline, "models did not load"
+        time.sleep(0.05)
+
+def stored_plant(server, client, plant_id):
+    return client.portal.call(server.db.plants.find_one, {'id': plant_id}, {'_id': 0})
+
+def test_concurrent_actions_on_one_plant_are_all_applied(server, client):
+    plant = client.post('/api/plants', json={'position': 0, 'plant_type': 'rice'}).json()
+
+    def water(_):
+        return client.post(f"/api/plants/{plant['id']}/action", json={'action': 'water', 'amount': 1.0}).status_code
+
+    with ThreadPoolExecutor(8) as pool:
+        assert set(pool.map(water, range(20))) == {200}
+    assert stored_plant(server, client, plant['id'])['water_level'] == plant['water_level'] + 20
+
+def test_actions_follow_the_rules(server, client):
+    plant = client.post('/api/plants', json={'position': 0, 'plant_type': 'rice'}).json()
+    url = f"/api/plants/{plant['id']}/action"
+    watered = client.post(url, json={'action': 'water', 'amount': 45.0}).json()
+    # Overwatering past 90 costs 5 health
+    assert (watered['water_level'], watered['health']) == (95.0, 95.0)
+    fertilized = client.post(url, json={'action': 'fertilize', 'amount': 60.0}).json()
+    assert fertilized['fertilizer_n'] == 100.0
+    treated = client.post(url, json={'action': 'treat'}).json()
+    assert (treated['has_pests'], treated['has_disease'], treated['health']) == (False, False, 100.0)
+    # Unknown actions change nothing
+    assert client.post(url, json={'action': 'bogus'}).json() == treated
+    assert client.post('/api/plants/missing/action', json={'action': 'water'}).status_code == 404
+
+@pytest.fixture
+def memory_store_client(server, monkeypatch):
+    from fastapi.testclient import TestClient
+    monkeypatch.setattr(server, 'STATE_STORE', 'memory')
+    monkeypatch.setattr(server, 'db', mongomock_motor.AsyncMongoMockClient()['test'])
+    with TestClient(server.app) as client:
+        yield client
+    server.state_store = None
+
+def test_memory_store_serves_changes_and_flushes_them(server, memory_store_client):
+    client = memory_store_client
+    kept = client.post('/api/plants', json={'position': 0, 'plant_type': 'rice'}).json()
+    removed = client.post('/api/plants', json={'position': 1, 'plant_type': 'maize'}).json()
+    client.post(f"/api/plants/{kept['id']}/action", json={'action': 'water', 'amount': 10.0})
+    # Served from memory before any flush
+    plants = {plant['id']: plant for plant in client.get('/api/plants').json()}
+    assert plants[kept['id']]['water_level'] == kept['water_level'] + 10
+    assert client.delete(f"/api/plants/{removed['id']}").status_code == 200
+
+    client.portal.call(server.state_store.flush)
+    assert stored_plant(server, client, kept['id'])['water_level'] == kept['water_level'] + 10
+    # The flush upserts, but never writes back a deleted plant
+    assert stored_plant(server, client, removed['id']) is None
+    assert client.delete(f"/api/plants/{removed['id']}").status_code == 404
+
+def test_bulk_ndjson_results_line_up_with_input_rows(server, client):
+    wait_ready(client)
+    lines = [json.dumps(dict(BODY, id=0)), json.dumps({'id': 1, 'pad': 'x' * 100_000}), '',
+             json.dumps({'id': 2, 'humidity': 80}), json.dumps(dict(BODY, id=3))]
+
+    def body():
+        # Streamed in pieces that split rows, including the over-long one
+        data = ('\n'.join(lines) + '\n').encode()
+        for start in range(0, len(data), 4096):
+            yield data[start:start + 4096]
+
+    response = client.post(
+        '/api/crop-recommendations/bulk', content=body(), headers={'Content-Type': 'application/x-ndjson'}
+    )
+    assert response.status_code == 200
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert [(result['index'], result.get('id')) for result in results] == [(0, 0), (1, None), (2, 2), (3, 3)]
+    assert results[1]['error'] == 'line too long'
+    assert results[2]['error'] == 'missing temperature'
+    assert results[0]['crops'] == results[3]['crops']
+    assert len(results[0]['crops']) == server.CROP_TOP_K
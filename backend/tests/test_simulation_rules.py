@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+import plant_updates
+import simulation_rules as rules
+
+FLOAT_FIELDS = [field for field, default in rules.PLANT_DEFAULTS.items() if not isinstance(default, bool)]
+
+def take(plants, index):
+    """PlantArrays holding a single plant"""
+    return plants.subset(np.array([index]))
+
+@pytest.mark.parametrize('seed', range(5))
+def test_batched_rules_match_per_plant(seed, count=200, rounds=10):
+    rng = np.random.default_rng(seed)
+    for _ in range(rounds):
+        plants = rules.random_plants(rng, count)
+        mask = rng.random(count) < 0.7
+        has_pests, has_disease = rules.roll_pests(rng, count)
+        scores = rng.uniform(0, 0.2, count)
+        amount = float(rng.uniform(0, 40))
+        steps = [
+            lambda p, m, i: rules.water(p, m, amount),
+            lambda p, m, i: rules.fertilize(p, m, amount),
+            lambda p, m, i: rules.check_pests(p, m, has_pests[i], has_disease[i]),
+            lambda p, m, i: rules.treat(p, m),
+            lambda p, m, i: rules.grow(p, scores[i])
+        ]
+        singles = [take(plants, i) for i in range(count)]
+        for step in steps:
+            step(plants, mask, slice(None))
+            for i, single in enumerate(singles):
+                step(single, mask[i:i + 1], slice(i, i + 1))
+        for field, batched in plants.as_dict().items():
+            np.testing.assert_array_equal(batched, np.concatenate([getattr(single, field) for single in singles]))
+
+def test_seeded_pest_rolls_are_reproducible():
+    first = rules.roll_pests(np.random.default_rng(0), 500)
+    second = rules.roll_pests(np.random.default_rng(0), 500)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+def run_pipelines(plants, pipelines):
+    """Plant documents after each plant's update pipeline has run in (mongomock) MongoDB"""
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient()['test']['plants']
+    columns = plants.as_dict()
+    collection.insert_many([
+        {'id': i, **{field: columns[field][i].item() for field in columns}} for i in range(plants.count)
+    ])
+    for i, pipeline in enumerate(pipelines):
+        if pipeline is not None:
+            collection.update_one({'id': i}, pipeline)
+    return rules.PlantArrays.from_documents(list(collection.find({}, sort=[('id', 1)])))
+
+def assert_same_plants(stored, expected):
+    for field in rules.PLANT_DEFAULTS:
+        np.testing.assert_array_equal(getattr(stored, field), getattr(expected, field), err_msg=field)
+
+@pytest.fixture
+def plants():
+    # Levels near 0 and 100 exercise the clamps
+    rng = np.random.default_rng(1)
+    plants = rules.random_plants(rng, 300)
+    for field in FLOAT_FIELDS:
+        values = getattr(plants, field)
+        values[::7] = rng.uniform(95, 100, len(values[::7]))
+        values[3::7] = rng.uniform(0, 5, len(values[3::7]))
+    return plants
+
+def test_water_pipeline_matches_rules(plants):
+    mask = np.random.default_rng(2).random(plants.count) < 0.7
+    stored = run_pipelines(plants, [plant_updates.water_pipeline(25.0) if m else None for m in mask])
+    rules.water(plants, mask, 25.0)
+    assert_same_plants(stored, plants)
+
+def test_fertilize_pipeline_matches_rules(plants):
+    mask = np.random.default_rng(3).random(plants.count) < 0.7
+    stored = run_pipelines(plants, [plant_updates.fertilize_pipeline(15.0) if m else None for m in mask])
+    rules.fertilize(plants, mask, 15.0)
+    assert_same_plants(stored, plants)
+
+def test_check_pests_pipeline_matches_rules(plants):
+    has_pests, has_disease = rules.roll_pests(np.random.default_rng(4), plants.count)
+    stored = run_pipelines(plants, [
+        plant_updates.check_pests_pipeline(pests, disease) for pests, disease in zip(has_pests, has_disease)
+    ])
+    rules.check_pests(plants, np.ones(plants.count, dtype=bool), has_pests, has_disease)
+    assert_same_plants(stored, plants)
+
+def test_treat_pipeline_matches_rules(plants):
+    mask = np.random.default_rng(5).random(plants.count) < 0.7
+    stored = run_pipelines(plants, [plant_updates.treat_pipeline() if m else None for m in mask])
+    rules.treat(plants, mask)
+    assert_same_plants(stored, plants)
+
+@pytest.mark.parametrize('ticks', [1, 7])
+def test_growth_pipeline_matches_rules(plants, ticks):
+    increments = np.random.default_rng(6).uniform(-2, 20, plants.count)
+    stored = run_pipelines(plants, [plant_updates.growth_pipeline(float(increment), ticks) for increment in increments])
+    rules.apply_growth(plants, np.arange(plants.count), increments, ticks)
+    assert_same_plants(stored, plants)
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from weather_service import CircuitBreaker, WeatherClient, WeatherLocationNotFound, WeatherUnavailable
+
+def current(zipcode):
+    return {
+        'current': {'temp_c': 20.0, 'humidity': 50, 'condition': {'text': 'Sunny'}, 'precip_mm': 0.0},
+        'location': {'name': zipcode, 'region': '', 'country': ''}
+    }
+
+def test_half_open_breaker_lets_one_trial_call_through():
+    async def run():
+        upstream = {'fail': True, 'calls': []}
+        answer = asyncio.Event()
+
+        async def handler(request):
+            zipcode = request.url.params['q']
+            upstream['calls'].append(zipcode)
+            if upstream['fail']:
+                return httpx.Response(503)
+            await answer.wait()
+            return httpx.Response(200, json=current(zipcode))
+
+        client = WeatherClient(
+            api_key='key', breaker=CircuitBreaker(failure_threshold=1, reset_seconds=0.05),
+            transport=httpx.MockTransport(handler)
+        )
+        # Expired but still within the stale window
+        client._cache['stale'] = (time.monotonic() - client.ttl_seconds - 1, {'location': 'stale'})
+        with pytest.raises(WeatherUnavailable):
+            await client.get('first')
+        assert client.breaker.state == 'open'
+
+        await asyncio.sleep(0.06)
+        assert client.breaker.state == 'half-open'
+        upstream['fail'] = False
+        trial = asyncio.ensure_future(client.get('trial'))
+        await asyncio.sleep(0)
+        # Other callers fail fast or are served stale data while the trial runs
+        others = await asyncio.wait_for(
+            asyncio.gather(*(client.get(f'other-{i}') for i in range(5)), return_exceptions=True), 1
+        )
+        stale = await asyncio.wait_for(client.get('stale'), 1)
+        calls_during_trial = list(upstream['calls'])
+
+        answer.set()
+        await trial
+        after = await client.get('after')
+        await client.close()
+        return others, stale, calls_during_trial, after, client.breaker.state
+
+    others, stale, calls_during_trial, after, state = asyncio.run(run())
+    assert all(isinstance(other, WeatherUnavailable) for other in others)
+    assert stale['location'] == 'stale'
+    assert calls_during_trial == ['first', 'trial']
+    assert after['location'] == 'after'
+    assert state == 'closed'
+
+def test_unknown_locations_do_not_open_the_circuit():
+    async def run():
+        calls = []
+
+        async def handler(request):
+            zipcode = request.url.params['q']
+            calls.append(zipcode)
+            if zipcode.startswith('bad'):
+                return httpx.Response(400, json={'error': {'code': 1006, 'message': 'No matching location found.'}})
+            return httpx.Response(200, json=current(zipcode))
+
+        client = WeatherClient(
+            api_key='key', breaker=CircuitBreaker(failure_threshold=2), transport=httpx.MockTransport(handler)
+        )
+        for zipcode in ['bad-1', 'bad-2', 'bad-3', 'bad-1']:
+            with pytest.raises(WeatherLocationNotFound, match='No matching location'):
+                await client.get(zipcode)
+        good = await client.get('good')
+        await client.close()
+        return calls, good, client.breaker.state
+
+    calls, good, state = asyncio.run(run())
+    # The repeated bad zipcode is answered from its negative cache entry
+    assert calls == ['bad-1', 'bad-2', 'bad-3', 'good']
+    assert good['location'] == 'good'
+    assert state == 'closed'
+
+def test_unexpected_error_in_the_trial_call_frees_the_half_open_breaker():
+    async def run():
+        upstream = {'error': httpx.ConnectError('down')}
+
+        async def handler(request):
+            raise upstream['error']
+
+        client = WeatherClient(
+            api_key='key', breaker=CircuitBreaker(failure_threshold=1, reset_seconds=0.05),
+            transport=httpx.MockTransport(handler)
+        )
+        with pytest.raises(WeatherUnavailable):
+            await client.get('first')
+        await asyncio.sleep(0.06)
+        upstream['error'] = RuntimeError('bug')
+        with pytest.raises(RuntimeError):
+            await client.get('trial')
+        state = client.breaker.state
+        allowed = client.breaker.allow()
+        await client.close()
+        return state, allowed
+
+    assert asyncio.run(run()) == ('half-open', True)
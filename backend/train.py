@@ -0,0 +1,118 @@
+"""Train the growth and crop recommendation models.
+
+Both models train at the same time in separate worker processes, each limited
+to its share of the CPU threads, from one parse of the dataset. Run from the
+backend directory:
+
+    python train.py --batch-size 64 --validation-split 0.2 --patience 10
+
+Mini-batches, the held-out validation split and early stopping are opt-in;
+without them training matches the server's full-batch defaults. A checkpoint
+is written to --checkpoint-dir after every epoch, so an interrupted run picks
+up where it stopped with --resume. Artifacts are written to models/ exactly as
+the server's startup training writes them.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data_manager import get_dataset_path
+
+logger = logging.getLogger(__name__)
+
+MODELS = ('growth', 'crop')
+DEFAULT_EPOCHS = {'growth': 100, 'crop': 150}
+
+def _train(name, dataset_path, data, threads, options):
+    """Train one model in this process and return its name, history and duration"""
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    import ml_models
+    trainer = {
+        'growth': ml_models.train_growth_model,
+        'crop': ml_models.train_crop_recommendation_model
+    }[name]
+    
+    options = dict(options)
+    if options.get('epochs') is None:
+        options['epochs'] = DEFAULT_EPOCHS[name]
+    history = []
+    start = time.perf_counter()
+    trainer(dataset_path, history=history, data=data, **options)
+    return name, history, time.perf_counter() - start
+
+def train_models(dataset_path, models=MODELS, parallel=True, threads=None, **options):
+    """Train the given models, concurrently in a process pool unless parallel is False
+    
+    threads is the torch thread count of each model; by default the CPUs are
+    split between the models training at the same time. Remaining options are
+    passed to the ml_models trainers. Returns {model: (history, seconds)}.
+    """
+    import ml_models
+    models = list(models)
+    workers = len(models) if parallel and len(models) > 1 else 1
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    
+    # Parsed once here and shared by every model
+    data = ml_models.load_training_data(dataset_path)
+    
+    results = {}
+    if workers == 1:
+        for name in models:
+            name, history, seconds = _train(name, dataset_path, data, threads, options)
+            results[name] = (history, seconds)
+        return results
+    
+    # torch's thread pools do not survive a fork, so workers are spawned fresh
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(_train, name, dataset_path, data, threads, options) for name in models]
+        for future in futures:
+            name, history, seconds = future.result()
+            results[name] = (history, seconds)
+    return results
+
+def summarize(name, history, seconds):
+    epoch_times = [epoch['seconds'] for epoch in history]
+    last = history[-1] if history else {}
+    val_text = f", val loss {last['val_loss']:.4f}" if last.get('val_loss') is not None else ''
+    mean_ms = 1000 * sum(epoch_times) / len(epoch_times) if epoch_times else 0.0
+    logger.info(f"{name}: {len(history)} epochs in {seconds:.2f}s ({mean_ms:.1f} ms/epoch), "
+                f"loss {last.get('loss', float('nan')):.4f}{val_text}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help='crop recommendation CSV (downloaded if omitted)')
+    parser.add_argument('--models', nargs='+', choices=MODELS, default=list(MODELS))
+    parser.add_argument('--epochs', type=int, help='maximum epochs (default 100 growth, 150 crop)')
+    parser.add_argument('--batch-size', type=int, default=0, help='mini-batch size; 0 trains full-batch')
+    parser.add_argument('--validation-split', type=float, default=0.0, help='fraction of rows held out')
+    parser.add_argument('--patience', type=int, help='epochs without validation improvement before stopping')
+    parser.add_argument('--checkpoint-dir', default='models/checkpoints')
+    parser.add_argument('--resume', action='store_true', help='continue from the last checkpoints')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, help='torch threads per model (default: CPUs split between models)')
+    parser.add_argument('--sequential', action='store_true', help='train one model after the other in this process')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    dataset_path = args.dataset or get_dataset_path()
+    if not dataset_path:
+        raise SystemExit("No dataset available")
+
+    start = time.perf_counter()
+    results = train_models(
+        dataset_path, models=args.models, parallel=not args.sequential, threads=args.threads,
+        epochs=args.epochs, batch_size=args.batch_size or None, validation_split=args.validation_split,
+        patience=args.patience, checkpoint_dir=args.checkpoint_dir, resume=args.resume, seed=args.seed
+    )
+    for name, (history, seconds) in results.items():
+        summarize(name, history, seconds)
+    logger.info(f"Trained {len(results)} models in {time.perf_counter() - start:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -1,50 +1,257 @@
-import requests
+import asyncio
+import httpx
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 import logging
 
+from metrics import WEATHER_FETCH_SECONDS
+
 logger = logging.getLogger(__name__)
 
-WEATHER_API_KEY = os.environ.get('WEATHER_API_KEY')
 WEATHER_API_BASE = 'http://api.weatherapi.com/v1'
 
-async def get_weather_by_zipcode(zipcode: str):
-    """Fetch current weather data from WeatherAPI"""
-    try:
-        url = f"{WEATHER_API_BASE}/current.json"
-        params = {
-            'key': WEATHER_API_KEY,
-            'q': zipcode,
-            'aqi': 'no'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extract relevant weather data
-        weather_data = {
-            'temperature': data['current']['temp_c'],
-            'humidity': data['current']['humidity'],
-            'condition': data['current']['condition']['text'],
-            'precipitation': data['current']['precip_mm'],
-            'location': data['location']['name'],
-            'region': data['location']['region'],
-            'country': data['location']['country'],
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        }
-        
+class WeatherUnavailable(Exception):
+    """Raised when neither fresh nor acceptably stale weather data is available"""
+
+class WeatherLocationNotFound(WeatherUnavailable):
+    """Raised when WeatherAPI does not know the requested location"""
+
+# Upstream answers blamed on the request (an unknown zipcode), cached as negative entries
+LOCATION_NOT_FOUND_STATUSES = (400, 404)
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for a cool-down period after repeated failures"""
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        # Set while the single trial call of a half-open breaker is running
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go upstream; half-open lets exactly one trial call through
+
+        An allowed call must end in record_success(), record_failure() or
+        release().
+        """
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'open' or self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == 'half-open':
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """An allowed call ended without a verdict on the upstream; a half-open breaker may try again"""
+        self._trial_in_flight = False
+
+class WeatherClient:
+    """Pooled async WeatherAPI client with a per-zipcode TTL cache"""
+    def __init__(self, base_url=WEATHER_API_BASE, api_key=None, ttl_seconds=600.0,
+                 stale_seconds=3600.0, timeout=10.0, max_connections=20, max_entries=10000,
+                 breaker=None, transport=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.ttl_seconds = ttl_seconds
+        # How long past its TTL an entry may still be served while it is refreshed
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.breaker = breaker or CircuitBreaker()
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport
+        )
+        self._cache = OrderedDict()  # zipcode -> (fetched_at, weather_data)
+        self._inflight = {}  # zipcode -> Task
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.upstream_calls = 0
+        self.upstream_failures = 0
+
+    async def get(self, zipcode):
+        """Weather for a zipcode: cached if fresh, stale while revalidating, otherwise fetched"""
+        entry = self._cache.get(zipcode)
+        if entry is not None:
+            fetched_at, weather_data = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl_seconds:
+                self.hits += 1
+                self._cache.move_to_end(zipcode)
+                if isinstance(weather_data, WeatherLocationNotFound):
+                    raise WeatherLocationNotFound(str(weather_data))
+                return weather_data
+            if age < self.ttl_seconds + self.stale_seconds and isinstance(weather_data, dict):
+                self.stale_hits += 1
+                # Served stale whether or not the breaker lets a refresh through
+                self._refresh(zipcode)
+                return weather_data
+
+        self.misses += 1
+        task = self._refresh(zipcode)
+        if task is None:
+            raise WeatherUnavailable(f"Weather service unavailable (circuit open) for {zipcode}")
+        # Shielded so one cancelled caller does not cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def _refresh(self, zipcode):
+        """Task fetching a zipcode, or None if the circuit breaker refuses the call"""
+        # Concurrent requests for the same zipcode share a single upstream call
+        task = self._inflight.get(zipcode)
+        if task is None:
+            if not self.breaker.allow():
+                return None
+            task = asyncio.create_task(self._fetch(zipcode))
+            self._inflight[zipcode] = task
+            task.add_done_callback(lambda t: self._finish_refresh(zipcode, t))
+        return task
+
+    def _finish_refresh(self, zipcode, task):
+        self._inflight.pop(zipcode, None)
+        if task.cancelled():
+            # Possibly before it started, so _fetch could not tell the breaker
+            self.breaker.release()
+        # Background revalidations may fail without anyone awaiting them
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Weather refresh for {zipcode} failed: {task.exception()}")
+
+    async def _fetch(self, zipcode):
+        # Only started once the breaker has allowed the call (see _refresh)
+        self.upstream_calls += 1
+        started = time.perf_counter()
+        try:
+            response = await self._http.get('/current.json', params={
+                'key': self.api_key,
+                'q': zipcode,
+                'aqi': 'no'
+            })
+            if response.is_client_error and response.status_code != 429:
+                # The request was refused, which says nothing about the
+                # upstream's health: one bad zipcode must not open the circuit
+                WEATHER_FETCH_SECONDS.observe(time.perf_counter() - started, outcome='rejected')
+                self.breaker.record_success()
+                message = f"WeatherAPI rejected {zipcode}: {response.status_code} {self._error_message(response)}"
+                if response.status_code in LOCATION_NOT_FOUND_STATUSES:
+                    error = WeatherLocationNotFound(message)
+                    self._store(zipcode, error)
+                    raise error
+                raise WeatherUnavailable(message)
+            response.raise_for_status()
+            data = response.json()
+
+            # Extract relevant weather data
+            weather_data = {
+                'temperature': data['current']['temp_c'],
+                'humidity': data['current']['humidity'],
+                'condition': data['current']['condition']['text'],
+                'precipitation': data['current']['precip_mm'],
+                'location': data['location']['name'],
+                'region': data['location']['region'],
+                'country': data['location']['country'],
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
+        except httpx.HTTPError as e:
+            # 5xx, 429, timeouts and transport errors
+            WEATHER_FETCH_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            self.upstream_failures += 1
+            self.breaker.record_failure()
+            raise WeatherUnavailable(f"Error fetching weather data for {zipcode}: {e}") from e
+        except (KeyError, TypeError, ValueError) as e:
+            # An answer we cannot read is this request's error, not an outage
+            WEATHER_FETCH_SECONDS.observe(time.perf_counter() - started, outcome='error')
+            self.upstream_failures += 1
+            raise WeatherUnavailable(f"Unreadable weather data for {zipcode}: {e}") from e
+        finally:
+            # No-op after record_success()/record_failure(); otherwise frees the
+            # half-open trial, whatever was raised
+            self.breaker.release()
+
+        WEATHER_FETCH_SECONDS.observe(time.perf_counter() - started, outcome='ok')
+        self.breaker.record_success()
+        self._store(zipcode, weather_data)
         return weather_data
-    except Exception as e:
-        logger.error(f"Error fetching weather data: {e}")
-        # Return default weather data if API fails
+
+    def _store(self, zipcode, weather_data):
+        self._cache[zipcode] = (time.monotonic(), weather_data)
+        self._cache.move_to_end(zipcode)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _error_message(response):
+        # WeatherAPI errors look like {"error": {"code": 1006, "message": "No matching location found."}}
+        try:
+            return response.json()['error']['message']
+        except (KeyError, TypeError, ValueError):
+            return response.reason_phrase
+
+    def stats(self):
         return {
-            'temperature': 25.0,
-            'humidity': 60.0,
-            'condition': 'Unknown',
-            'precipitation': 0.0,
-            'location': 'Unknown',
-            'region': '',
-            'country': '',
-            'timestamp': datetime.now(timezone.utc).isoformat()
-        }
\ No newline at end of file
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'inflight': len(self._inflight),
+            'upstream_calls': self.upstream_calls,
+            'upstream_failures': self.upstream_failures,
+            'circuit': self.breaker.state
+        }
+
+    async def close(self):
+        await self._http.aclose()
+
+_client = None
+
+def get_weather_client():
+    """Shared WeatherClient, configured from the environment on first use"""
+    global _client
+    if _client is None:
+        _client = WeatherClient(
+            base_url=os.environ.get('WEATHER_API_BASE', WEATHER_API_BASE),
+            api_key=os.environ.get('WEATHER_API_KEY'),
+            ttl_seconds=float(os.environ.get('WEATHER_CACHE_TTL', '600')),
+            stale_seconds=float(os.environ.get('WEATHER_STALE_TTL', '3600')),
+            timeout=float(os.environ.get('WEATHER_TIMEOUT', '10')),
+            max_connections=int(os.environ.get('WEATHER_MAX_CONNECTIONS', '20')),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.environ.get('WEATHER_BREAKER_FAILURES', '5')),
+                reset_seconds=float(os.environ.get('WEATHER_BREAKER_RESET', '30'))
+            )
+        )
+    return _client
+
+async def close_weather_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+async def get_weather_by_zipcode(zipcode: str):
+    """Fetch current weather data from WeatherAPI (raises WeatherUnavailable)"""
+    return await get_weather_client().get(zipcode)
@@ -1,7 +1,7 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import '@/App.css';
 import axios from 'axios';
-import GardenGrid from './components/GardenGrid';
+import GardenGrid, { applyGardenMessage } from './components/GardenGrid';
 import PlantDetails from './components/PlantDetails';
 import WeatherPanel from './components/WeatherPanel';
 import CropRecommendations from './components/CropRecommendations';
@@ -10,40 +10,101 @@ import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const LIVE_URL = API.replace(/^http/, 'ws');
+const GARDEN_ID = 'default';
 
 function App() {
   const [plants, setPlants] = useState([]);
+  const [garden, setGarden] = useState({ rows: 3, cols: 3 });
   const [selectedPlant, setSelectedPlant] = useState(null);
   const [weather, setWeather] = useState(null);
   const [zipcode, setZipcode] = useState('10001');
   const [recommendations, setRecommendations] = useState([]);
   const [showRecommendations, setShowRecommendations] = useState(false);
-  const [autoGrow, setAutoGrow] = useState(false);
+  const [liveUpdates, setLiveUpdates] = useState(true);
+  const liveSocket = useRef(null);
 
   useEffect(() => {
     loadPlants();
-    fetchWeather('10001');
+    loadGarden();
   }, []);
 
-  // Auto-growth simulation
+  // Growth is advanced by the server-side scheduler; the live stream sends a
+  // snapshot and then only the fields that change, so nothing is re-polled
   useEffect(() => {
-    if (autoGrow && plants.length > 0) {
-      const interval = setInterval(() => {
-        updateAllPlantsGrowth();
-      }, 5000);
-      return () => clearInterval(interval);
+    if (!liveUpdates) {
+      return undefined;
     }
-  }, [autoGrow, plants]);
+    let reconnect = null;
+    let stopped = false;
+    const connect = () => {
+      const socket = new WebSocket(`${LIVE_URL}/gardens/${GARDEN_ID}/live`);
+      socket.onopen = () => {
+        liveSocket.current = socket;
+      };
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        setPlants(current => applyGardenMessage(current, message));
+      };
+      // Dropped for falling behind (or the server restarted): resume from a new snapshot
+      socket.onclose = () => {
+        liveSocket.current = null;
+        if (!stopped) {
+          reconnect = setTimeout(connect, 1000);
+        }
+      };
+    };
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(reconnect);
+      liveSocket.current?.close();
+      liveSocket.current = null;
+    };
+  }, [liveUpdates]);
+
+  useEffect(() => {
+    setSelectedPlant(selected => (selected && plants.find(plant => plant.id === selected.id)) || selected);
+  }, [plants]);
+
+  // Without a live stream the plant list is re-fetched after each change
+  const refreshPlants = async () => {
+    if (!liveSocket.current) {
+      await loadPlants();
+    }
+  };
 
   const loadPlants = async () => {
     try {
-      const response = await axios.get(`${API}/plants`);
-      setPlants(response.data);
+      // Follow the position cursor so large gardens load page by page
+      const loaded = [];
+      let after = null;
+      do {
+        const response = await axios.get(`${API}/plants`, {
+          params: { garden_id: GARDEN_ID, after: after ?? undefined }
+        });
+        loaded.push(...response.data);
+        after = response.headers['x-next-cursor'] ?? null;
+      } while (after !== null);
+      setPlants(loaded);
     } catch (error) {
       console.error('Error loading plants:', error);
     }
   };
 
+  const loadGarden = async () => {
+    let zip = '10001';
+    try {
+      const response = await axios.get(`${API}/gardens/${GARDEN_ID}`);
+      setGarden(response.data);
+      zip = response.data.zipcode || zip;
+    } catch (error) {
+      console.error('Error loading garden:', error);
+    }
+    setZipcode(zip);
+    fetchWeather(zip);
+  };
+
   const fetchWeather = async (zip) => {
     try {
       const response = await axios.post(`${API}/weather`, { zipcode: zip });
@@ -81,10 +142,11 @@ function App() {
   const plantSeed = async (position, plantType) => {
     try {
       await axios.post(`${API}/plants`, {
+        garden_id: GARDEN_ID,
         position,
         plant_type: plantType
       });
-      await loadPlants();
+      await refreshPlants();
       toast.success(`${plantType} planted successfully!`);
     } catch (error) {
       console.error('Error planting seed:', error);
@@ -94,8 +156,8 @@ function App() {
 
   const removePlant = async (plantId) => {
     try {
-      await axios.delete(`${API}/plants/${plantId}`);
-      await loadPlants();
+      await axios.delete(`${API}/plants/${plantId}`, { params: { garden_id: GARDEN_ID } });
+      await refreshPlants();
       setSelectedPlant(null);
       toast.success('Plant removed');
     } catch (error) {
@@ -109,8 +171,8 @@ function App() {
       const response = await axios.post(`${API}/plants/${plantId}/action`, {
         action,
         amount
-      });
-      await loadPlants();
+      }, { params: { garden_id: GARDEN_ID } });
+      await refreshPlants();
       setSelectedPlant(response.data);
       
       const actionMessages = {
@@ -127,17 +189,23 @@ function App() {
   };
 
   const updateAllPlantsGrowth = async () => {
-    for (const plant of plants) {
-      try {
-        await axios.post(`${API}/plants/${plant.id}/update-growth`, weather || {});
-      } catch (error) {
-        console.error(`Error updating growth for plant ${plant.id}:`, error);
+    try {
+      const response = await axios.post(`${API}/garden/tick`, null, { params: { garden_id: GARDEN_ID } });
+      if (!liveSocket.current) {
+        setPlants(response.data);
       }
+    } catch (error) {
+      console.error('Error updating garden growth:', error);
     }
-    await loadPlants();
   };
 
-  const handleWeatherUpdate = () => {
+  const handleWeatherUpdate = async () => {
+    // The server grows the garden in its zipcode's weather
+    try {
+      await axios.patch(`${API}/gardens/${GARDEN_ID}`, { zipcode });
+    } catch (error) {
+      console.error('Error updating garden location:', error);
+    }
     fetchWeather(zipcode);
   };
 
@@ -155,11 +223,11 @@ function App() {
             <label>
               <input
                 type="checkbox"
-                checked={autoGrow}
-                onChange={(e) => setAutoGrow(e.target.checked)}
+                checked={liveUpdates}
+                onChange={(e) => setLiveUpdates(e.target.checked)}
                 data-testid="auto-grow-toggle"
               />
-              <span>Auto-Grow Simulation</span>
+              <span>Live Garden Updates</span>
             </label>
           </div>
         </header>
@@ -178,6 +246,8 @@ function App() {
           <div className="center-panel">
             <GardenGrid
               plants={plants}
+              rows={garden.rows}
+              cols={garden.cols}
               onPlantClick={setSelectedPlant}
               onPlantSeed={plantSeed}
               recommendations={recommendations}
@@ -3,11 +3,31 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle } from './ui/dialog';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
 
-const GardenGrid = ({ plants, onPlantClick, onPlantSeed, recommendations }) => {
+// Apply a live garden message: a snapshot replaces the plants, a patch
+// merges changed fields, adds new plants and drops removed ones
+export const applyGardenMessage = (plants, message) => {
+  if (message.type === 'snapshot') {
+    return message.plants;
+  }
+  const changes = message.plants || {};
+  const removed = new Set(message.removed || []);
+  const known = new Set(plants.map(plant => plant.id));
+  const updated = plants
+    .filter(plant => !removed.has(plant.id))
+    .map(plant => (changes[plant.id] ? { ...plant, ...changes[plant.id] } : plant));
+  Object.entries(changes).forEach(([id, fields]) => {
+    if (!known.has(id)) {
+      updated.push(fields);
+    }
+  });
+  return updated;
+};
+
+const GardenGrid = ({ plants, rows = 3, cols = 3, onPlantClick, onPlantSeed, recommendations }) => {
   const [selectedPosition, setSelectedPosition] = useState(null);
   const [customPlantName, setCustomPlantName] = useState('');
 
-  const grid = Array(9).fill(null);
+  const grid = Array(rows * cols).fill(null);
   plants.forEach(plant => {
     grid[plant.position] = plant;
   });
@@ -37,7 +57,11 @@ const GardenGrid = ({ plants, onPlantClick, onPlantSeed, recommendations }) => {
   return (
     <div className="garden-grid-container">
       <h2 className="grid-title" data-testid="garden-title">Your Garden</h2>
-      <div className="garden-grid" data-testid="garden-grid">
+      <div
+        className="garden-grid"
+        style={{ gridTemplateColumns: `repeat(${cols}, 1fr)` }}
+        data-testid="garden-grid"
+      >
         {grid.map((plant, index) => (
           <div
             key={index}